@@ -1,13 +1,18 @@
 import argparse
+import functools
 import random
 import sys
 import json
-import networkx as nx
-from typing import Iterable
+from typing import Callable, Dict, Iterable, Optional
 import wumpus as wws
 from wumpus import run_episode
-from utils import json2graph, Agent, cost_function
-import functools
+from planner import plan, plan_anytime, SearchResult
+from tour import plan_tour
+from jps import plan_legs
+from stats import SearchStats
+from plan_cache import PlanCache
+from grid import Grid
+from world_index import WorldIndex
 from heuristics import (
     heuristic_manhatten_distance, 
     heuristic_euclidian_distance,
@@ -16,152 +21,116 @@ from heuristics import (
 )
 
 
+def heuristic_name(heuristic: Callable) -> str:
+    """
+    Name of a heuristic in the plan cache, with the arguments bound by functools.partial if any.
+    """
+    if isinstance(heuristic, functools.partial):
+        arguments = [repr(argument) for argument in heuristic.args]
+        arguments += ['{}={!r}'.format(key, value) for key, value in sorted(heuristic.keywords.items())]
+        name = heuristic_name(heuristic.func)
+        return '{}({})'.format(name, ', '.join(arguments)) if arguments else name
+    return getattr(heuristic, '__name__', None) or repr(heuristic)
+
+
 class AstarPlayer(wws.OfflinePlayer):
     """Offline player demonstrating the use of the start episode method to inspect the world."""
 
+    def __init__(self, *args, heuristic: Callable = heuristic_minmax, distance_fields: bool = False,
+                 cache: PlanCache = None, stats: bool = False, memory: bool = False, engine: str = None,
+                 deadline: float = None, bound: float = 1.0, lean: bool = False,
+                 prune: bool = False, pose_fields: bool = False,
+                 pose_fields_directory: Optional[str] = None, **kwargs):
+        """With `distance_fields` the exact distances to the gold and the exit are precomputed and used as heuristic,
+        plans are looked up in `cache` (if given) before searching, with `stats` every solve records its
+        stats.SearchStats in `self.stats` (and its peak memory with `memory`). With `engine` (one of jps.ENGINES)
+        the gold is reached by legs of moves computed by that engine (see jps.plan_legs) instead. With `deadline`
+        (in seconds) the best plan found in time is taken, stopping earlier once proven within `bound` of the
+        optimum (see planner.plan_anytime). With `lean` the search keeps its states in flat buffers
+        (see lean.search_lean), for the large maps, with `prune` it skips the dominated states and the corridors
+        (see pruning.search_pruned), for the mazes. With `pose_fields` the fields of the heuristic are kept per
+        map for all the episodes on it (see posefields.cached_pose_fields), saved to and loaded from
+        `pose_fields_directory` if given."""
+        super().__init__(*args, **kwargs)
+        self.heuristic = heuristic
+        self.distance_fields = distance_fields
+        self.engine = engine
+        self.deadline = deadline
+        self.bound = bound
+        self.cache = cache
+        self.collect_stats = stats
+        self.memory = memory
+        self.lean = lean
+        self.prune = prune
+        self.pose_fields = pose_fields
+        self.pose_fields_directory = pose_fields_directory
+        self.stats = None
+
+    def solve(self, world_dict: Dict, grid: Optional[Grid] = None) -> SearchResult:
+        """Search the cheapest plan for a world described in JSON format, worlds with several golds get a tour.
+        `grid` is the grid.Grid of the world if already built (see WorldIndex.grid)."""
+        stats = self.stats = SearchStats('astar', world_dict.get('id'), self.memory) if self.collect_stats else None
+
+        def search(world_dict: Dict) -> SearchResult:
+            nonlocal grid
+            pose_fields = None
+            if self.pose_fields:
+                from posefields import cached_pose_fields
+                grid = grid if grid is not None else Grid.from_json(world_dict)
+                pose_fields = cached_pose_fields(grid, self.pose_fields_directory)
+            if len(world_dict.get('golds', [])) > 1:
+                return plan_tour(world_dict, grid=grid, stats=stats)
+            if self.engine is not None:
+                return plan_legs(world_dict, engine=self.engine, grid=grid)
+            if self.deadline is not None:
+                return plan_anytime(world_dict, deadline=self.deadline, bound=self.bound, heuristic=self.heuristic,
+                                    grid=grid, fields=self.distance_fields, stats=stats, pose_fields=pose_fields)
+            return plan(world_dict, heuristic=self.heuristic, grid=grid, fields=self.distance_fields, stats=stats,
+                        lean=self.lean, prune=self.prune, pose_fields=pose_fields)
+
+        def solve() -> SearchResult:
+            if self.cache is not None:
+                # inadmissible heuristics might give different plans, they get their own entries
+                if self.engine is not None:
+                    namespace = 'astar:engine:' + self.engine
+                elif self.pose_fields:
+                    namespace = 'astar:pose_fields'
+                elif self.distance_fields:
+                    namespace = 'astar:fields'
+                else:
+                    namespace = 'astar:' + heuristic_name(self.heuristic)
+                if self.engine is None and self.deadline is not None:
+                    # the plans found in time are not the optimal ones, nor always the same
+                    namespace = namespace.replace('astar:', 'astar:anytime:', 1)
+                return self.cache.lookup(world_dict, search, namespace=namespace)
+            return search(world_dict)
+
+        return solve() if stats is None else stats.measure(world_dict, solve)
+
     def start_episode(self, world: wws.WumpusWorld) -> Iterable[wws.Hunter.Actions]:
         """Print the description of the world before starting."""
 
-        world_info = {k: [] for k in ('Hunter', 'Pits', 'Wumpus', 'Gold', 'Exits')}
-        world_info['Size'] = (world.size.x, world.size.y)
-        world_info['Blocks'] = [(c.x, c.y) for c in world.blocks]
-
-        for obj in world.objects:
-            if isinstance(obj, wws.Hunter):
-                world_info['Hunter'].append((obj.location.x, obj.location.y))
-                all_actions = list(obj.Actions)
-            elif isinstance(obj, wws.Pit):
-                world_info['Pits'].append((obj.location.x, obj.location.y))
-            elif isinstance(obj, wws.Wumpus):
-                world_info['Wumpus'].append((obj.location.x, obj.location.y))
-                print('this is ',world_info['Wumpus'][0])
-            elif isinstance(obj, wws.Exit):
-                world_info['Exits'].append((obj.location.x, obj.location.y))
-            elif isinstance(obj, wws.Gold):
-                world_info['Gold'].append((obj.location.x, obj.location.y))
+        index = WorldIndex.from_world(world)
+        for _ in index.wumpuses:
+            print('this is ', tuple(index.wumpuses[0]))
 
         print('World details:')
-        for k in ('Size', 'Pits', 'Wumpus', 'Gold', 'Exits', 'Blocks'):
-            print('  {}: {}'.format(k, world_info.get(k, None)))
+        for k, v in index.describe().items():
+            print('  {}: {}'.format(k, v))
 
         def astar_search():
             """
             Perform astar search.
             """
-            # Convert the world map to a graph
-            G = json2graph(world.to_dict())
-
-            # Get the locations of the hunter, wumpus, exit, gold and the pits
-            hunter_loc = world_info['Hunter'][0]
-            wumpus_loc = world_info['Wumpus'][0]
-            gold_loc = world_info['Gold'][0]
-            exit_loc = world_info['Exits'][0]
-            pits_loc = world_info['Pits']
-
-            # If the gold is in a pit, return the action to climb out of the game
-            if gold_loc in pits_loc:
-                yield all_actions[5]
-
-            # Calculate the cost of the path through the Wumpus
-            # -------------------------------------------------
-            
-            # Check if there is a path to the gold
-            if nx.has_path(G, source=hunter_loc, target=gold_loc):
-
-                # Usage of the heuristic 
-                heuristic = functools.partial(heuristic_minmax)
-                
-                # For a star we don't use path reversal, instead we calculate the path twice
-
-                # From Hunters Location (0,0) to the gold location
-                wumpus_path_forward = nx.astar_path(G=G, source=hunter_loc, target=gold_loc, heuristic=heuristic)
-                
-                # From gold's location to the exit point (0,0)
-                wumpus_path_backward = nx.astar_path(G=G, source=gold_loc, target=exit_loc, heuristic=heuristic)
-                
-                # Concatenate
-                wumpus_path = wumpus_path_forward + wumpus_path_backward[1:]
-
-                # Calculate the cost
-                total_cost_wumpus = cost_function(
-                    path=wumpus_path, 
-                    has_wumpus=True,
-                    hunter_loc=hunter_loc, 
-                    gold_loc=gold_loc,
-                    wumpus_loc=wumpus_loc
-                )
-            else:
-                # If there is no path to the gold, climb out of the game
-                yield all_actions[5]
-
-            # Calculate the cost of the path that avoids the Wumpus
-            # -----------------------------------------------------
-
-            # This could be the same path, if the path found above does not include Wumpus in it
-            # Wumpus basically becomes a pit (unreachable node as far as the Graph is concerned)
-
-            G_no_wumpus = G.copy()
-            if wumpus_loc in G_no_wumpus.nodes():
-                G_no_wumpus.remove_node(wumpus_loc)
-
-            # Check if there is a path to the gold
-            if nx.has_path(G_no_wumpus, source=hunter_loc, target=gold_loc):
-
-                # Usage of the heuristics
-                heuristic = functools.partial(heuristic_minmax)
-
-                # Calculate the path from hunters location (0,0) to the gold location
-                no_wumpus_path_forward = nx.astar_path(G=G_no_wumpus, source=hunter_loc, target=gold_loc, heuristic=heuristic)
-
-                # Calculate the path from gold location to the exit location (0,0)
-                no_wumpus_path_backward = nx.astar_path(G=G_no_wumpus, source=gold_loc, target=exit_loc, heuristic=heuristic)
-                
-                # Concatenate
-                no_wumpus_path = no_wumpus_path_forward + no_wumpus_path_backward[1:]
-                
-                # Calculate the cost
-                total_cost_no_wumpus = cost_function(
-                    path=no_wumpus_path, 
-                    has_wumpus=False,
-                    hunter_loc=hunter_loc, 
-                    gold_loc=gold_loc,
-                    wumpus_loc=wumpus_loc
-                )
-            else:
-                no_wumpus_path = wumpus_path
-                total_cost_no_wumpus = total_cost_wumpus
-
-            # Choose the path with the lowest cost
-            # ------------------------------------
-
-            if total_cost_wumpus > total_cost_no_wumpus:
-                final_path = no_wumpus_path
-            else:
-                final_path = wumpus_path
-
-            stl = Agent(
-                hunter_location=hunter_loc, 
-                gold_location=gold_loc, 
-                wumpus_location=wumpus_loc
-            )
-            toyld = stl.navigate(path=final_path)
-            
-             # Yield the actions needed to follow the chosen path
-
-            for element in toyld:
-                if element == 'Move' :
-                    yield all_actions[0]
-                elif element == 'Right' :
-                    yield all_actions[1]
-                elif element == 'Left':
-                    yield all_actions[2]
-                elif element == 'Shoot':
-                    yield all_actions[3]
-                elif element == 'Grab':
-                    yield all_actions[4]
-                else :
-                    yield all_actions[5]
-    
+            # Search the state space (location, heading, gold, arrow and Wumpus)
+            # with the real cost of each action: the heuristic estimates the
+            # way to the gold and from the gold to the exit, so a single search
+            # replaces the two legs computed with and without the Wumpus
+            toyld = self.solve(index.world_json, grid=index.grid).actions
+
+            # Yield the actions needed to follow the chosen path
+            yield from index.to_actions(toyld)
+
         return astar_search()
 
 
@@ -0,0 +1,207 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterator, Optional, Tuple
+from heuristics import (
+    heuristic_manhatten_distance,
+    heuristic_euclidian_distance,
+    heuristic_manhatten_distance_cheat,
+    heuristic_minmax,
+    heuristic_manhatten_turns,
+    heuristic_euclidian_turns
+)
+from plan_cache import PlanCache
+from plans import Plan
+from jps import ENGINES
+
+
+PLAYERS = ('bfs', 'astar')
+
+# Heuristics available to the A* player ('fields' uses the exact distance fields, 'pose_fields' the ones kept per map)
+HEURISTICS = {
+    'manhatten': heuristic_manhatten_distance,
+    'euclidian': heuristic_euclidian_distance,
+    'manhatten_cheat': heuristic_manhatten_distance_cheat,
+    'minmax': heuristic_minmax,
+    'manhatten_turns': heuristic_manhatten_turns,
+    'euclidian_turns': heuristic_euclidian_turns,
+    'fields': None,
+    'pose_fields': None
+}
+
+# Plan cache of the worker process, see init_worker
+_cache = None
+
+# Directory of the pose fields of the maps, see init_worker
+_pose_fields_directory = None
+
+
+def read_worlds(source: str) -> Iterator[Tuple[str, str]]:
+    """
+    Lists the worlds in a directory, a glob pattern, a JSONL file or '-' (JSONL on stdin).
+
+    Yields (name, JSON text) pairs, the text is parsed by the workers.
+    """
+    if source == '-':
+        for number, line in enumerate(sys.stdin, start=1):
+            if line.strip():
+                yield '<stdin>:{}'.format(number), line
+        return
+
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, '*.json')) + glob.glob(os.path.join(source, '*.jsonl')))
+    else:
+        paths = sorted(glob.glob(source))
+
+    for path in paths:
+        with open(path) as fd:
+            if path.endswith('.jsonl'):
+                for number, line in enumerate(fd, start=1):
+                    if line.strip():
+                        yield '{}:{}'.format(path, number), line
+            else:
+                yield path, fd.read()
+
+
+def init_worker(cache_directory: Optional[str], memory: bool = False, pose_fields_directory: Optional[str] = None):
+    """
+    Creates the plan cache of a worker, the directory is shared by all the workers.
+
+    With `memory` the worker has an in-memory cache even without a directory
+    (long running workers, see service.py). The pose fields of the maps
+    (heuristic 'pose_fields', see posefields.py) are shared in `pose_fields_directory`.
+    """
+    global _cache, _pose_fields_directory
+    _pose_fields_directory = pose_fields_directory
+    if cache_directory is not None or memory:
+        _cache = PlanCache(directory=cache_directory)
+
+
+def make_player(player: str, heuristic: str, cache=None, stats: bool = False, engine: Optional[str] = None,
+                deadline: Optional[float] = None, bound: float = 1.0, lean: bool = False,
+                prune: bool = False):
+    """
+    Creates the player, imported here since the players need the wumpus package.
+    """
+    if player == 'bfs':
+        from bfs import BfsPlayer
+        return BfsPlayer(cache=cache, stats=stats, lean=lean, prune=prune)
+
+    from astar import AstarPlayer
+    if engine is not None:
+        return AstarPlayer(engine=engine, cache=cache, stats=stats)
+    if heuristic == 'pose_fields':
+        return AstarPlayer(pose_fields=True, pose_fields_directory=_pose_fields_directory, cache=cache, stats=stats,
+                           deadline=deadline, bound=bound, lean=lean, prune=prune)
+    if heuristic == 'fields':
+        return AstarPlayer(distance_fields=True, cache=cache, stats=stats, deadline=deadline, bound=bound, lean=lean,
+                           prune=prune)
+    return AstarPlayer(heuristic=HEURISTICS[heuristic], cache=cache, stats=stats, deadline=deadline, bound=bound,
+                       lean=lean, prune=prune)
+
+
+def solve(task: Tuple[str, str, str, str, bool, Optional[str], Optional[float], float, bool, bool]) -> Dict:
+    """
+    Solves a single world, returns the JSON record of the result.
+    """
+    name, text, player, heuristic, stats, engine, deadline, bound, lean, prune = task
+    record = {'world': name, 'player': player}
+    if player == 'astar':
+        record['heuristic'] = heuristic
+        if engine is not None:
+            record['engine'] = engine
+        elif deadline is not None:
+            record['deadline'] = deadline
+
+    try:
+        start = time.perf_counter()
+        world_dict = json.loads(text)
+        loaded = time.perf_counter()
+        misses = _cache.misses if _cache is not None else 0
+        solver = make_player(player, heuristic, _cache, stats, engine, deadline, bound, lean, prune)
+        result = solver.solve(world_dict)
+        solved = time.perf_counter()
+    except Exception as error:
+        record.update(outcome='error', error='{}: {}'.format(type(error).__name__, error))
+        return record
+
+    record['id'] = world_dict.get('id')
+    if _cache is not None:
+        record['cached'] = _cache.misses == misses
+    record.update(
+        outcome='gold' if 'Grab' in result.actions else 'no_gold',
+        cost=result.cost,
+        expanded=result.expanded,
+        actions=result.actions,
+        timings={'load': loaded - start, 'solve': solved - loaded}
+    )
+    if hasattr(result, 'bound'):
+        record['bound'] = result.bound
+    if stats:
+        record['stats'] = solver.stats.to_dict()
+    return record
+
+
+def dump_record(record: Dict, compact: bool = False) -> str:
+    """
+    The JSON line of a record of solve, its plan as a list of action names or, with `compact`, as the text of a
+    plans.Plan in 'plan' (e.g. 'M3RM2GC').
+    """
+    if 'actions' in record:
+        actions = Plan.from_actions(record['actions'])
+        record = dict(record)
+        if compact:
+            del record['actions']
+            record['plan'] = actions.to_text()
+        else:
+            record['actions'] = list(actions)
+    return json.dumps(record)
+
+
+def main(*cargs):
+    """Solve worlds in parallel and write one JSON result per line"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('sources', nargs='+', help='directories, glob patterns or JSONL files of worlds, - for JSONL on stdin')
+    parser.add_argument('--player', choices=PLAYERS, default='bfs', help='player solving the worlds')
+    parser.add_argument('--heuristic', choices=list(HEURISTICS), default='minmax', help='heuristic of the astar player')
+    parser.add_argument('--engine', choices=list(ENGINES), help='legs engine of the astar player (see jps.plan_legs)')
+    parser.add_argument('--deadline', type=float, help='seconds given to the astar player to improve its plan (see planner.plan_anytime)')
+    parser.add_argument('--bound', type=float, default=1.0, help='with --deadline, stop once the plan is proven within this ratio of the optimum')
+    parser.add_argument('--lean', action='store_true', help='search with flat buffers, a few bytes per state (see lean.py)')
+    parser.add_argument('--prune', action='store_true', help='skip the dominated states, the dead ends and the corridors (see pruning.py)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=16, help='worlds sent to a worker at once')
+    parser.add_argument('--output', default='-', help='JSONL file of the results, - for stdout')
+    parser.add_argument('--cache', help='directory of the plan cache shared by the workers')
+    parser.add_argument('--pose-fields', help='directory of the pose fields of the maps shared by the workers (see posefields.py)')
+    parser.add_argument('--stats', action='store_true', help='add the search statistics to the results')
+    parser.add_argument('--compact', action='store_true', help='write the plans run length encoded (see plans.Plan.to_text)')
+    args = parser.parse_args(cargs)
+
+    tasks = (
+        (name, text, args.player, args.heuristic, args.stats, args.engine, args.deadline, args.bound,
+         args.lean, args.prune)
+        for source in args.sources
+        for name, text in read_worlds(source)
+    )
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    failures = 0
+    try:
+        with Pool(processes=args.workers, initializer=init_worker, initargs=(args.cache, False, args.pose_fields)) as pool:
+            for record in pool.imap_unordered(solve, tasks, chunksize=args.chunksize):
+                failures += record['outcome'] == 'error'
+                output.write(dump_record(record, args.compact) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
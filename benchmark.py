@@ -0,0 +1,132 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+from batch import HEURISTICS, make_player
+from generator import generate_world
+
+
+# Sides of the default worlds, a couple of minutes in all: the larger ones are given with --sizes
+# (128 takes about 10 minutes, 512 minutes per bfs solve and 2048 several GB)
+SIZES = (8, 32, 64)
+DENSITIES = (0.0, 0.1, 0.2)
+SUBJECTS = ('bfs',) + tuple('astar:{}'.format(name) for name in HEURISTICS)
+
+# Measures compared against the baseline
+MEASURES = ('time', 'peak_memory', 'expanded')
+
+
+def clear_caches():
+    """
+    Empties the caches the planners keep across worlds, so every run starts cold.
+    """
+    import hpa
+    import posefields
+    hpa._graphs.clear()
+    posefields._caches.clear()
+
+
+def measure(subject: str, world: Dict, repeat: int, memory: bool) -> Dict:
+    """
+    Solves the world with the subject, returns the best time, the peak memory and the expansions.
+
+    Every run gets a new player and empty caches (see clear_caches): the
+    later runs would otherwise reuse what the first one computed.
+    """
+    player_name, _, heuristic = subject.partition(':')
+
+    times = []
+    for _ in range(repeat):
+        clear_caches()
+        player = make_player(player_name, heuristic)
+        start = time.perf_counter()
+        result = player.solve(world)
+        times.append(time.perf_counter() - start)
+
+    peak_memory = None
+    if memory:
+        # traced separately, tracemalloc slows down the search
+        clear_caches()
+        player = make_player(player_name, heuristic)
+        tracemalloc.start()
+        player.solve(world)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {'time': min(times), 'peak_memory': peak_memory, 'expanded': result.expanded, 'cost': result.cost}
+
+
+def run(subjects: List[str], sizes: List[int], densities: List[float], seed: int, repeat: int, memory: bool) -> Dict:
+    """
+    Runs the whole suite, results are keyed by 'subject/size/density'.
+    """
+    results = {}
+    for size in sizes:
+        for density in densities:
+            world = generate_world(size, size, seed='bench-{}'.format(seed), pit_density=density)
+            for subject in subjects:
+                key = '{}/{}x{}/{:.2f}'.format(subject, size, size, density)
+                results[key] = measure(subject, world, repeat, memory)
+                print('{:40} {:10.4f}s {:>12} expanded'.format(key, results[key]['time'], results[key]['expanded']),
+                      file=sys.stderr)
+    return results
+
+
+def regressions(results: Dict, baseline: Dict, threshold: float, min_time: float = 0.0) -> List[str]:
+    """
+    Lists the measures that are worse than the baseline by more than the threshold (a fraction).
+
+    Times below `min_time` seconds are only noise and are never reported.
+    """
+    found = []
+    for key, measures in results.items():
+        if key not in baseline:
+            continue
+        for name in MEASURES:
+            current, reference = measures.get(name), baseline[key].get(name)
+            if current is None or not reference:
+                continue
+            if name == 'time' and current < min_time:
+                continue
+            if current > reference * (1 + threshold):
+                found.append('{} {}: {} > {} (+{:.0%})'.format(key, name, current, reference, current / reference - 1))
+    return found
+
+
+def main(*cargs):
+    """Benchmark the players on seeded random worlds and compare with a baseline"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--subjects', nargs='+', choices=SUBJECTS, default=list(SUBJECTS), help='players to measure')
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES), help='side of the square worlds')
+    parser.add_argument('--densities', nargs='+', type=float, default=list(DENSITIES), help='pit densities')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated worlds')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per world, the best one is kept')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip the peak memory measure')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of the results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--min-time', type=float, default=0.05, help='times below this (seconds) are not compared')
+    args = parser.parse_args(cargs)
+
+    results = run(args.subjects, args.sizes, args.densities, args.seed, args.repeat, args.memory)
+
+    if args.save:
+        with open(args.save, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)
+        found = regressions(results, baseline, args.threshold, args.min_time)
+        for regression in found:
+            print('REGRESSION ' + regression)
+        if found:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,78 @@
+import numpy as np
+from typing import Iterable, List
+from grid import Grid, FREE
+
+
+# Distance of the cells that cannot reach the source
+UNREACHABLE = -1
+
+
+def distance_field(grid: Grid, sources: Iterable[int], avoid: Iterable[int] = ()) -> np.ndarray:
+    """
+    Computes the number of moves from every cell of the grid to the closest source.
+
+    The flood fill expands the whole frontier at once with NumPy, cells in
+    `avoid` (e.g. the Wumpus) are treated like pits. The result is a flat
+    int32 array indexed by cell id, UNREACHABLE where there is no way.
+    """
+    width = grid.width
+    size = len(grid)
+
+    free = np.frombuffer(grid.cells, dtype=np.uint8) == FREE
+    free[list(avoid)] = False
+
+    frontier = np.unique(np.fromiter(sources, dtype=np.intp))
+    distances = np.full(size, UNREACHABLE, dtype=np.int32)
+    distances[frontier] = 0
+
+    distance = 0
+    while frontier.size:
+        distance += 1
+        column = frontier % width
+        candidates = np.concatenate((
+            frontier[column < width - 1] + 1,
+            frontier[column > 0] - 1,
+            frontier[frontier < size - width] + width,
+            frontier[frontier >= width] - width
+        ))
+        candidates = candidates[free[candidates]]
+        candidates = np.unique(candidates[distances[candidates] == UNREACHABLE])
+        distances[candidates] = distance
+        frontier = candidates
+
+    return distances
+
+
+def cached_distance_field(grid: Grid, sources: Iterable[int], avoid: Iterable[int] = ()) -> np.ndarray:
+    """
+    Returns the distance field to `sources`, computing it only once per grid.
+
+    The cache lives in `grid.fields`, so it is dropped when pits or blocks
+    change and a different `avoid` (a moved Wumpus) gives a different field.
+    """
+    key = (frozenset(sources), frozenset(avoid))
+    if key not in grid.fields:
+        grid.fields[key] = distance_field(grid, key[0], key[1])
+    return grid.fields[key]
+
+
+def field_path(grid: Grid, distances: np.ndarray, start: int) -> List[int]:
+    """
+    Returns a shortest path of cells from `start` to the closest source of the field.
+
+    Follows the field downhill, so it is empty if the source cannot be reached.
+    """
+    if distances[start] == UNREACHABLE:
+        return []
+
+    path = [start]
+    cell = start
+    while distances[cell] > 0:
+        # the field is only defined on passable cells (and the sources)
+        for heading in range(4):
+            neighbour = grid.ahead(cell, heading)
+            if neighbour >= 0 and distances[neighbour] == distances[cell] - 1:
+                cell = neighbour
+                break
+        path.append(cell)
+    return path
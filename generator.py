@@ -0,0 +1,194 @@
+import argparse
+import json
+import random
+import sys
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from grid import FREE, PIT, BLOCK
+
+
+PLACEMENTS = ('random', 'far', 'near_gold')
+
+
+def _monotone_path(rng: random.Random, source: Tuple[int, int], target: Tuple[int, int]) -> Iterator[Tuple[int, int]]:
+    """
+    Yields the cells of a random shortest (staircase) path from source to target.
+    """
+    x, y = source
+    dx = 1 if target[0] > x else -1
+    dy = 1 if target[1] > y else -1
+    steps = [(dx, 0)] * abs(target[0] - x) + [(0, dy)] * abs(target[1] - y)
+    rng.shuffle(steps)
+    yield x, y
+    for step_x, step_y in steps:
+        x, y = x + step_x, y + step_y
+        yield x, y
+
+
+def _place(rng: random.Random, width: int, height: int, placement: str,
+           taken: List[Tuple[int, int]], hunter: Tuple[int, int], gold: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Picks a cell not in `taken` following the placement strategy.
+
+    'far' picks a cell in the half of the map farther from the hunter,
+    'near_gold' one of the cells next to the gold (random if all taken).
+    """
+    if placement == 'near_gold' and gold is not None:
+        around = [
+            (gold[0] + dx, gold[1] + dy)
+            for dx, dy in ((0, 1), (1, 0), (0, -1), (-1, 0))
+            if 0 <= gold[0] + dx < width and 0 <= gold[1] + dy < height
+        ]
+        around = [cell for cell in around if cell not in taken]
+        if around:
+            return rng.choice(around)
+
+    attempts = 0
+    while True:
+        attempts += 1
+        if placement == 'far' and attempts < 100:
+            x = rng.randrange(width // 2, width) if hunter[0] < width / 2 else rng.randrange(0, (width + 1) // 2)
+            y = rng.randrange(height // 2, height) if hunter[1] < height / 2 else rng.randrange(0, (height + 1) // 2)
+        else:
+            x, y = rng.randrange(width), rng.randrange(height)
+        if (x, y) not in taken:
+            return x, y
+
+
+def generate_world(
+        width: int,
+        height: int,
+        seed=None,
+        pit_density: float = 0.2,
+        block_density: float = 0.0,
+        golds: int = 1,
+        wumpuses: int = 1,
+        gold_placement: str = 'random',
+        wumpus_placement: str = 'random',
+        hunter: Tuple[int, int, str] = (0, 0, 'N'),
+        solvable: bool = True
+    ) -> Dict:
+    """
+    Creates a world in the JSON format read by wumpus.WumpusWorld.from_JSON.
+
+    Pits and blocks are drawn independently for every cell with the given
+    densities, the hunter, the golds and the Wumpuses are always on free
+    cells and the exit is under the hunter. With `solvable` a random
+    shortest path from the hunter to every gold and back is cleared and at
+    most one Wumpus stays on it (the others are placed again elsewhere),
+    so the gold can always be reached (possibly by killing that Wumpus).
+    """
+    if golds + wumpuses >= width * height:
+        raise ValueError('{}x{} is too small for {} golds and {} Wumpuses'.format(width, height, golds, wumpuses))
+
+    rng = random.Random(seed)
+    start = (hunter[0], hunter[1])
+
+    gold_cells = []
+    for _ in range(golds):
+        gold_cells.append(_place(rng, width, height, gold_placement, [start] + gold_cells, start, None))
+    wumpus_cells = []
+    for _ in range(wumpuses):
+        wumpus_cells.append(_place(
+            rng, width, height, wumpus_placement, [start] + gold_cells + wumpus_cells, start,
+            gold_cells[0] if gold_cells else None
+        ))
+
+    # occupancy of the cells, indexed by y * width + x as in grid.Grid
+    cells = bytearray(width * height)
+    for cell in range(width * height):
+        draw = rng.random()
+        if draw < pit_density:
+            cells[cell] = PIT
+        elif draw < pit_density + block_density:
+            cells[cell] = BLOCK
+
+    cleared = [start] + gold_cells + wumpus_cells
+    if solvable:
+        stops = [start] + gold_cells + [start]
+        path = [cell for source, target in zip(stops, stops[1:]) for cell in _monotone_path(rng, source, target)]
+        # the arrow kills one Wumpus on the way, the others are moved off it
+        on_path = [index for index, cell in enumerate(wumpus_cells) if cell in path]
+        for index in on_path[1:]:
+            taken = set(path + gold_cells + wumpus_cells)
+            if len(taken) >= width * height:
+                raise ValueError('{}x{} is too small for {} Wumpuses off the path'.format(width, height, wumpuses))
+            wumpus_cells[index] = _place(rng, width, height, wumpus_placement, taken, start,
+                                         gold_cells[0] if gold_cells else None)
+        cleared = [start] + gold_cells + wumpus_cells + path
+    for x, y in cleared:
+        cells[y * width + x] = FREE
+
+    return {
+        'id': 'generated-{}'.format(seed),
+        'size': [width, height],
+        'hunters': [list(hunter)],
+        'pits': [[cell % width, cell // width] for cell, content in enumerate(cells) if content == PIT],
+        'wumpuses': [list(cell) for cell in wumpus_cells],
+        'exits': [list(start)],
+        'golds': [list(cell) for cell in gold_cells],
+        'blocks': [[cell % width, cell // width] for cell, content in enumerate(cells) if content == BLOCK]
+    }
+
+
+def generate_worlds(width: int, height: int, count: Optional[int] = None, seed=0, **options) -> Iterator[Dict]:
+    """
+    Lazily yields `count` worlds (endlessly if None) of the given size.
+
+    World i is generated with seed '<seed>-<i>', so every world can be
+    recreated on its own with generate_world; the other options are the
+    ones of generate_world.
+    """
+    index = 0
+    while count is None or index < count:
+        yield generate_world(width, height, seed='{}-{}'.format(seed, index), **options)
+        index += 1
+
+
+def write_jsonl(worlds: Iterator[Dict], fd: TextIO):
+    """
+    Writes the worlds one per line as they are generated.
+    """
+    for world in worlds:
+        fd.write(json.dumps(world, separators=(',', ':')) + '\n')
+
+
+def main(*cargs):
+    """Stream seeded random worlds as JSON lines"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--size', nargs=2, type=int, default=[8, 8], metavar=('WIDTH', 'HEIGHT'), help='size of the worlds')
+    parser.add_argument('--count', type=int, default=1, help='number of worlds, 0 for an endless stream')
+    parser.add_argument('--seed', default='0', help='seed of the stream')
+    parser.add_argument('--pit-density', type=float, default=0.2, help='probability of a pit in a cell')
+    parser.add_argument('--block-density', type=float, default=0.0, help='probability of a block in a cell')
+    parser.add_argument('--golds', type=int, default=1, help='golds in every world')
+    parser.add_argument('--wumpuses', type=int, default=1, help='Wumpuses in every world')
+    parser.add_argument('--gold-placement', choices=PLACEMENTS, default='random', help='where the golds are placed')
+    parser.add_argument('--wumpus-placement', choices=PLACEMENTS, default='random', help='where the Wumpuses are placed')
+    parser.add_argument('--unsolvable', dest='solvable', action='store_false', help='do not clear a way to the gold')
+    parser.add_argument('--output', default='-', help='JSONL file, - for stdout')
+    args = parser.parse_args(cargs)
+
+    worlds = generate_worlds(
+        args.size[0], args.size[1],
+        count=args.count or None,
+        seed=args.seed,
+        pit_density=args.pit_density,
+        block_density=args.block_density,
+        golds=args.golds,
+        wumpuses=args.wumpuses,
+        gold_placement=args.gold_placement,
+        wumpus_placement=args.wumpus_placement,
+        solvable=args.solvable
+    )
+
+    if args.output == '-':
+        write_jsonl(worlds, sys.stdout)
+    else:
+        with open(args.output, 'w') as fd:
+            write_jsonl(worlds, fd)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
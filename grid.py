@@ -0,0 +1,109 @@
+import networkx as nx
+from typing import Dict, Iterable, List, Tuple
+
+
+# Content of a cell in the occupancy array
+FREE = 0
+PIT = 1
+BLOCK = 2
+
+# Headings in clockwise order, the index is used as heading everywhere in the grid
+HEADINGS = ('N', 'E', 'S', 'W')
+NORTH, EAST, SOUTH, WEST = range(4)
+
+
+class Grid:
+    """
+    Compact model of the world map.
+
+    The map is a flat occupancy array with one byte per cell, cells are
+    identified by the integer `y * width + x` and the neighbours of a cell
+    are computed arithmetically, so building a grid costs one allocation
+    plus one write per pit or block.
+
+    `fields` caches the distance fields computed on the grid (see fields.py),
+    it is emptied whenever the content of a cell changes.
+    """
+    __slots__ = ('width', 'height', 'cells', 'fields')
+
+    def __init__(self, width: int, height: int, cells: bytearray = None):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(width * height) if cells is None else cells
+        self.fields = {}
+
+    @classmethod
+    def from_json(cls, world_json: Dict) -> 'Grid':
+        """
+        Creates the grid of a world described in JSON.
+        """
+        width, height = world_json['size']
+        grid = cls(width, height)
+        for x, y in world_json.get('pits', []):
+            grid.cells[y * width + x] = PIT
+        for x, y in world_json.get('blocks', []):
+            grid.cells[y * width + x] = BLOCK
+        return grid
+
+    def __len__(self) -> int:
+        return self.width * self.height
+
+    def cell(self, x: int, y: int) -> int:
+        return y * self.width + x
+
+    def coords(self, cell: int) -> Tuple[int, int]:
+        y, x = divmod(cell, self.width)
+        return x, y
+
+    def contains(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def passable(self, cell: int) -> bool:
+        return self.cells[cell] == FREE
+
+    def ahead(self, cell: int, heading: int) -> int:
+        """
+        Returns the cell in front of `cell` looking at `heading`, -1 past the border.
+        """
+        if heading == NORTH:
+            return cell + self.width if cell + self.width < len(self.cells) else -1
+        if heading == EAST:
+            return cell + 1 if (cell + 1) % self.width else -1
+        if heading == SOUTH:
+            return cell - self.width if cell >= self.width else -1
+        return cell - 1 if cell % self.width else -1
+
+    def neighbours(self, cell: int) -> List[int]:
+        """
+        Returns the passable cells adjacent to `cell`.
+        """
+        cells = self.cells
+        result = []
+        for heading in range(4):
+            neighbour = self.ahead(cell, heading)
+            if neighbour >= 0 and cells[neighbour] == FREE:
+                result.append(neighbour)
+        return result
+
+    def set_content(self, cell: int, content: int):
+        """
+        Changes the content (FREE, PIT or BLOCK) of a cell.
+        """
+        if self.cells[cell] != content:
+            self.cells[cell] = content
+            self.fields.clear()
+
+    def free_cells(self) -> Iterable[int]:
+        return (cell for cell, content in enumerate(self.cells) if content == FREE)
+
+    def to_graph(self) -> nx.Graph:
+        """
+        Creates the equivalent NetworkX graph, nodes are (x, y) tuples.
+        """
+        G = nx.Graph()
+        for cell in self.free_cells():
+            G.add_node(self.coords(cell))
+            for neighbour in self.neighbours(cell):
+                if neighbour > cell:
+                    G.add_edge(self.coords(cell), self.coords(neighbour))
+        return G
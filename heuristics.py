@@ -1,5 +1,11 @@
-from typing import Tuple
+import argparse
 import math
+import sys
+from collections import deque
+from typing import Callable, Dict, Tuple
+import numpy as np
+from grid import Grid, HEADINGS
+from fields import UNREACHABLE
 
 
 def heuristic_manhatten_distance(source: Tuple, target: Tuple) -> float:
@@ -36,3 +42,241 @@ def heuristic_minmax(source: Tuple, target: Tuple, alpha: float = 0.0) -> float:
 
     distance = alpha * max(dx, dy) + (1 - alpha) * min(dx, dy)
     return distance
+
+
+def on_grid(heuristic: Callable, grid: Grid) -> Callable:
+    """
+    Adapts a heuristic on coordinates to the integer cell ids of a grid.Grid.
+    """
+    def cell_heuristic(source: int, target: int) -> float:
+        return heuristic(grid.coords(source), grid.coords(target))
+    return cell_heuristic
+
+
+# Turn-aware heuristics
+# ---------------------
+# The source is a pose (x, y, heading) with the heading as index in
+# grid.HEADINGS. Every move towards the target needs the hunter to face its
+# direction, so the turns to face all the directions of the target (from
+# the current heading) are added to the distance, both stay lower bounds.
+
+def _minimum_turns(sx: int, sy: int, heading: int) -> int:
+    """
+    Least turns to face, starting from `heading`, all the directions with sign (sx, sy).
+    """
+    directions = []
+    if sy:
+        directions.append(HEADINGS.index('N' if sy > 0 else 'S'))
+    if sx:
+        directions.append(HEADINGS.index('E' if sx > 0 else 'W'))
+
+    def turns(source: int, target: int) -> int:
+        return min((source - target) % 4, (target - source) % 4)
+
+    if len(directions) < 2:
+        return turns(heading, directions[0]) if directions else 0
+    # two perpendicular directions: face the closest first, then turn once more
+    return min(turns(heading, direction) for direction in directions) + 1
+
+
+# Least turns indexed by [sign(dx) + 1, sign(dy) + 1, heading]
+TURNS = np.array([
+    [[_minimum_turns(sx, sy, heading) for heading in range(4)] for sy in (-1, 0, 1)]
+    for sx in (-1, 0, 1)
+], dtype=np.int64)
+_TURNS = TURNS.tolist()
+
+
+def heuristic_manhatten_turns(source: Tuple, target: Tuple) -> float:
+    """
+    Manhattan distance plus the turns needed to face the target.
+    """
+    (x1, y1, heading) = source
+    (x2, y2) = target
+    dx, dy = x2 - x1, y2 - y1
+    return abs(dx) + abs(dy) + _TURNS[(dx > 0) - (dx < 0) + 1][(dy > 0) - (dy < 0) + 1][heading]
+
+
+def heuristic_euclidian_turns(source: Tuple, target: Tuple) -> float:
+    """
+    Euclidian distance plus the turns needed to face the target.
+    """
+    (x1, y1, heading) = source
+    (x2, y2) = target
+    dx, dy = x2 - x1, y2 - y1
+    return math.sqrt(dx**2 + dy**2) + _TURNS[(dx > 0) - (dx < 0) + 1][(dy > 0) - (dy < 0) + 1][heading]
+
+
+def batch_manhatten_turns(sources: np.ndarray, target: Tuple) -> np.ndarray:
+    """
+    heuristic_manhatten_turns of many poses at once, `sources` is a (k, 3) array of (x, y, heading).
+    """
+    dx = target[0] - sources[:, 0]
+    dy = target[1] - sources[:, 1]
+    return np.abs(dx) + np.abs(dy) + TURNS[np.sign(dx) + 1, np.sign(dy) + 1, sources[:, 2]]
+
+
+def batch_euclidian_turns(sources: np.ndarray, target: Tuple) -> np.ndarray:
+    """
+    heuristic_euclidian_turns of many poses at once, `sources` is a (k, 3) array of (x, y, heading).
+    """
+    dx = target[0] - sources[:, 0]
+    dy = target[1] - sources[:, 1]
+    return np.sqrt(dx**2 + dy**2) + TURNS[np.sign(dx) + 1, np.sign(dy) + 1, sources[:, 2]]
+
+
+# Heuristics called on poses, with their batch form
+TURN_AWARE = {
+    heuristic_manhatten_turns: batch_manhatten_turns,
+    heuristic_euclidian_turns: batch_euclidian_turns
+}
+
+
+def on_grid_poses(heuristic: Callable, grid: Grid) -> Callable:
+    """
+    Adapts a turn-aware heuristic to (cell id, heading) sources and cell id targets.
+    """
+    def pose_heuristic(source: int, heading: int, target: int) -> float:
+        return heuristic(grid.coords(source) + (heading,), grid.coords(target))
+    return pose_heuristic
+
+
+# Admissibility and consistency check
+# -----------------------------------
+
+def pose_distances(grid: Grid, target: int) -> np.ndarray:
+    """
+    Computes the exact cost (moves and turns) from every pose to the target cell.
+
+    The result is a (cells, 4) array indexed by cell id and heading,
+    UNREACHABLE where the target cannot be reached. Wumpuses are ignored
+    (they might be killed), so these are lower bounds of the real plans
+    too and every admissible heuristic must stay below them.
+    """
+    distances = np.full((len(grid), 4), UNREACHABLE, dtype=np.int64)
+    distances[target] = 0
+    queue = deque((target, heading) for heading in range(4))
+    while queue:
+        cell, heading = queue.popleft()
+        distance = distances[cell, heading] + 1
+        # turning into this heading, or moving from the cell behind
+        predecessors = [(cell, (heading + 1) % 4), (cell, (heading - 1) % 4)]
+        behind = grid.ahead(cell, (heading + 2) % 4)
+        if behind >= 0 and grid.passable(behind):
+            predecessors.append((behind, heading))
+        for predecessor in predecessors:
+            if distances[predecessor] == UNREACHABLE:
+                distances[predecessor] = distance
+                queue.append(predecessor)
+    return distances
+
+
+def heuristic_values(heuristic: Callable, grid: Grid, target: int) -> np.ndarray:
+    """
+    Evaluates a heuristic on every pose of the grid, as a (cells, 4) array.
+
+    Turn-aware heuristics are evaluated with their batch form, the others
+    on the cells only.
+    """
+    cells = np.arange(len(grid))
+    xs, ys = cells % grid.width, cells // grid.width
+    tx, ty = grid.coords(target)
+    if heuristic in TURN_AWARE:
+        poses = np.stack([np.repeat(xs, 4), np.repeat(ys, 4), np.tile(np.arange(4), len(grid))], axis=1)
+        return TURN_AWARE[heuristic](poses, (tx, ty)).reshape(len(grid), 4).astype(float)
+    values = np.array([heuristic((x, y), (tx, ty)) for x, y in zip(xs.tolist(), ys.tolist())], dtype=float)
+    return np.repeat(values[:, None], 4, axis=1)
+
+
+def check_heuristic(heuristic: Callable, grid: Grid, target: int) -> Dict:
+    """
+    Checks a heuristic to the target cell against the exact pose distances.
+
+    Admissibility is checked on every pose that reaches the target and
+    consistency (h(s) <= 1 + h(s') for every move and turn s -> s') on
+    every edge between them. Returns the number of poses, the violations,
+    the largest overestimate and the mean ratio of the heuristic to the
+    exact distance (how tight it is).
+    """
+    exact = pose_distances(grid, target)
+    values = heuristic_values(heuristic, grid, target)
+    reached = exact != UNREACHABLE
+    tolerance = 1e-9
+
+    overestimate = np.where(reached, values - exact, 0)
+    positive = reached & (exact > 0)
+
+    # edges between reached poses: the two turns, then the moves
+    inconsistent = 0
+    for turn in (1, -1):
+        turned = np.roll(values, -turn, axis=1)
+        inconsistent += np.count_nonzero(reached & (values > 1 + turned + tolerance))
+    for heading in range(4):
+        cells = np.flatnonzero(reached[:, heading])
+        ahead = np.array([grid.ahead(cell, heading) for cell in cells.tolist()], dtype=np.intp)
+        moving = ahead >= 0
+        cells, ahead = cells[moving], ahead[moving]
+        moving = reached[ahead, heading]
+        cells, ahead = cells[moving], ahead[moving]
+        inconsistent += np.count_nonzero(values[cells, heading] > 1 + values[ahead, heading] + tolerance)
+
+    return {
+        'poses': int(np.count_nonzero(reached)),
+        'inadmissible': int(np.count_nonzero(overestimate > tolerance)),
+        'inconsistent': int(inconsistent),
+        'max_overestimate': float(overestimate.max()) if reached.any() else 0.0,
+        'tightness': float((values[positive] / exact[positive]).mean()) if positive.any() else 1.0
+    }
+
+
+def main(*cargs):
+    """Check the admissibility and consistency of the heuristics on generated worlds"""
+    from generator import generate_worlds
+
+    heuristics = {function.__name__[len('heuristic_'):]: function for function in (
+        heuristic_manhatten_distance,
+        heuristic_euclidian_distance,
+        heuristic_manhatten_distance_cheat,
+        heuristic_minmax,
+        heuristic_manhatten_turns,
+        heuristic_euclidian_turns
+    )}
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--heuristics', nargs='+', choices=list(heuristics), default=list(heuristics), help='heuristics to check')
+    parser.add_argument('--size', nargs=2, type=int, default=[16, 16], metavar=('WIDTH', 'HEIGHT'), help='size of the worlds')
+    parser.add_argument('--count', type=int, default=20, help='number of worlds')
+    parser.add_argument('--seed', default='check', help='seed of the worlds')
+    parser.add_argument('--pit-density', type=float, default=0.2, help='probability of a pit in a cell')
+    parser.add_argument('--block-density', type=float, default=0.05, help='probability of a block in a cell')
+    args = parser.parse_args(cargs)
+
+    totals = {name: {'poses': 0, 'inadmissible': 0, 'inconsistent': 0, 'max_overestimate': 0.0, 'tightness': []}
+              for name in args.heuristics}
+    worlds = generate_worlds(args.size[0], args.size[1], count=args.count, seed=args.seed,
+                             pit_density=args.pit_density, block_density=args.block_density)
+    for world in worlds:
+        grid = Grid.from_json(world)
+        # the golds and the exits are the targets of the planner
+        for target in {grid.cell(x, y) for x, y in world['golds'] + world['exits']}:
+            for name in args.heuristics:
+                result = check_heuristic(heuristics[name], grid, target)
+                total = totals[name]
+                for key in ('poses', 'inadmissible', 'inconsistent'):
+                    total[key] += result[key]
+                total['max_overestimate'] = max(total['max_overestimate'], result['max_overestimate'])
+                total['tightness'].append(result['tightness'])
+
+    failed = False
+    print('{:26} {:>10} {:>12} {:>12} {:>10} {:>10}'.format(
+        'heuristic', 'poses', 'inadmissible', 'inconsistent', 'max over', 'tightness'))
+    for name, total in totals.items():
+        failed = failed or total['inadmissible'] > 0 or total['inconsistent'] > 0
+        print('{:26} {:>10} {:>12} {:>12} {:>10.2f} {:>10.3f}'.format(
+            name, total['poses'], total['inadmissible'], total['inconsistent'],
+            total['max_overestimate'], sum(total['tightness']) / max(len(total['tightness']), 1)))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,494 @@
+import copy
+import hashlib
+import heapq
+import itertools
+from collections import OrderedDict, deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from grid import Grid, FREE
+from fields import UNREACHABLE
+
+
+# Side of the square clusters, in cells
+CLUSTER_SIZE = 32
+
+# Runs of border cells at least this long get an entrance at both ends, shorter ones one in the middle
+LONG_ENTRANCE = 6
+
+# Clusters flooded at once when computing the distances between entrances
+CHUNK = 1024
+
+# Node of the abstract search standing for the target
+_TARGET = -2
+
+# Graphs of the last worlds, by content: the players build a new grid for every episode
+GRAPHS_KEPT = 8
+
+# Variants of a graph kept for the last sets of avoided cells (the Wumpuses of the queries)
+VARIANTS_KEPT = 16
+_graphs: 'OrderedDict[Tuple, AbstractGraph]' = OrderedDict()
+
+
+class AbstractGraph:
+    """
+    Hierarchical map of a grid for HPA* (Hierarchical Path-Finding A*).
+
+    The grid is split in square clusters. Where two clusters touch, every
+    run of facing walkable cells gets one or two entrances (a pair of
+    cells across the border, joined by a move), and the distances between
+    the entrances of a cluster are precomputed without leaving it. A path
+    query only searches the cluster of the source and the one of the
+    target, then the small graph of the entrances, so the graph is built
+    once per world and shared by all the queries (see abstract_graph).
+    Paths are close to the shortest, not always the shortest: they cross
+    the borders at the entrances.
+
+    After set_content only the clusters whose cells or entrances changed
+    are computed again, the same way the cells avoided by a query (see
+    path) only recompute their clusters, in a variant of the graph.
+    """
+
+    def __init__(self, grid: Grid, cluster_size: int = CLUSTER_SIZE):
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.columns = -(-grid.width // cluster_size)
+        self.rows = -(-grid.height // cluster_size)
+
+        self.walkable = (np.frombuffer(grid.cells, dtype=np.uint8) == FREE).reshape(grid.height, grid.width)
+
+        # pairs of cells (first cluster, second cluster) across each border
+        self.transitions: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        # entrance cells of every cluster, their distances and the cells across
+        self.entrances: Dict[int, List[int]] = {}
+        self.distances: Dict[int, List[List[int]]] = {}
+        self.partners: Dict[int, List[int]] = {}
+        self.index: Dict[int, int] = {}
+        # search trees inside a cluster from its entrances, made when first needed
+        self.segments: Dict[int, Dict[int, Dict[int, int]]] = {}
+        # clusters computed so far, to check that updates stay local
+        self.rebuilt = 0
+        # variants of the graph without some cells, by set of cells (see avoiding)
+        self.variants: 'OrderedDict[FrozenSet[int], AbstractGraph]' = OrderedDict()
+
+        clusters = range(self.columns * self.rows)
+        for cluster in clusters:
+            for neighbour in self._neighbours(cluster):
+                if neighbour > cluster:
+                    self.transitions[cluster, neighbour] = self._find_transitions(cluster, neighbour)
+        self._rebuild(set(clusters))
+
+    # Clusters and borders
+    # --------------------
+
+    def cluster_of(self, cell: int) -> int:
+        x, y = self.grid.coords(cell)
+        return (y // self.cluster_size) * self.columns + x // self.cluster_size
+
+    def _bounds(self, cluster: int) -> Tuple[int, int, int, int]:
+        """
+        Returns x0, y0, x1, y1 (excluded) of the cells of a cluster.
+        """
+        row, column = divmod(cluster, self.columns)
+        size = self.cluster_size
+        return (column * size, row * size,
+                min(self.grid.width, (column + 1) * size), min(self.grid.height, (row + 1) * size))
+
+    def _neighbours(self, cluster: int) -> List[int]:
+        row, column = divmod(cluster, self.columns)
+        neighbours = []
+        if column > 0:
+            neighbours.append(cluster - 1)
+        if column < self.columns - 1:
+            neighbours.append(cluster + 1)
+        if row > 0:
+            neighbours.append(cluster - self.columns)
+        if row < self.rows - 1:
+            neighbours.append(cluster + self.columns)
+        return neighbours
+
+    def _find_transitions(self, first: int, second: int) -> List[Tuple[int, int]]:
+        """
+        Places the entrances on the border between two adjacent clusters (`second` right of or above `first`).
+        """
+        x0, y0, x1, y1 = self._bounds(first)
+        width = self.grid.width
+        if second != first + self.columns:
+            # vertical border: cells (x1 - 1, y) and (x1, y)
+            facing = (self.walkable[y0:y1, x1 - 1] & self.walkable[y0:y1, x1]).tolist()
+
+            def pair(index: int) -> Tuple[int, int]:
+                cell = (y0 + index) * width + x1 - 1
+                return cell, cell + 1
+        else:
+            # horizontal border: cells (x, y1 - 1) and (x, y1)
+            facing = (self.walkable[y1 - 1, x0:x1] & self.walkable[y1, x0:x1]).tolist()
+
+            def pair(index: int) -> Tuple[int, int]:
+                cell = (y1 - 1) * width + x0 + index
+                return cell, cell + width
+
+        transitions = []
+        start = None
+        for index, open_ in enumerate(facing + [False]):
+            if open_ and start is None:
+                start = index
+            elif not open_ and start is not None:
+                if index - start >= LONG_ENTRANCE:
+                    transitions += [pair(start), pair(index - 1)]
+                else:
+                    transitions.append(pair((start + index - 1) // 2))
+                start = None
+        return transitions
+
+    def _rebuild(self, clusters: Set[int]):
+        """
+        Recomputes the entrances and the distances of the clusters, after their transitions changed.
+        """
+        for cluster in clusters:
+            for cell in self.entrances.get(cluster, []):
+                self.partners.pop(cell, None)
+                self.index.pop(cell, None)
+
+        for cluster in clusters:
+            entrances = []
+            for neighbour in self._neighbours(cluster):
+                key = (min(cluster, neighbour), max(cluster, neighbour))
+                for pair in self.transitions[key]:
+                    cell, across = pair if key[0] == cluster else pair[::-1]
+                    if cell not in self.partners:
+                        self.partners[cell] = []
+                        self.index[cell] = len(entrances)
+                        entrances.append(cell)
+                    self.partners[cell].append(across)
+            self.entrances[cluster] = entrances
+            self.segments[cluster] = {}
+
+        ordered = sorted(clusters)
+        for first in range(0, len(ordered), CHUNK):
+            self._compute_distances(ordered[first:first + CHUNK])
+        self.rebuilt += len(clusters)
+
+    def _compute_distances(self, clusters: List[int]):
+        """
+        Floods all the clusters at once to get the distances between their entrances.
+
+        The clusters are stacked in a (clusters, size, size) array, so the
+        flood cannot leak from one to another, and every cell keeps a 64 bit
+        mask of the entrances that reached it (one pass per 64 entrances).
+        """
+        size = self.cluster_size
+        windows = np.zeros((len(clusters), size, size), dtype=bool)
+        counts = [len(self.entrances[cluster]) for cluster in clusters]
+        which, local_y, local_x, local_index = [], [], [], []
+        for slot, cluster in enumerate(clusters):
+            x0, y0, x1, y1 = self._bounds(cluster)
+            windows[slot, :y1 - y0, :x1 - x0] = self.walkable[y0:y1, x0:x1]
+            for index, cell in enumerate(self.entrances[cluster]):
+                x, y = self.grid.coords(cell)
+                which.append(slot)
+                local_y.append(y - y0)
+                local_x.append(x - x0)
+                local_index.append(index)
+
+        which, local_y, local_x, local_index = (np.array(values, dtype=np.intp)
+                                                for values in (which, local_y, local_x, local_index))
+        # the matrices of all the clusters, one after the other in a flat array
+        offsets = np.concatenate(([0], np.cumsum(np.square(counts)))).astype(np.intp)
+        matrices = np.full(offsets[-1], UNREACHABLE, dtype=np.int64)
+        matrices[offsets[which] + local_index * (np.asarray(counts, dtype=np.intp)[which] + 1)] = 0
+        row_base = offsets[which] + local_index
+        row_stride = np.asarray(counts, dtype=np.intp)[which]
+
+        blocked = ~windows
+        bits = np.arange(64, dtype=np.uint64)
+        for first in range(0, max(counts, default=0), 64):
+            sources = (local_index >= first) & (local_index < first + 64)
+            reached = np.zeros(windows.shape, dtype=np.uint64)
+            reached[which[sources], local_y[sources], local_x[sources]] = (
+                np.uint64(1) << (local_index[sources] - first).astype(np.uint64)
+            )
+            frontier = reached.copy()
+            step = 0
+            while frontier.any():
+                step += 1
+                spread = np.zeros_like(frontier)
+                spread[:, 1:, :] |= frontier[:, :-1, :]
+                spread[:, :-1, :] |= frontier[:, 1:, :]
+                spread[:, :, 1:] |= frontier[:, :, :-1]
+                spread[:, :, :-1] |= frontier[:, :, 1:]
+                spread &= ~reached
+                spread[blocked] = 0
+                reached |= spread
+                frontier = spread
+
+                # entrances reached for the first time at this step, decoded bit by bit
+                arrived = spread[which, local_y, local_x]
+                rows = np.flatnonzero(arrived)
+                if not rows.size:
+                    continue
+                hits = ((arrived[rows, None] >> bits) & np.uint64(1)).astype(bool)
+                hit_rows, hit_bits = np.nonzero(hits)
+                rows = rows[hit_rows]
+                # entry (source, target) of the matrix of the cluster
+                matrices[row_base[rows] + (first + hit_bits) * row_stride[rows]] = step
+
+        for slot, cluster in enumerate(clusters):
+            count = counts[slot]
+            self.distances[cluster] = matrices[offsets[slot]:offsets[slot + 1]].reshape(count, count).tolist()
+
+    def set_content(self, cell: int, content: int):
+        """
+        Changes a cell of the grid, recomputing only the clusters affected.
+
+        Those are the cluster of the cell and, if its entrances change, the
+        neighbours across the borders of the cell.
+        """
+        self.grid.set_content(cell, content)
+        self.walkable.flat[cell] = content == FREE
+        self._update({cell})
+        # the variants may be shared with the graphs of other grids (see for_grid)
+        self.variants = OrderedDict()
+
+        # the grid dropped its caches, this graph is still valid (for the new content)
+        self.grid.fields[('hpa', self.cluster_size)] = self
+        for key in [key for key, graph in _graphs.items() if graph is self]:
+            del _graphs[key]
+
+    def _update(self, cells: Set[int]):
+        """
+        Recomputes the clusters of cells whose walkable flag changed, and their neighbours whose entrances changed.
+        """
+        changed = {self.cluster_of(cell) for cell in cells}
+        for cluster in list(changed):
+            for neighbour in self._neighbours(cluster):
+                key = (min(cluster, neighbour), max(cluster, neighbour))
+                transitions = self._find_transitions(*key)
+                if transitions != self.transitions[key]:
+                    self.transitions[key] = transitions
+                    changed.add(neighbour)
+        self._rebuild(changed)
+
+    def avoiding(self, avoid: Iterable[int]) -> 'AbstractGraph':
+        """
+        Returns the graph of the grid where the `avoid` cells are not walkable, kept for the next queries.
+
+        The variant shares everything with this graph but the clusters of
+        the avoided cells (and the neighbours whose entrances moved), which
+        are computed again: a few clusters per set of Wumpuses instead of
+        the whole graph.
+        """
+        avoid = frozenset(cell for cell in avoid if self.walkable.flat[cell])
+        if not avoid:
+            return self
+        variant = self.variants.get(avoid)
+        if variant is None:
+            variant = self._copy()
+            variant.walkable.flat[list(avoid)] = False
+            variant.variants = OrderedDict()
+            variant._update(set(avoid))
+            self.variants[avoid] = variant
+            while len(self.variants) > VARIANTS_KEPT:
+                self.variants.popitem(last=False)
+        else:
+            self.variants.move_to_end(avoid)
+        return variant
+
+    def for_grid(self, grid: Grid) -> 'AbstractGraph':
+        """
+        Returns the graph of another grid with the same content.
+
+        The copy shares the clusters and the variants computed so far, but
+        set_content on either graph only changes its own grid and clusters.
+        """
+        if grid is self.grid:
+            return self
+        graph = self._copy()
+        graph.grid = grid
+        return graph
+
+    def _copy(self) -> 'AbstractGraph':
+        """
+        Shallow copy of the graph with its own walkable flags and cluster dicts.
+        """
+        graph = copy.copy(self)
+        graph.walkable = self.walkable.copy()
+        for name in ('transitions', 'entrances', 'distances', 'partners', 'index', 'segments'):
+            # _rebuild replaces the entries of the clusters it computes, the others stay shared
+            setattr(graph, name, dict(getattr(self, name)))
+        return graph
+
+    # Queries
+    # -------
+
+    def _local_search(self, cluster: int, start: int) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """
+        Breadth first search from `start` without leaving its cluster, returns the distances and the parents.
+        """
+        x0, y0, x1, y1 = self._bounds(cluster)
+        width = self.grid.width
+        walkable = self.walkable.reshape(-1)
+        distances = {start: 0}
+        parents = {}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            y, x = divmod(cell, width)
+            for neighbour, inside in ((cell + 1, x + 1 < x1), (cell - 1, x > x0),
+                                      (cell + width, y + 1 < y1), (cell - width, y > y0)):
+                if inside and walkable[neighbour] and neighbour not in distances:
+                    distances[neighbour] = distances[cell] + 1
+                    parents[neighbour] = cell
+                    queue.append(neighbour)
+        return distances, parents
+
+    def _segment(self, cluster: int, source: int, target: int) -> List[int]:
+        """
+        Cells from an entrance to another of the same cluster (source excluded).
+
+        The search tree of every entrance is kept, so the other segments
+        from the same entrance are read from it.
+        """
+        trees = self.segments[cluster]
+        if source not in trees:
+            trees[source] = self._local_search(cluster, source)[1]
+        parents = trees[source]
+        cells = [target]
+        while cells[-1] != source:
+            cells.append(parents[cells[-1]])
+        return cells[-2::-1]
+
+    def path(self, source: int, target: int, avoid: Iterable[int] = ()) -> Tuple[Optional[List[int]], int]:
+        """
+        Returns the cells of a path from source to target (None if there is none) and the abstract nodes expanded.
+
+        Both cells must be walkable (not a pit, a block or in `avoid`), the
+        cells in `avoid` are treated like pits (see avoiding).
+
+        Only the clusters of the source and of the target are searched cell
+        by cell, the rest of the way goes through the entrances.
+        """
+        if avoid:
+            variant = self.avoiding(avoid)
+            if variant is not self:
+                return variant.path(source, target)
+        if not (self.walkable.flat[source] and self.walkable.flat[target]):
+            return None, 0
+        if source == target:
+            return [source], 0
+
+        source_cluster, target_cluster = self.cluster_of(source), self.cluster_of(target)
+        from_source, source_parents = self._local_search(source_cluster, source)
+        to_target, target_parents = self._local_search(target_cluster, target)
+        tx, ty = self.grid.coords(target)
+
+        def estimate(cell: int) -> int:
+            x, y = self.grid.coords(cell)
+            return abs(x - tx) + abs(y - ty)
+
+        def edges(node: int):
+            if node == source:
+                for entrance in self.entrances[source_cluster]:
+                    if entrance in from_source:
+                        yield entrance, from_source[entrance]
+                for across in self.partners.get(source, ()):
+                    yield across, 1
+                if target in from_source:
+                    yield _TARGET, from_source[target]
+                return
+            cluster = self.cluster_of(node)
+            entrances = self.entrances[cluster]
+            row = self.distances[cluster][self.index[node]]
+            for entrance, distance in zip(entrances, row):
+                if distance > 0:
+                    yield entrance, distance
+            for across in self.partners[node]:
+                yield across, 1
+            if cluster == target_cluster and node in to_target:
+                yield _TARGET, to_target[node]
+
+        counter = itertools.count()
+        # ties are broken towards the deepest nodes, open areas have many paths of equal cost
+        frontier = [(estimate(source), 0, next(counter), source)]
+        best = {source: 0}
+        parents: Dict[int, int] = {}
+        expanded = 0
+        while frontier:
+            _, depth, _, node = heapq.heappop(frontier)
+            cost = -depth
+            if cost > best[node]:
+                continue
+            if node == _TARGET:
+                return self._refine(source, target, parents, source_parents, target_parents), expanded
+            expanded += 1
+            for successor, distance in edges(node):
+                successor_cost = cost + distance
+                if successor_cost < best.get(successor, successor_cost + 1):
+                    best[successor] = successor_cost
+                    parents[successor] = node
+                    remaining = 0 if successor == _TARGET else estimate(successor)
+                    heapq.heappush(frontier, (successor_cost + remaining, -successor_cost, next(counter), successor))
+        return None, expanded
+
+    def _refine(self, source: int, target: int, parents: Dict[int, int],
+                source_parents: Dict[int, int], target_parents: Dict[int, int]) -> List[int]:
+        """
+        Turns the abstract path (source, entrances, target) into cells.
+        """
+        nodes = [_TARGET]
+        while nodes[-1] != source:
+            nodes.append(parents[nodes[-1]])
+        nodes.reverse()
+
+        path = [source]
+        for first, second in zip(nodes, nodes[1:]):
+            if second != _TARGET and self.cluster_of(first) != self.cluster_of(second):
+                # across a border
+                path.append(second)
+            elif first == source:
+                # back from the entrance (or the target) to the source
+                end = target if second == _TARGET else second
+                cells = [end]
+                while cells[-1] != source:
+                    cells.append(source_parents[cells[-1]])
+                path += cells[-2::-1]
+            elif second == _TARGET:
+                # the parents of the target search lead to the target
+                cell = first
+                while cell != target:
+                    cell = target_parents[cell]
+                    path.append(cell)
+            else:
+                path += self._segment(self.cluster_of(first), first, second)
+        return path
+
+
+def abstract_graph(grid: Grid, cluster_size: int = CLUSTER_SIZE) -> AbstractGraph:
+    """
+    Returns the abstract graph of the grid, building it only once per grid.
+
+    It is cached in `grid.fields`: editing the grid with set_content of the
+    graph keeps it (and updates it), editing the grid directly drops it.
+    The last GRAPHS_KEPT graphs are also kept by the content of their grid,
+    so the grids of later episodes on the same world reuse them, whatever
+    the cells their queries avoid, through a copy (see for_grid).
+    """
+    key = ('hpa', cluster_size)
+    if key not in grid.fields:
+        content = (grid.width, hashlib.sha1(grid.cells).hexdigest()) + key
+        graph = _graphs.get(content)
+        if graph is None:
+            graph = _graphs[content] = AbstractGraph(grid, cluster_size)
+            while len(_graphs) > GRAPHS_KEPT:
+                _graphs.popitem(last=False)
+        else:
+            _graphs.move_to_end(content)
+            graph = graph.for_grid(grid)
+        grid.fields[key] = graph
+    return grid.fields[key]
+
+
+def hpa_path(grid: Grid, source: int, target: int, avoid: Iterable[int] = ()) -> Tuple[Optional[List[int]], int]:
+    """
+    HPA* path between two cells on the cached abstract graph, same interface as the engines of jps.py.
+    """
+    return abstract_graph(grid).path(source, target, avoid)
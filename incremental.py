@@ -0,0 +1,259 @@
+import heapq
+import math
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from grid import Grid, FREE, PIT, BLOCK
+from planner import State, SearchResult, ACTION_COSTS, NONE, locate, successors
+from plans import Plan
+from sight import shooting_index, update_shooting_index
+
+
+# Virtual vertex reached by climbing out with the gold
+GOAL = 'goal'
+
+
+class IncrementalPlanner:
+    """
+    Planner keeping its search state between solves (Lifelong Planning A*).
+
+    The graph is the one of planner.plan, states are (cell, heading,
+    has_gold, has_arrow, killed) plus a virtual goal reached with
+    'Climb'. After an edit (add_pit, remove_pit, add_block, move_wumpus,
+    move_gold) only the states whose incoming actions changed are updated,
+    and the next solve re-expands just the states whose cost is affected,
+    the hunter start never changes.
+    """
+
+    def __init__(self, world_json: Dict, grid: Optional[Grid] = None):
+        self.grid = Grid.from_json(world_json) if grid is None else grid
+        self.start, self.gold, self.exits, self.wumpuses = locate(world_json, self.grid)
+        # cells where a Wumpus has ever been, states may have killed it there
+        self.kill_cells = set(self.wumpuses)
+        self.targets = shooting_index(self.grid, self.wumpuses)
+        self.g: Dict = {}
+        self.rhs: Dict = {self.start: 0}
+        self.queue: List = []
+        self.queued: Dict = {}
+        self.expanded = 0
+        self._push(self.start)
+
+    # Costs, heuristic and graph
+    # --------------------------
+
+    def _estimate(self, vertex) -> int:
+        """
+        Moves to the gold and to the exit (Manhattan), plus 'Grab' and 'Climb'.
+        """
+        if vertex == GOAL:
+            return 0
+        x, y = self.grid.coords(vertex.cell)
+        to_exit = min(abs(x - ex) + abs(y - ey) for ex, ey in map(self.grid.coords, self.exits))
+        if vertex.has_gold:
+            return to_exit + 1
+        gx, gy = self.grid.coords(self.gold)
+        gold_to_exit = min(abs(gx - ex) + abs(gy - ey) for ex, ey in map(self.grid.coords, self.exits))
+        return abs(x - gx) + abs(y - gy) + gold_to_exit + 2
+
+    def _successors(self, vertex) -> Iterator[Tuple[str, object, int]]:
+        """
+        Yields (action, successor, cost) of a vertex.
+        """
+        if vertex == GOAL:
+            return
+        for action, successor in successors(vertex, self.grid, self.gold, self.wumpuses, self.targets):
+            yield action, successor, ACTION_COSTS[action]
+        if vertex.has_gold and vertex.cell in self.exits:
+            yield 'Climb', GOAL, ACTION_COSTS['Climb']
+
+    def _cell_states(self, cell: int, has_gold: Optional[bool] = None) -> Iterator[State]:
+        """
+        Yields all the states located in a cell.
+        """
+        for heading in range(4):
+            for gold in ((False, True) if has_gold is None else (has_gold,)):
+                yield State(cell, heading, gold, True, NONE)
+                yield State(cell, heading, gold, False, NONE)
+                for killed in self.kill_cells:
+                    yield State(cell, heading, gold, False, killed)
+
+    def _predecessors(self, vertex) -> Iterator[State]:
+        """
+        Yields the candidate predecessors of a vertex (a superset, edges are checked with the successors).
+        """
+        if vertex == GOAL:
+            for exit_ in self.exits:
+                yield from self._cell_states(exit_, has_gold=True)
+            return
+
+        yield vertex._replace(heading=(vertex.heading + 1) % 4)
+        yield vertex._replace(heading=(vertex.heading - 1) % 4)
+        behind = self.grid.ahead(vertex.cell, (vertex.heading + 2) % 4)
+        if behind >= 0:
+            yield vertex._replace(cell=behind)
+        if not vertex.has_arrow:
+            yield vertex._replace(has_arrow=True, killed=NONE)
+        if vertex.has_gold:
+            yield vertex._replace(has_gold=False)
+
+    def _edge_cost(self, source, target) -> Tuple[float, Optional[str]]:
+        best = (math.inf, None)
+        for action, successor, cost in self._successors(source):
+            if successor == target and cost < best[0]:
+                best = (cost, action)
+        return best
+
+    # Lifelong Planning A*
+    # --------------------
+
+    def _key(self, vertex) -> Tuple[float, float]:
+        cost = min(self.g.get(vertex, math.inf), self.rhs.get(vertex, math.inf))
+        return cost + self._estimate(vertex), cost
+
+    def _push(self, vertex):
+        key = self._key(vertex)
+        self.queued[vertex] = key
+        heapq.heappush(self.queue, (key, id(vertex), vertex))
+
+    def _top_key(self) -> Tuple[float, float]:
+        # entries are removed lazily: skip the ones that are stale
+        while self.queue:
+            key, _, vertex = self.queue[0]
+            if self.queued.get(vertex) == key:
+                return key
+            heapq.heappop(self.queue)
+        return math.inf, math.inf
+
+    def _update_vertex(self, vertex):
+        if vertex != self.start:
+            rhs = math.inf
+            for predecessor in self._predecessors(vertex):
+                g = self.g.get(predecessor, math.inf)
+                if g < rhs:
+                    rhs = min(rhs, g + self._edge_cost(predecessor, vertex)[0])
+            if rhs == math.inf:
+                self.rhs.pop(vertex, None)
+            else:
+                self.rhs[vertex] = rhs
+
+        self.queued.pop(vertex, None)
+        if self.g.get(vertex, math.inf) != self.rhs.get(vertex, math.inf):
+            self._push(vertex)
+
+    def _compute(self):
+        while (self._top_key() < self._key(GOAL)
+               or self.rhs.get(GOAL, math.inf) != self.g.get(GOAL, math.inf)):
+            if not self.queue:
+                break
+            _, _, vertex = heapq.heappop(self.queue)
+            del self.queued[vertex]
+            self.expanded += 1
+
+            if self.g.get(vertex, math.inf) > self.rhs.get(vertex, math.inf):
+                self.g[vertex] = self.rhs[vertex]
+                for _, successor, _ in self._successors(vertex):
+                    self._update_vertex(successor)
+            else:
+                self.g.pop(vertex, None)
+                self._update_vertex(vertex)
+                for _, successor, _ in self._successors(vertex):
+                    self._update_vertex(successor)
+
+    def solve(self) -> SearchResult:
+        """
+        Returns the optimal plan, repairing the previous search after edits.
+
+        `expanded` counts the states expanded by this call only.
+        """
+        self.expanded = 0
+        self._compute()
+
+        cost = self.g.get(GOAL, math.inf)
+        if cost == math.inf:
+            return SearchResult(actions=['Climb'], cost=ACTION_COSTS['Climb'], expanded=self.expanded)
+
+        # walk back from the goal through predecessors on a cheapest path
+        actions = []
+        vertex = GOAL
+        while vertex != self.start:
+            for predecessor in self._predecessors(vertex):
+                edge_cost, action = self._edge_cost(predecessor, vertex)
+                if self.g.get(predecessor, math.inf) + edge_cost == self.g[vertex]:
+                    actions.append(action)
+                    vertex = predecessor
+                    break
+            else:
+                # the costs are consistent after _compute, the walk back always finds one
+                raise RuntimeError('no predecessor of {} on a cheapest path'.format(vertex))
+        return SearchResult(actions=Plan.from_actions(reversed(actions)), cost=cost, expanded=self.expanded)
+
+    # Edits
+    # -----
+
+    def _changed(self, cells: Set[int]):
+        """
+        Updates the states in the cells, their incoming actions changed.
+        """
+        for cell in cells:
+            for state in self._cell_states(cell):
+                self._update_vertex(state)
+
+    def _retarget(self, cells: Set[int]) -> Set[int]:
+        """
+        Updates the shooting index along the lines of the cells, returns the cells where some shot changed target.
+        """
+        return update_shooting_index(self.grid, self.wumpuses, self.targets, cells)
+
+    def _set_content(self, x: int, y: int, content: int):
+        cell = self.grid.cell(x, y)
+        if self.grid.cells[cell] != content:
+            # adding or removing a block also changes the lines of sight
+            blocking = BLOCK in (self.grid.cells[cell], content)
+            self.grid.set_content(cell, content)
+            self._changed(self._retarget({cell}) | {cell} if blocking else {cell})
+
+    def add_pit(self, x: int, y: int):
+        self._set_content(x, y, PIT)
+
+    def remove_pit(self, x: int, y: int):
+        self._set_content(x, y, FREE)
+
+    def add_block(self, x: int, y: int):
+        self._set_content(x, y, BLOCK)
+
+    def remove_block(self, x: int, y: int):
+        self._set_content(x, y, FREE)
+
+    def move_wumpus(self, x: int, y: int, source: Optional[Tuple[int, int]] = None):
+        """
+        Moves the Wumpus in `source` (the only one if None) to (x, y).
+
+        Entering changes in both cells, shooting in the ones in line with them.
+        """
+        if source is None:
+            if len(self.wumpuses) != 1:
+                raise ValueError('the Wumpus to move must be given when there are {}'.format(len(self.wumpuses)))
+            old = next(iter(self.wumpuses))
+        else:
+            old = self.grid.cell(*source)
+        new = self.grid.cell(x, y)
+        if old not in self.wumpuses:
+            raise ValueError('there is no Wumpus in {}'.format(self.grid.coords(old)))
+
+        self.wumpuses = self.wumpuses - {old} | {new}
+        self.kill_cells.add(new)
+        self._changed(self._retarget({old, new}) | {old, new})
+
+    def move_gold(self, x: int, y: int):
+        """
+        Moves the gold: 'Grab' changes in both cells, and so does the heuristic.
+        """
+        old, new = self.gold, self.grid.cell(x, y)
+        self.gold = new
+
+        # the estimates changed, queued vertices need their new keys
+        self.queued.clear()
+        self.queue = []
+        vertices = set(self.g) | set(self.rhs)
+        for vertex in vertices:
+            if self.g.get(vertex, math.inf) != self.rhs.get(vertex, math.inf):
+                self._push(vertex)
+        self._changed({old, new})
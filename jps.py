@@ -0,0 +1,315 @@
+import argparse
+import heapq
+import itertools
+import sys
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from grid import Grid, FREE
+from planner import SearchResult, ACTION_COSTS
+from utils import Agent, cost_function
+from hpa import hpa_path
+
+
+# Unit steps of the 4 directions, as (dx, dy)
+STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+# Maps the content of a cell to 1 if the hunter can walk on it
+WALKABLE = bytes(content == FREE for content in range(256))
+
+
+@contextmanager
+def _walkable(grid: Grid, avoid: Iterable[int]) -> Iterator[bytearray]:
+    """
+    One byte per cell, 1 where the hunter can walk (free and not avoided), for the duration of the block.
+
+    The bytes of the grid are computed once and cached in `grid.fields`,
+    the avoided cells are only masked on them while the block runs: a
+    variant of the map costs one write per avoided cell instead of a copy.
+    """
+    walkable = grid.fields.get(('walkable',))
+    if walkable is None:
+        walkable = grid.fields[('walkable',)] = grid.cells.translate(WALKABLE)
+    masked = [cell for cell in set(avoid) if walkable[cell]]
+    for cell in masked:
+        walkable[cell] = 0
+    try:
+        yield walkable
+    finally:
+        for cell in masked:
+            walkable[cell] = 1
+
+
+def _unfold(grid: Grid, points: List[int]) -> List[int]:
+    """
+    Expands a path of jump points (joined by straight lines) into all its cells.
+    """
+    path = points[:1]
+    for source, target in zip(points, points[1:]):
+        (x1, y1), (x2, y2) = grid.coords(source), grid.coords(target)
+        step = (x2 > x1) - (x2 < x1) + ((y2 > y1) - (y2 < y1)) * grid.width
+        path.extend(range(source + step, target + step, step))
+    return path
+
+
+def astar_path(grid: Grid, source: int, target: int, avoid: Iterable[int] = ()) -> Tuple[Optional[List[int]], int]:
+    """
+    Plain A* (Manhattan distance) over the cells, moves only.
+
+    Returns the cells of a shortest path (None if there is none) and the
+    number of expanded cells, cells in `avoid` are treated like pits.
+    """
+    with _walkable(grid, avoid) as walkable:
+        return _astar_path(grid, walkable, source, target)
+
+
+def _astar_path(grid: Grid, walkable: bytearray, source: int, target: int) -> Tuple[Optional[List[int]], int]:
+    tx, ty = grid.coords(target)
+    counter = itertools.count()
+    frontier = [(0, 0, next(counter), source)]
+    best: Dict[int, int] = {source: 0}
+    parents: Dict[int, int] = {}
+    expanded = 0
+
+    while frontier:
+        _, cost, _, cell = heapq.heappop(frontier)
+        if cost > best[cell]:
+            continue
+        expanded += 1
+        if cell == target:
+            path = [cell]
+            while cell in parents:
+                cell = parents[cell]
+                path.append(cell)
+            return path[::-1], expanded
+        for neighbour in grid.neighbours(cell):
+            if walkable[neighbour] and cost + 1 < best.get(neighbour, cost + 2):
+                best[neighbour] = cost + 1
+                parents[neighbour] = cell
+                x, y = grid.coords(neighbour)
+                heapq.heappush(frontier, (cost + 1 + abs(x - tx) + abs(y - ty), cost + 1, next(counter), neighbour))
+    return None, expanded
+
+
+def jps_path(grid: Grid, source: int, target: int, avoid: Iterable[int] = ()) -> Tuple[Optional[List[int]], int]:
+    """
+    Jump Point Search over the cells, with the pruning rules of 4-connected grids.
+
+    Shortest paths are made canonical by moving vertically as soon as
+    possible: a horizontal jump keeps going until the target, an obstacle
+    or a cell where a vertical move is forced (the cell above or below is
+    free while the one behind it is not), a vertical jump stops where one
+    of its horizontal scans finds a jump point. Only jump points are queued,
+    so open areas are crossed without expanding their cells. Returns the
+    same as astar_path, the expansions count jump points.
+    """
+    with _walkable(grid, avoid) as walkable:
+        return _jps_path(grid, walkable, source, target)
+
+
+def _jps_path(grid: Grid, walkable: bytearray, source: int, target: int) -> Tuple[Optional[List[int]], int]:
+    width, height = grid.width, grid.height
+    tx, ty = grid.coords(target)
+
+    def free(x: int, y: int) -> bool:
+        return 0 <= x < width and 0 <= y < height and walkable[y * width + x] == 1
+
+    def jump_horizontal(x: int, y: int, dx: int) -> Optional[Tuple[int, int]]:
+        # the rows are scanned with bytearray.find (in C): the jump ends before
+        # the first obstacle, at the target or where a cell above or below
+        # becomes free after an obstacle (the forced vertical moves)
+        row = y * width
+        stops = []
+        if dx > 0:
+            obstacle = walkable.find(0, row + x + 1, row + width)
+            limit = obstacle - row if obstacle >= 0 else width
+            for side in (y + 1, y - 1):
+                if 0 <= side < height:
+                    found = walkable.find(b'\x00\x01', side * width + x, side * width + width)
+                    if found >= 0:
+                        stops.append(found - side * width + 1)
+            if ty == y and tx > x:
+                stops.append(tx)
+        else:
+            obstacle = walkable.rfind(0, row, row + x)
+            limit = obstacle - row if obstacle >= 0 else -1
+            for side in (y + 1, y - 1):
+                if 0 <= side < height:
+                    found = walkable.rfind(b'\x01\x00', side * width, side * width + x + 1)
+                    if found >= 0:
+                        stops.append(found - side * width)
+            if ty == y and tx < x:
+                stops.append(tx)
+
+        if dx > 0:
+            stop = min((stop for stop in stops if stop < limit), default=None)
+        else:
+            stop = max((stop for stop in stops if stop > limit), default=None)
+        return (stop, y) if stop is not None else None
+
+    def jump_vertical(x: int, y: int, dy: int) -> Optional[Tuple[int, int]]:
+        while True:
+            y += dy
+            if not free(x, y):
+                return None
+            if (x, y) == (tx, ty) or jump_horizontal(x, y, 1) or jump_horizontal(x, y, -1):
+                return x, y
+
+    def directions(x: int, y: int, step: Optional[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        if step is None:
+            return list(STEPS)
+        dx, dy = step
+        if dy:
+            # the horizontal neighbours are natural when moving vertically
+            return [(0, dy), (1, 0), (-1, 0)]
+        result = [(dx, 0)]
+        for side in (1, -1):
+            # forced: free above (below) but not behind it
+            if free(x, y + side) and not free(x - dx, y + side):
+                result.append((0, side))
+        return result
+
+    counter = itertools.count()
+    sx, sy = grid.coords(source)
+    frontier = [(abs(sx - tx) + abs(sy - ty), 0, next(counter), (sx, sy), None)]
+    best: Dict[Tuple[int, int], int] = {(sx, sy): 0}
+    parents: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    expanded = 0
+
+    while frontier:
+        _, cost, _, point, step = heapq.heappop(frontier)
+        if cost > best[point]:
+            continue
+        expanded += 1
+        if point == (tx, ty):
+            points = [point]
+            while point in parents:
+                point = parents[point]
+                points.append(point)
+            return _unfold(grid, [grid.cell(x, y) for x, y in reversed(points)]), expanded
+
+        x, y = point
+        for dx, dy in directions(x, y, step):
+            jump = jump_vertical(x, y, dy) if dy else jump_horizontal(x, y, dx)
+            if jump is None:
+                continue
+            jump_cost = cost + abs(jump[0] - x) + abs(jump[1] - y)
+            if jump_cost < best.get(jump, jump_cost + 1):
+                best[jump] = jump_cost
+                parents[jump] = point
+                heapq.heappush(frontier, (
+                    jump_cost + abs(jump[0] - tx) + abs(jump[1] - ty), jump_cost, next(counter), jump, (dx, dy)
+                ))
+    return None, expanded
+
+
+# Engines computing the legs, see plan_legs
+ENGINES: Dict[str, Callable] = {
+    'astar': astar_path,
+    'jps': jps_path,
+    'hpa': hpa_path
+}
+
+# Engines always finding the shortest paths (HPA* paths go through the entrances)
+EXACT_ENGINES = ('astar', 'jps')
+
+
+def plan_legs(world_json: Dict, engine: str = 'jps', grid: Optional[Grid] = None) -> SearchResult:
+    """
+    Plans the way to the gold and back as two legs of moves, then turns it into actions with utils.Agent.
+
+    This is the approach of the first players, for the large open worlds
+    where the state space search is too slow: the legs are computed once
+    through the Wumpus (shooting it) and once around it, and the cheapest
+    according to utils.cost_function is taken. Unlike planner.plan turns
+    only count once the path is chosen, so the plan is not always optimal.
+    """
+    if grid is None:
+        grid = Grid.from_json(world_json)
+    find_path = ENGINES[engine]
+
+    hunter = grid.cell(*world_json['hunters'][0][:2])
+    exits = [grid.cell(*exit_) for exit_ in world_json['exits']]
+    wumpuses = [grid.cell(*wumpus) for wumpus in world_json.get('wumpuses', [])]
+    golds = world_json.get('golds', [])
+    if not golds:
+        return SearchResult(actions=['Climb'], cost=ACTION_COSTS['Climb'], expanded=0)
+    gold = grid.cell(*golds[0])
+
+    expanded = 0
+    candidates = []
+    # through a single Wumpus (there is only one arrow), then around all of them
+    for avoid in [[other for other in wumpuses if other != wumpus] for wumpus in wumpuses] + [wumpuses]:
+        forward, forward_expanded = find_path(grid, hunter, gold, avoid)
+        expanded += forward_expanded
+        if forward is None:
+            continue
+        backward, backward_expanded = min(
+            (find_path(grid, gold, exit_, avoid) for exit_ in exits),
+            key=lambda leg: len(leg[0]) if leg[0] is not None else len(grid) + 1
+        )
+        expanded += backward_expanded
+        if backward is None:
+            continue
+
+        path = [grid.coords(cell) for cell in forward + backward[1:]]
+        crossed = [wumpus for wumpus in wumpuses if wumpus not in avoid and grid.coords(wumpus) in path]
+        wumpus = grid.coords(crossed[0]) if crossed else None
+        cost = cost_function(path, has_wumpus=bool(crossed), hunter_loc=path[0], gold_loc=grid.coords(gold),
+                             wumpus_loc=wumpus)
+        candidates.append((cost, path, wumpus))
+
+    if not candidates:
+        return SearchResult(actions=['Climb'], cost=ACTION_COSTS['Climb'], expanded=expanded)
+
+    cost, path, wumpus = min(candidates, key=lambda candidate: candidate[0])
+    heading = world_json['hunters'][0][2] if len(world_json['hunters'][0]) > 2 else 'N'
+    agent = Agent(hunter_location=path[0], gold_location=grid.coords(gold), wumpus_location=wumpus, direction=heading)
+    actions = agent.navigate(path)
+    return SearchResult(actions=actions, cost=actions.cost, expanded=expanded)
+
+
+def main(*cargs):
+    """Check that Jump Point Search finds paths as short as plain A* on generated worlds (and how longer HPA* ones are)"""
+    from generator import generate_worlds
+
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--size', nargs=2, type=int, default=[64, 64], metavar=('WIDTH', 'HEIGHT'), help='size of the worlds')
+    parser.add_argument('--count', type=int, default=20, help='number of worlds')
+    parser.add_argument('--seed', default='jps', help='seed of the worlds')
+    parser.add_argument('--pit-density', type=float, default=0.1, help='probability of a pit in a cell')
+    parser.add_argument('--block-density', type=float, default=0.05, help='probability of a block in a cell')
+    args = parser.parse_args(cargs)
+
+    mismatches = 0
+    invalid = 0
+    longer = []
+    totals = {name: 0 for name in ENGINES}
+    worlds = generate_worlds(args.size[0], args.size[1], count=args.count, seed=args.seed,
+                             pit_density=args.pit_density, block_density=args.block_density)
+    for world in worlds:
+        grid = Grid.from_json(world)
+        source = grid.cell(*world['hunters'][0][:2])
+        target = grid.cell(*world['golds'][0])
+        lengths = {}
+        for name, find_path in ENGINES.items():
+            path, expanded = find_path(grid, source, target)
+            totals[name] += expanded
+            lengths[name] = len(path) if path is not None else None
+            # every step must be a move between adjacent walkable cells
+            if path is not None and any(b not in grid.neighbours(a) for a, b in zip(path, path[1:])):
+                invalid += 1
+                print('{}: invalid {} path'.format(world['id'], name))
+        if len({lengths[name] for name in EXACT_ENGINES}) > 1:
+            mismatches += 1
+            print('{}: {}'.format(world['id'], lengths))
+        if lengths['astar'] and lengths['hpa']:
+            longer.append(lengths['hpa'] / lengths['astar'] - 1)
+
+    print('{} worlds, {} mismatches, {} invalid paths, expanded: {}'.format(args.count, mismatches, invalid, totals))
+    if longer:
+        print('HPA* paths longer by {:.1%} on average, {:.1%} at most'.format(sum(longer) / len(longer), max(longer)))
+    return 1 if mismatches or invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,190 @@
+import math
+from array import array
+from typing import Callable, FrozenSet, List, Optional, Tuple
+from grid import Grid, FREE
+from planner import State, ACTION_COSTS, NONE, search
+from sight import cached_shooting_index, MISS
+from stats import SearchStats, phase
+
+
+# Codes of the actions in the parent buffers, 0 is a state not expanded yet
+MOVE, LEFT, RIGHT, SHOOT, GRAB = range(1, 6)
+START = 7
+CODES = {MOVE: 'Move', LEFT: 'Left', RIGHT: 'Right', SHOOT: 'Shoot', GRAB: 'Grab'}
+
+# Bits of a frontier entry: 3 for the action, as many as the state ids need, the cost takes the rest
+ENTRY_BITS = 63
+ACTION_BITS = 3
+
+
+def search_lean(
+        start: State,
+        grid: Grid,
+        gold: int,
+        wumpuses: FrozenSet[int],
+        goal: Callable[[State], bool],
+        estimate: Callable[[State], float],
+        stats: Optional[SearchStats] = None
+    ) -> Tuple[Optional[List[str]], float, Optional[State], int]:
+    """
+    Same search as planner.search, with flat buffers instead of dictionaries of states.
+
+    States are integer ids: the pose `cell * 4 + heading` in a layer for
+    each combination of gold and arrow (still there, shot in vain or which
+    Wumpus it killed). Each layer is a bytearray of one byte per pose,
+    allocated the first time a state of the layer is expanded, holding the
+    action that led to the expanded state, which is also its closed mark:
+    the parent is found by undoing the action, so the costs and the parents
+    are not stored. The frontier is a bucket queue of int64 arrays indexed
+    by f (the costs are small integers and the estimates are rounded up),
+    an entry packs the cost, the state id and the action.
+
+    A state is expanded only once, so the estimate must be consistent (as
+    the distance fields and all the admissible heuristics of heuristics.py)
+    for the plan to be optimal. If the costs outgrow the bits the state ids
+    leave in an entry, the search starts again with planner.search.
+    """
+    with phase(stats, 'sight'):
+        targets = cached_shooting_index(grid, wumpuses)
+    try:
+        with phase(stats, 'search'):
+            actions, cost, final, expanded, generated, frontier_peak = _search_lean(
+                start, grid, gold, wumpuses, goal, estimate, targets, stats is not None
+            )
+    except OverflowError:
+        return search(start, grid, gold, wumpuses, goal, estimate, stats)
+    if stats is not None:
+        stats.search(generated, expanded, frontier_peak)
+    return actions, cost, final, expanded
+
+
+def _search_lean(start, grid, gold, wumpuses, goal, estimate, targets, counting):
+    """
+    The loop of search_lean, the peak frontier is only tracked when `counting`.
+    """
+    poses = 4 * len(grid)
+    cells = grid.cells
+    width = grid.width
+    # layer = 2 * arrow + has_gold, arrow is 0 (not shot), 1 (missed) or 2 + index of the Wumpus killed
+    killed_by = [NONE, NONE] + sorted(wumpuses)
+    arrow_of = {wumpus: arrow for arrow, wumpus in enumerate(killed_by) if arrow >= 2}
+    parents: List[Optional[bytearray]] = [None] * (2 * len(killed_by))
+    id_bits = max(1, (len(parents) * poses - 1).bit_length())
+    cost_bits = ENTRY_BITS - ACTION_BITS - id_bits
+    if cost_bits <= 0:
+        raise OverflowError('too many states for the lean search')
+    cost_limit = 1 << cost_bits
+    offsets = (width * 4, 4, -width * 4, -4)
+    id_mask = (1 << id_bits) - 1
+
+    def state_of(layer: int, pose: int) -> State:
+        arrow = layer >> 1
+        return State(cell=pose >> 2, heading=pose & 3, has_gold=bool(layer & 1), has_arrow=not arrow,
+                     killed=killed_by[arrow])
+
+    def rounded(value: float) -> int:
+        # rounding up keeps consistent estimates consistent (the costs are integers)
+        return math.ceil(value - 1e-9)
+
+    remaining = estimate(start)
+    if remaining == math.inf:
+        return None, math.inf, None, 0, 0, 0
+    arrow = 0 if start.has_arrow else arrow_of.get(start.killed, 1)
+    start_id = (2 * arrow + start.has_gold) * poses + start.cell * 4 + start.heading
+    base = rounded(remaining)
+    buckets: List[Optional[array]] = [array('q', [start_id << ACTION_BITS | START])]
+    current = 0
+    queued = 1
+    generated = 1
+    expanded = 0
+    frontier_peak = 1
+
+    def push(cost: int, layer: int, pose: int, action: int):
+        nonlocal queued, generated
+        marks = parents[layer]
+        if marks is not None and marks[pose]:
+            return
+        remaining = estimate(state_of(layer, pose))
+        if remaining == math.inf:
+            # dead end, the gold or the exit cannot be reached from here
+            return
+        if cost >= cost_limit:
+            raise OverflowError('cost {} past the {} bits of the frontier entries'.format(cost, cost_bits))
+        index = max(cost + rounded(remaining) - base, current)
+        while len(buckets) <= index:
+            buckets.append(array('q'))
+        buckets[index].append(((cost << id_bits | layer * poses + pose) << ACTION_BITS) | action)
+        queued += 1
+        generated += 1
+
+    while current < len(buckets):
+        bucket = buckets[current]
+        if not bucket:
+            # f only grows, the bucket is not needed anymore
+            buckets[current] = None
+            current += 1
+            continue
+        if counting and queued > frontier_peak:
+            frontier_peak = queued
+        entry = bucket.pop()
+        queued -= 1
+        action = entry & 7
+        cost = entry >> ACTION_BITS + id_bits
+        layer, pose = divmod(entry >> ACTION_BITS & id_mask, poses)
+        marks = parents[layer]
+        if marks is None:
+            marks = parents[layer] = bytearray(poses)
+        elif marks[pose]:
+            continue
+        marks[pose] = action
+        expanded += 1
+
+        state = state_of(layer, pose)
+        if goal(state):
+            return _unwind(parents, layer, pose, poses, offsets), cost, state, expanded, generated, frontier_peak
+
+        heading = pose & 3
+        cell = pose >> 2
+        arrow = layer >> 1
+        push(cost + 1, layer, pose - heading + (heading - 1) % 4, LEFT)
+        push(cost + 1, layer, pose - heading + (heading + 1) % 4, RIGHT)
+
+        # bumping into the border or a block leaves the state unchanged,
+        # entering a pit or a living Wumpus kills the hunter
+        ahead = grid.ahead(cell, heading)
+        if ahead >= 0 and cells[ahead] == FREE and (ahead not in wumpuses or ahead == killed_by[arrow]):
+            push(cost + 1, layer, pose + offsets[heading], MOVE)
+
+        if not arrow:
+            target = targets[pose]
+            push(cost + ACTION_COSTS['Shoot'], 2 * (arrow_of[target] if target != MISS else 1) + (layer & 1), pose, SHOOT)
+
+        if not layer & 1 and cell == gold:
+            push(cost + 1, layer | 1, pose, GRAB)
+
+    return None, math.inf, None, expanded, generated, frontier_peak
+
+
+def _unwind(parents: List[bytearray], layer: int, pose: int, poses: int, offsets: Tuple[int, ...]) -> List[str]:
+    """
+    The actions leading to a state, undoing them from the state back to the start.
+    """
+    actions = []
+    while True:
+        action = parents[layer][pose]
+        if action == START:
+            break
+        actions.append(CODES[action])
+        heading = pose & 3
+        if action == MOVE:
+            pose -= offsets[heading]
+        elif action == LEFT:
+            pose += (heading + 1) % 4 - heading
+        elif action == RIGHT:
+            pose += (heading - 1) % 4 - heading
+        elif action == GRAB:
+            layer &= ~1
+        else:
+            layer &= 1
+    actions.reverse()
+    return actions
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from batch import HEURISTICS, PLAYERS, read_worlds
+from generator import generate_worlds
+from service import PlanningClient
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run(address: str, worlds: List[str], requests: int, concurrency: int, connections: int,
+              deadline: Optional[float], options: Dict, seed=0) -> Dict:
+    """
+    Sends `requests` plan requests for worlds picked at random, `concurrency` at a time.
+
+    The requests are spread over `connections` connections, picking the
+    worlds at random among a few sends the same ones concurrently (which the
+    server coalesces). Returns the throughput, the latencies and the outcomes.
+    """
+    rng = random.Random(seed)
+    clients = [await PlanningClient.connect(address) for _ in range(connections)]
+    latencies = []
+    outcomes = Counter()
+    coalesced = 0
+    sent = itertools.count()
+
+    async def send(client: PlanningClient):
+        nonlocal coalesced
+        while next(sent) < requests:
+            world = rng.choice(worlds)
+            start = time.perf_counter()
+            try:
+                response = await client.plan(world, deadline, **options)
+            except ConnectionError:
+                outcomes['disconnected'] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            outcomes[response['outcome']] += 1
+            coalesced += response.get('coalesced', False)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(send(clients[index % connections]) for index in range(concurrency)))
+    finally:
+        for client in clients:
+            await client.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': requests,
+        'seconds': elapsed,
+        'throughput': requests / elapsed if elapsed else None,
+        'latency': {name: _percentile(latencies, fraction) for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+        'max_latency': max(latencies, default=None),
+        'outcomes': dict(outcomes),
+        'coalesced': coalesced
+    }
+
+
+def main(*cargs):
+    """Measure the throughput and the latency of a planning server (see service.py)"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('sources', nargs='*', help='worlds to send, as for batch.py (generated worlds if none)')
+    parser.add_argument('--address', default='127.0.0.1:8765', help='HOST:PORT or unix:PATH of the server')
+    parser.add_argument('--requests', type=int, default=1000, help='number of requests')
+    parser.add_argument('--concurrency', type=int, default=32, help='requests in flight at once')
+    parser.add_argument('--connections', type=int, default=4, help='connections to the server')
+    parser.add_argument('--deadline', type=float, help='deadline of the requests in seconds')
+    parser.add_argument('--player', choices=PLAYERS, default='bfs', help='player solving the worlds')
+    parser.add_argument('--heuristic', choices=list(HEURISTICS), default='minmax', help='heuristic of the astar player')
+    parser.add_argument('--size', nargs=2, type=int, default=[16, 16], metavar=('WIDTH', 'HEIGHT'), help='size of the generated worlds')
+    parser.add_argument('--count', type=int, default=100, help='number of generated worlds')
+    parser.add_argument('--seed', default=0, help='seed of the generated worlds and of the picks')
+    args = parser.parse_args(cargs)
+
+    if args.sources:
+        worlds = [text for source in args.sources for _, text in read_worlds(source)]
+    else:
+        worlds = [json.dumps(world) for world in generate_worlds(args.size[0], args.size[1], count=args.count, seed=args.seed)]
+    if not worlds:
+        print('No worlds to send', file=sys.stderr)
+        return 1
+
+    options = {'player': args.player, 'heuristic': args.heuristic}
+    report = asyncio.run(run(args.address, worlds, args.requests, args.concurrency, max(1, args.connections),
+                             args.deadline, options, args.seed))
+    print(json.dumps(report, indent=2))
+    return 1 if report['outcomes'].get('error') or report['outcomes'].get('disconnected') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
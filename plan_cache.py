@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from planner import SearchResult
+from plans import Plan
+
+
+# Unit vectors of the headings
+VECTORS = {'N': (0, 1), 'E': (1, 0), 'S': (0, -1), 'W': (-1, 0)}
+HEADING_OF = {vector: heading for heading, vector in VECTORS.items()}
+
+# The 8 symmetries of the grid as (transpose, mirror x, mirror y), applied in this order
+SYMMETRIES = tuple((swap, flip_x, flip_y) for swap in (False, True) for flip_x in (False, True) for flip_y in (False, True))
+IDENTITY = SYMMETRIES[0]
+
+
+def _transform_world(world_json: Dict, symmetry: Tuple[bool, bool, bool]) -> Dict:
+    """
+    Returns the canonical description (sorted lists, no ids) of the world seen through a symmetry.
+    """
+    swap, flip_x, flip_y = symmetry
+    width, height = world_json['size']
+    if swap:
+        width, height = height, width
+
+    def point(x: int, y: int) -> List[int]:
+        if swap:
+            x, y = y, x
+        return [width - 1 - x if flip_x else x, height - 1 - y if flip_y else y]
+
+    def heading(name: str) -> str:
+        dx, dy = VECTORS[name]
+        if swap:
+            dx, dy = dy, dx
+        return HEADING_OF[(-dx if flip_x else dx, -dy if flip_y else dy)]
+
+    hunters = []
+    for hunter in world_json['hunters']:
+        hunters.append(point(hunter[0], hunter[1]) + [heading(hunter[2] if len(hunter) > 2 else 'N')])
+
+    canonical = {'size': [width, height], 'hunters': hunters}
+    for key in ('pits', 'blocks', 'wumpuses', 'golds', 'exits'):
+        canonical[key] = sorted(point(x, y) for x, y in world_json.get(key, []))
+    return canonical
+
+
+def _is_reflection(symmetry: Tuple[bool, bool, bool]) -> bool:
+    """
+    Mirror images swap left and right turns.
+    """
+    return sum(symmetry) % 2 == 1
+
+
+def fingerprint(world_json: Dict, symmetric: bool = False) -> Tuple[str, Tuple[bool, bool, bool]]:
+    """
+    Hashes the size, pits, blocks, Wumpuses, golds, exits and hunter poses of a world.
+
+    With `symmetric` the 8 rotations and reflections of the world get the
+    same hash: the smallest of their hashes is used and the symmetry that
+    gives it is returned along with the hash.
+    """
+    symmetries = SYMMETRIES if symmetric else (IDENTITY,)
+    candidates = []
+    for symmetry in symmetries:
+        text = json.dumps(_transform_world(world_json, symmetry), separators=(',', ':'), sort_keys=True)
+        candidates.append((hashlib.sha256(text.encode()).hexdigest(), symmetry))
+    return min(candidates)
+
+
+class PlanCache:
+    """
+    Cache of plans keyed by the world fingerprint.
+
+    Plans are first looked up in a bounded in-memory LRU tier, then (if a
+    directory is given) in an on-disk tier with one JSON file per world,
+    written atomically so that several processes can share it. Plans are
+    stored as seen in the canonical orientation of the world, so with
+    `symmetric` a rotated or mirrored world reuses the same entry, in the
+    text form of plans.Plan (the entries of the older versions, lists of
+    actions, are still read).
+    """
+
+    def __init__(self, capacity: int = 1024, directory: Optional[str] = None, symmetric: bool = True):
+        self.capacity = capacity
+        self.directory = directory
+        self.symmetric = symmetric
+        self.memory: 'OrderedDict[str, Dict]' = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def _key(self, world_json: Dict, namespace: str) -> Tuple[str, bool]:
+        key, symmetry = fingerprint(world_json, symmetric=self.symmetric)
+        if namespace:
+            key = hashlib.sha256((namespace + ':' + key).encode()).hexdigest()
+        return key, _is_reflection(symmetry)
+
+    def _remember(self, key: str, entry: Dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def get(self, world_json: Dict, namespace: str = '') -> Optional[SearchResult]:
+        """
+        Returns the cached plan of the world, None if there is none.
+        """
+        key, mirrored = self._key(world_json, namespace)
+
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+        elif self.directory is not None and os.path.exists(self._path(key)):
+            with open(self._path(key)) as fd:
+                entry = json.load(fd)
+            self._remember(key, entry)
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            return None
+
+        actions = Plan.from_text(entry['plan']) if 'plan' in entry else Plan.from_actions(entry['actions'])
+        return SearchResult(actions=actions.mirrored() if mirrored else actions, cost=entry['cost'], expanded=0)
+
+    def put(self, world_json: Dict, result: SearchResult, namespace: str = ''):
+        """
+        Stores the plan of the world in both tiers.
+        """
+        key, mirrored = self._key(world_json, namespace)
+        actions = Plan.from_actions(result.actions)
+        entry = {
+            'plan': (actions.mirrored() if mirrored else actions).to_text(),
+            'cost': result.cost
+        }
+        self._remember(key, entry)
+
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as temporary_file:
+                json.dump(entry, temporary_file)
+            os.replace(temporary, path)
+
+    def lookup(self, world_json: Dict, solve: Callable[[Dict], SearchResult], namespace: str = '') -> SearchResult:
+        """
+        Returns the cached plan of the world, solving and storing it on a miss.
+        """
+        result = self.get(world_json, namespace)
+        if result is None:
+            result = solve(world_json)
+            self.put(world_json, result, namespace)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self.memory)
+        }
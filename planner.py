@@ -0,0 +1,529 @@
+import heapq
+import itertools
+import math
+import time
+from typing import Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+from grid import Grid, HEADINGS, FREE
+from heuristics import on_grid, on_grid_poses, TURN_AWARE
+from fields import cached_distance_field, field_path, UNREACHABLE
+from sight import cached_shooting_index, MISS
+from stats import SearchStats, phase
+
+
+# Every action costs 1 point, using the arrow costs 10
+ACTION_COSTS = {'Move': 1, 'Right': 1, 'Left': 1, 'Shoot': 10, 'Grab': 1, 'Climb': 1}
+
+
+class State(NamedTuple):
+    """
+    Search state: hunter pose plus everything that changes the legal moves.
+
+    `cell` is the grid cell id and `heading` the index in grid.HEADINGS,
+    `killed` is the cell of the Wumpus hit by the arrow (NONE if none).
+    """
+    cell: int
+    heading: int
+    has_gold: bool
+    has_arrow: bool
+    killed: int
+
+
+# Cell id standing for no cell (no gold, no Wumpus killed)
+NONE = -1
+
+# Turns facing the heading at a given quarter turns (clockwise) from the current one
+TURNS = ((), ('Right',), ('Right', 'Right'), ('Left',))
+
+
+class SearchResult(NamedTuple):
+    """
+    Actions of the optimal plan, their total cost and the number of expanded states.
+
+    The actions are a plans.Plan (run length encoded) or a list of names.
+    """
+    actions: Sequence[str]
+    cost: int
+    expanded: int
+
+
+class AnytimeResult(NamedTuple):
+    """
+    Plan of plan_anytime: the best one found before the deadline and how far from the optimum it might be.
+
+    `bound` is the proven ratio between its cost and the optimal cost (1.0
+    when optimal), `trace` has a (weight, cost, bound, seconds) entry per
+    improvement of the plan.
+    """
+    actions: Sequence[str]
+    cost: int
+    expanded: int
+    bound: float
+    trace: List[Tuple[float, float, float, float]]
+
+
+def locate(world_json: Dict, grid: Grid, hunter: int = 0) -> Tuple[State, int, Set[int], FrozenSet[int]]:
+    """
+    Returns the initial state of a hunter, the (first) gold cell, the exit cells and the Wumpus cells.
+    """
+    pose = world_json['hunters'][hunter]
+    golds = world_json.get('golds', [])
+    gold = grid.cell(*golds[0]) if golds else NONE
+    exits = {grid.cell(*exit_) for exit_ in world_json['exits']}
+    wumpuses = frozenset(grid.cell(*wumpus) for wumpus in world_json.get('wumpuses', []))
+
+    start = State(
+        cell=grid.cell(pose[0], pose[1]),
+        heading=HEADINGS.index(pose[2]) if len(pose) > 2 else 0,
+        has_gold=False,
+        has_arrow=True,
+        killed=NONE
+    )
+    return start, gold, exits, wumpuses
+
+
+def successors(
+        state: State,
+        grid: Grid,
+        gold: int,
+        wumpuses: FrozenSet[int],
+        targets: Optional[Sequence[int]] = None
+    ) -> Iterator[Tuple[str, State]]:
+    """
+    Yields (action, next state) for all the actions that change the state.
+
+    `targets` is the shooting index of the Wumpuses (see sight.py), taken
+    from the grid cache if not given.
+    """
+    yield 'Left', state._replace(heading=(state.heading - 1) % 4)
+    yield 'Right', state._replace(heading=(state.heading + 1) % 4)
+
+    cell = grid.ahead(state.cell, state.heading)
+
+    # bumping into the border or a block leaves the state unchanged,
+    # entering a pit or a living Wumpus kills the hunter
+    if cell >= 0 and grid.cells[cell] == FREE and (cell not in wumpuses or cell == state.killed):
+        yield 'Move', state._replace(cell=cell)
+
+    if state.has_arrow:
+        # the arrow flies until a block or the border, killing the first Wumpus in line
+        if targets is None:
+            targets = cached_shooting_index(grid, wumpuses)
+        target = targets[state.cell * 4 + state.heading]
+        yield 'Shoot', state._replace(has_arrow=False, killed=target if target != MISS else NONE)
+
+    if not state.has_gold and state.cell == gold:
+        yield 'Grab', state._replace(has_gold=True)
+
+
+def search(
+        start: State,
+        grid: Grid,
+        gold: int,
+        wumpuses: FrozenSet[int],
+        goal: Callable[[State], bool],
+        estimate: Callable[[State], float],
+        stats: Optional[SearchStats] = None
+    ) -> Tuple[Optional[List[str]], float, Optional[State], int]:
+    """
+    A* from `start` to the first state satisfying `goal`.
+
+    Returns the actions, their cost, the final state and the number of
+    expanded states; actions and final state are None (and the cost is
+    infinite) if no goal state can be reached. States whose estimate is
+    infinite are dead ends and are never queued. The generated states and
+    the peak frontier are added to `stats` if given.
+    """
+    with phase(stats, 'sight'):
+        targets = cached_shooting_index(grid, wumpuses)
+    with phase(stats, 'search'):
+        actions, cost, final, expanded, generated, frontier_peak = _search(
+            start, grid, gold, wumpuses, goal, estimate, targets, stats is not None
+        )
+    if stats is not None:
+        stats.search(generated, expanded, frontier_peak)
+    return actions, cost, final, expanded
+
+
+def _search(start, grid, gold, wumpuses, goal, estimate, targets, counting):
+    """
+    The loop of search, the peak frontier is only tracked when `counting`.
+    """
+    counter = itertools.count()
+    frontier = [(estimate(start), 0, next(counter), start)]
+    best_cost: Dict[State, int] = {start: 0}
+    parents: Dict[State, Tuple[State, str]] = {}
+    expanded = 0
+    frontier_peak = 1
+
+    while frontier:
+        if counting and len(frontier) > frontier_peak:
+            frontier_peak = len(frontier)
+        _, cost, _, state = heapq.heappop(frontier)
+        if cost > best_cost[state]:
+            # stale entry, the state was reached with a lower cost afterwards
+            continue
+        expanded += 1
+
+        if goal(state):
+            final = state
+            actions = []
+            while state in parents:
+                state, action = parents[state]
+                actions.append(action)
+            actions.reverse()
+            return actions, cost, final, expanded, next(counter), frontier_peak
+
+        for action, successor in successors(state, grid, gold, wumpuses, targets):
+            successor_cost = cost + ACTION_COSTS[action]
+            if successor_cost < best_cost.get(successor, successor_cost + 1):
+                remaining = estimate(successor)
+                if remaining == math.inf:
+                    # dead end, the gold or the exit cannot be reached from here
+                    continue
+                best_cost[successor] = successor_cost
+                parents[successor] = (state, action)
+                heapq.heappush(
+                    frontier,
+                    (successor_cost + remaining, successor_cost, next(counter), successor)
+                )
+
+    return None, math.inf, None, expanded, next(counter), frontier_peak
+
+
+def search_anytime(
+        start: State,
+        grid: Grid,
+        gold: int,
+        wumpuses: FrozenSet[int],
+        goal: Callable[[State], bool],
+        estimate: Callable[[State], float],
+        deadline: float,
+        bound: float = 1.0,
+        weight: float = 3.0,
+        decrement: float = 0.5,
+        stats: Optional[SearchStats] = None
+    ) -> Tuple[Optional[List[str]], float, int, float, List[Tuple[float, float, float, float]]]:
+    """
+    Anytime Repairing A* (ARA*) from `start` to the states satisfying `goal`, until `deadline` (a time.perf_counter).
+
+    The first pass is a weighted A* (the estimate is multiplied by
+    `weight`), which finds a plan quickly, then the weight is lowered by
+    `decrement` and the search goes on from where it was: the costs and the
+    parents are kept, the states improved after being expanded are queued
+    again and only they are expanded again. After each pass the plan is at
+    most min(weight, cost / lowest f of the queued states) times the optimum,
+    the search stops once this bound is down to `bound` (1.0 is the optimum)
+    or at the deadline, except that it always goes on until a first plan.
+    Like search the estimate must be admissible, for the bound to hold, and
+    include what is done after the goal (the estimate of a goal state is
+    added to the cost of the plan).
+
+    Returns the actions (None if no goal state can be reached), their cost,
+    the number of expanded states, the bound and the (weight, cost, bound,
+    seconds) trace of the improvements.
+    """
+    with phase(stats, 'sight'):
+        targets = cached_shooting_index(grid, wumpuses)
+    with phase(stats, 'search'):
+        actions, cost, expanded, achieved, trace, generated, frontier_peak = _search_anytime(
+            start, grid, gold, wumpuses, goal, estimate, targets, deadline, bound, weight, decrement
+        )
+    if stats is not None:
+        stats.search(generated, expanded, frontier_peak)
+    return actions, cost, expanded, achieved, trace
+
+
+def _search_anytime(start, grid, gold, wumpuses, goal, estimate, targets, deadline, bound, weight, decrement):
+    """
+    The passes of search_anytime.
+    """
+    started = time.perf_counter()
+    counter = itertools.count()
+    best_cost: Dict[State, int] = {start: 0}
+    estimates: Dict[State, float] = {start: estimate(start)}
+    parents: Dict[State, Tuple[State, str]] = {}
+    closed: Set[State] = set()
+    inconsistent: Set[State] = set()
+    frontier = [(weight * estimates[start], 0, next(counter), start)] if estimates[start] != math.inf else []
+    incumbent: Optional[State] = None
+    expanded = 0
+    frontier_peak = len(frontier)
+    trace = []
+
+    while True:
+        # one pass: weighted A* until no queued state can lead to a better plan
+        timed_out = False
+        while frontier:
+            _, cost, _, state = frontier[0]
+            if cost > best_cost[state] or state in closed:
+                heapq.heappop(frontier)
+                continue
+            if incumbent is not None:
+                if frontier[0][0] >= best_cost[incumbent] + weight * estimates[incumbent]:
+                    break
+                if not expanded & 63 and time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+            heapq.heappop(frontier)
+            closed.add(state)
+            expanded += 1
+
+            for action, successor in successors(state, grid, gold, wumpuses, targets):
+                successor_cost = cost + ACTION_COSTS[action]
+                if successor_cost < best_cost.get(successor, successor_cost + 1):
+                    remaining = estimates.get(successor)
+                    if remaining is None:
+                        remaining = estimates[successor] = estimate(successor)
+                    if remaining == math.inf:
+                        continue
+                    best_cost[successor] = successor_cost
+                    parents[successor] = (state, action)
+                    if goal(successor) and (incumbent is None or successor_cost + remaining <
+                                            best_cost[incumbent] + estimates[incumbent]):
+                        incumbent = successor
+                    if successor in closed:
+                        # improved after its expansion, it waits for the next pass
+                        inconsistent.add(successor)
+                    else:
+                        heapq.heappush(frontier, (successor_cost + weight * remaining, successor_cost, next(counter), successor))
+            if len(frontier) > frontier_peak:
+                frontier_peak = len(frontier)
+
+        if incumbent is None:
+            return None, math.inf, expanded, math.inf, trace, next(counter), frontier_peak
+
+        # the parents of the plan might have been improved since it was found (their
+        # descendants keep their costs until expanded again), so its cost is recomputed
+        actions = _actions(parents, incumbent)
+        cost = sum(ACTION_COSTS[action] for action in actions)
+
+        # the states that might still lead to a better plan, and a lower bound of the optimum
+        pending = {state for _, cost_, _, state in frontier if cost_ == best_cost[state] and state not in closed}
+        pending |= inconsistent
+        solution = cost + float(estimates[incumbent])
+        lowest = float(min((best_cost[state] + estimates[state] for state in pending), default=math.inf))
+        achieved = 1.0 if lowest >= solution else solution / lowest
+        if not timed_out:
+            achieved = min(achieved, weight)
+        trace.append((weight, solution, achieved, time.perf_counter() - started))
+
+        if timed_out or achieved <= bound or weight <= 1.0 or time.perf_counter() >= deadline:
+            break
+
+        weight = max(1.0, min(weight - decrement, achieved))
+        frontier = [(best_cost[state] + weight * estimates[state], best_cost[state], next(counter), state)
+                    for state in pending]
+        heapq.heapify(frontier)
+        closed.clear()
+        inconsistent.clear()
+
+    return actions, cost, expanded, achieved, trace, next(counter), frontier_peak
+
+
+def _actions(parents: Dict[State, Tuple[State, str]], state: State) -> List[str]:
+    """
+    The actions leading to a state, following the parents.
+    """
+    actions = []
+    while state in parents:
+        state, action = parents[state]
+        actions.append(action)
+    actions.reverse()
+    return actions
+
+
+def plan(
+        world_json: Dict,
+        heuristic: Optional[Callable] = None,
+        grid: Optional[Grid] = None,
+        fields: bool = False,
+        stats: Optional[SearchStats] = None,
+        lean: bool = False,
+        prune: bool = False,
+        pose_fields: Optional['PoseFieldCache'] = None
+    ) -> SearchResult:
+    """
+    Finds the cheapest sequence of actions to grab the gold and climb out.
+
+    The search runs over (cell, heading, has_gold, has_arrow, killed)
+    states where every action has its real cost, so turning, shooting and
+    going around the Wumpuses are compared within a single search. Without a
+    heuristic it is a uniform cost search, otherwise A* where `heuristic`
+    is one of the functions in heuristics.py (it is called on coordinates,
+    or on (x, y, heading) poses for the ones in heuristics.TURN_AWARE).
+    With `fields` the heuristic is instead the exact number of moves, read
+    from the distance fields of the gold and the exits cached in the grid.
+
+    The map is taken from `grid` if given, otherwise it is built from the JSON.
+    If the gold cannot be reached the plan is to climb out, from the closest
+    exit if the hunter is not on one (see climb_out). The phases
+    and the search counters are recorded in `stats` if given. With `lean`
+    the search keeps its states in flat buffers (see lean.search_lean),
+    which takes a few bytes per state instead of a few hundreds. With
+    `prune` the dominated states, the dead ends and the corridors are
+    skipped (see pruning.search_pruned), it cannot be combined with `lean`.
+    With `pose_fields` (see posefields.cached_pose_fields) the estimate is
+    the exact cost of the moves and turns ignoring the Wumpuses, from the
+    fields kept for the map across the episodes: tighter than `fields`,
+    the same plans.
+    """
+    if lean and prune:
+        raise ValueError('the lean search does not prune')
+    with phase(stats, 'grid'):
+        if grid is None:
+            grid = Grid.from_json(world_json)
+        start, gold, exits, wumpuses = locate(world_json, grid)
+    if gold == NONE:
+        return climb_out(grid, start, exits, wumpuses)
+
+    with phase(stats, 'heuristic'):
+        estimate = _estimate(grid, gold, exits, heuristic, fields, pose_fields)
+
+    def goal(state: State) -> bool:
+        return state.has_gold and state.cell in exits
+
+    if lean:
+        # imported here, lean.py builds on this module
+        from lean import search_lean
+        actions, cost, _, expanded = search_lean(start, grid, gold, wumpuses, goal, estimate, stats)
+    elif prune:
+        # same for pruning.py
+        from pruning import search_pruned
+        actions, cost, _, expanded = search_pruned(start, grid, gold, wumpuses, goal, estimate, exits, stats)
+    else:
+        actions, cost, _, expanded = search(start, grid, gold, wumpuses, goal, estimate, stats)
+    if actions is None:
+        # there is no way to get the gold and come back, just climb out
+        return climb_out(grid, start, exits, wumpuses, expanded)
+
+    return SearchResult(actions=_climbing(actions), cost=cost + ACTION_COSTS['Climb'], expanded=expanded)
+
+
+def climb_out(grid: Grid, start: State, exits: Set[int], wumpuses: FrozenSet[int], expanded: int = 0) -> SearchResult:
+    """
+    The plan without the gold: the shortest walk to an exit around the pits and the Wumpuses, then 'Climb'.
+
+    The walk follows the distance field of the exits downhill (see
+    fields.field_path), it is empty on an exit or when no exit can be
+    reached, then the plan is just to climb.
+    """
+    path = [] if start.cell in exits else field_path(grid, cached_distance_field(grid, exits, wumpuses), start.cell)
+    actions = []
+    heading = start.heading
+    for cell, following in zip(path, path[1:]):
+        towards = next(towards for towards in range(4) if grid.ahead(cell, towards) == following)
+        actions += TURNS[(towards - heading) % 4]
+        actions.append('Move')
+        heading = towards
+    return SearchResult(actions=_climbing(actions), cost=len(actions) + ACTION_COSTS['Climb'], expanded=expanded)
+
+
+def _climbing(actions: List[str]) -> 'Plan':
+    """
+    The plan of the actions followed by 'Climb'.
+    """
+    # imported here, plans.py builds on this module
+    from plans import Plan
+    plan_ = Plan.from_actions(actions)
+    plan_.append('Climb')
+    return plan_
+
+
+def plan_anytime(
+        world_json: Dict,
+        deadline: float = 0.005,
+        bound: float = 1.0,
+        weight: float = 3.0,
+        heuristic: Optional[Callable] = None,
+        grid: Optional[Grid] = None,
+        fields: bool = False,
+        stats: Optional[SearchStats] = None,
+        pose_fields: Optional['PoseFieldCache'] = None
+    ) -> AnytimeResult:
+    """
+    Like plan, but returns the best plan found within `deadline` seconds (see search_anytime).
+
+    A plan at most `weight` times the optimum comes first, it is improved
+    while time remains and the optimum (or a plan proven within `bound`
+    of it) stops the search earlier. The bound is only proven for
+    admissible heuristics (see heuristics.check_heuristic), `fields` or
+    the turn aware heuristics give the tightest ones, as `pose_fields` (see plan).
+    """
+    deadline = time.perf_counter() + deadline
+    with phase(stats, 'grid'):
+        if grid is None:
+            grid = Grid.from_json(world_json)
+        start, gold, exits, wumpuses = locate(world_json, grid)
+    if gold == NONE:
+        climb = climb_out(grid, start, exits, wumpuses)
+        return AnytimeResult(actions=climb.actions, cost=climb.cost, expanded=0, bound=1.0, trace=[])
+
+    with phase(stats, 'heuristic'):
+        estimate = _estimate(grid, gold, exits, heuristic, fields, pose_fields)
+
+    def goal(state: State) -> bool:
+        return state.has_gold and state.cell in exits
+
+    actions, cost, expanded, achieved, trace = search_anytime(
+        start, grid, gold, wumpuses, goal, estimate, deadline, bound, weight, stats=stats
+    )
+    if actions is None:
+        climb = climb_out(grid, start, exits, wumpuses, expanded)
+        return AnytimeResult(actions=climb.actions, cost=climb.cost, expanded=expanded, bound=1.0, trace=trace)
+    return AnytimeResult(actions=_climbing(actions), cost=cost + ACTION_COSTS['Climb'], expanded=expanded,
+                         bound=achieved, trace=trace)
+
+
+def _estimate(grid: Grid, gold: int, exits: Set[int], heuristic: Optional[Callable], fields: bool,
+              pose_fields: Optional['PoseFieldCache'] = None) -> Callable[[State], float]:
+    """
+    Builds the estimate used by plan, a lower bound of the cost from a state to the goal.
+    """
+    if pose_fields is not None:
+        # exact costs with the turns, the Wumpuses passable as in the fields
+        to_gold = pose_fields.pose_field([gold])
+        to_exit = pose_fields.pose_field(exits)
+        reached = to_exit[gold][to_exit[gold] != UNREACHABLE]
+        gold_to_exit = reached.min() if reached.size else math.inf
+
+        def estimate(state: State) -> float:
+            if state.has_gold:
+                cost = to_exit[state.cell, state.heading]
+                return cost + 1 if cost != UNREACHABLE else math.inf
+            cost = to_gold[state.cell, state.heading]
+            return cost + gold_to_exit + 2 if cost != UNREACHABLE else math.inf
+    elif fields:
+        # the Wumpuses are passable in the fields, they might be killed
+        to_gold = cached_distance_field(grid, [gold])
+        to_exit = cached_distance_field(grid, exits)
+        gold_to_exit = to_exit[gold] if to_exit[gold] != UNREACHABLE else math.inf
+
+        def estimate(state: State) -> float:
+            if state.has_gold:
+                moves = to_exit[state.cell]
+                return moves + 1 if moves != UNREACHABLE else math.inf
+            moves = to_gold[state.cell]
+            return moves + gold_to_exit + 2 if moves != UNREACHABLE else math.inf
+    elif heuristic is None:
+        def estimate(state: State) -> float:
+            return 0
+    elif heuristic in TURN_AWARE:
+        distance = on_grid_poses(heuristic, grid)
+        # the heading on the gold is not known, any will do
+        gold_to_exit = min(distance(gold, heading, exit_) for heading in range(4) for exit_ in exits)
+
+        def estimate(state: State) -> float:
+            if state.has_gold:
+                return min(distance(state.cell, state.heading, exit_) for exit_ in exits) + 1
+            return distance(state.cell, state.heading, gold) + gold_to_exit + 2
+    else:
+        distance = on_grid(heuristic, grid)
+        gold_to_exit = min(distance(gold, exit_) for exit_ in exits)
+
+        def estimate(state: State) -> float:
+            # 'Grab' (when needed) and 'Climb' are unavoidable
+            if state.has_gold:
+                return min(distance(state.cell, exit_) for exit_ in exits) + 1
+            return distance(state.cell, gold) + gold_to_exit + 2
+
+    return estimate
@@ -0,0 +1,153 @@
+import itertools
+import re
+from array import array
+from typing import Any, Dict, Iterable, Iterator, Sequence, Tuple, Union
+from planner import ACTION_COSTS
+
+
+# Names of the actions by code, in the order of the members of wumpus.Hunter.Actions
+NAMES = ('Move', 'Right', 'Left', 'Shoot', 'Grab', 'Climb')
+CODES = {name: code for code, name in enumerate(NAMES)}
+COSTS = tuple(ACTION_COSTS[name] for name in NAMES)
+
+# Letters of the actions in the text form of the plans
+LETTERS = 'MRLSGC'
+RUN = re.compile(r'([{}])(\d*)'.format(LETTERS))
+
+# Codes of the turns, swapped in the mirror image of a plan
+MIRRORED = tuple(CODES[{'Left': 'Right', 'Right': 'Left'}.get(name, name)] for name in NAMES)
+
+
+class Plan(Sequence[str]):
+    """
+    Sequence of action names stored as runs of the same action.
+
+    The plans are mostly long runs of moves, a run is an action code and a
+    count in two arrays (a byte and 4 bytes), so the plan takes a few bytes
+    per straight line instead of a pointer per action. It can be used as
+    the list of names (iteration, len, `in`), its length and cost are kept
+    up to date as it grows, `hunter_actions` expands it lazily into the
+    members of wumpus.Hunter.Actions and `to_text` gives the compact form of
+    the plan cache and the result files ('M3RM2GC').
+    """
+    __slots__ = ('codes', 'counts', 'length', 'cost')
+
+    def __init__(self, runs: Iterable[Tuple[str, int]] = ()):
+        self.codes = array('B')
+        self.counts = array('I')
+        self.length = 0
+        self.cost = 0
+        for name, count in runs:
+            self.append(name, count)
+
+    @classmethod
+    def from_actions(cls, names: Iterable[str]) -> 'Plan':
+        """
+        The plan of a list of action names.
+        """
+        if isinstance(names, Plan):
+            return names
+        return cls((name, sum(1 for _ in group)) for name, group in itertools.groupby(names))
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Plan':
+        """
+        Reads the text form of to_text.
+        """
+        plan = cls()
+        end = 0
+        for match in RUN.finditer(text):
+            if match.start() != end:
+                break
+            letter, count = match.groups()
+            plan.append(NAMES[LETTERS.index(letter)], int(count) if count else 1)
+            end = match.end()
+        if end != len(text):
+            raise ValueError('not a plan: {!r}'.format(text))
+        return plan
+
+    def append(self, name: str, count: int = 1):
+        """
+        Adds `count` times an action at the end, extending the last run when it is the same action.
+        """
+        code = CODES[name]
+        if self.codes and self.codes[-1] == code:
+            self.counts[-1] += count
+        else:
+            self.codes.append(code)
+            self.counts.append(count)
+        self.length += count
+        self.cost += count * COSTS[code]
+
+    def extend(self, names: Iterable[str]):
+        for name, count in Plan.from_actions(names).runs():
+            self.append(name, count)
+
+    def runs(self) -> Iterator[Tuple[str, int]]:
+        """
+        Yields the (action name, count) runs.
+        """
+        for code, count in zip(self.codes, self.counts):
+            yield NAMES[code], count
+
+    def hunter_actions(self, members: Dict[str, Any]) -> Iterator[Any]:
+        """
+        Yields the members of the Actions enum of the hunter (by name in `members`), one per action.
+        """
+        for name, count in self.runs():
+            yield from itertools.repeat(members[name], count)
+
+    def mirrored(self) -> 'Plan':
+        """
+        The plan of the mirror image of the world, left and right turns swapped.
+        """
+        plan = Plan()
+        for code, count in zip(self.codes, self.counts):
+            plan.append(NAMES[MIRRORED[code]], count)
+        return plan
+
+    def to_text(self) -> str:
+        return ''.join(LETTERS[code] + (str(count) if count > 1 else '') for code, count in zip(self.codes, self.counts))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[str]:
+        for name, count in self.runs():
+            yield from itertools.repeat(name, count)
+
+    def __contains__(self, name: object) -> bool:
+        return name in CODES and CODES[name] in self.codes
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, list]:
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('plan index out of range')
+        for code, count in zip(self.codes, self.counts):
+            if index < count:
+                return NAMES[code]
+            index -= count
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Plan):
+            return self.codes == other.codes and self.counts == other.counts
+        if isinstance(other, (list, tuple)):
+            return len(other) == self.length and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __add__(self, other: Iterable[str]) -> 'Plan':
+        plan = Plan(self.runs())
+        plan.extend(other)
+        return plan
+
+    def __repr__(self) -> str:
+        return 'Plan({!r})'.format(self.to_text())
+
+    def __getstate__(self):
+        return self.to_text()
+
+    def __setstate__(self, text: str):
+        Plan.__init__(self, Plan.from_text(text).runs())
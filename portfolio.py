@@ -0,0 +1,250 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from collections import Counter
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import wumpus as wws
+from planner import plan, plan_anytime, SearchResult, ACTION_COSTS
+from tour import plan_tour
+from jps import plan_legs, ENGINES
+from batch import HEURISTICS, read_worlds
+from world_index import WorldIndex
+from grid import Grid
+
+
+# Strategies raced by default, see solve_strategy
+STRATEGIES = ('bfs', 'astar:minmax', 'astar:manhatten_turns', 'astar:fields', 'anytime:fields', 'legs:jps')
+
+# Heuristics proven consistent (see heuristics.check_heuristic), their plans are optimal
+OPTIMAL_HEURISTICS = ('manhatten', 'euclidian', 'minmax', 'manhatten_turns', 'euclidian_turns', 'fields', 'pose_fields')
+
+
+def solve_strategy(strategy: str, world_json: Dict, budget: float) -> Tuple[SearchResult, bool]:
+    """
+    Plans the world with a strategy, returns the plan and whether it is proven optimal.
+
+    The strategies are 'bfs', 'astar:HEURISTIC', 'anytime:HEURISTIC'
+    (planner.plan_anytime, given the `budget` in seconds) and
+    'legs:ENGINE' (jps.plan_legs), the heuristics are the ones of batch.py.
+    Worlds with several golds get a tour whatever the strategy, as with the
+    players, tours are never proven optimal.
+    """
+    kind, _, option = strategy.partition(':')
+    if len(world_json.get('golds', [])) > 1:
+        return plan_tour(world_json), False
+    if kind == 'bfs':
+        return plan(world_json), True
+    if kind == 'astar':
+        result = plan(world_json, heuristic=HEURISTICS[option], fields=option == 'fields', **_pose_fields(option, world_json))
+        return result, option in OPTIMAL_HEURISTICS
+    if kind == 'anytime':
+        result = plan_anytime(world_json, deadline=budget, heuristic=HEURISTICS[option], fields=option == 'fields',
+                              **_pose_fields(option, world_json))
+        return SearchResult(result.actions, result.cost, result.expanded), result.bound <= 1.0 and option in OPTIMAL_HEURISTICS
+    if kind == 'legs':
+        return plan_legs(world_json, engine=option), False
+    raise ValueError('unknown strategy {}'.format(strategy))
+
+
+def _pose_fields(option: str, world_json: Dict) -> Dict:
+    """
+    The arguments of the planners for the heuristic 'pose_fields', the fields of the map kept by the process.
+    """
+    if option != 'pose_fields':
+        return {}
+    from posefields import cached_pose_fields
+    grid = Grid.from_json(world_json)
+    return {'grid': grid, 'pose_fields': cached_pose_fields(grid)}
+
+
+def check_strategy(strategy: str):
+    """
+    Raises ValueError if the strategy is not one solve_strategy knows.
+    """
+    kind, _, option = strategy.partition(':')
+    known = {'bfs': ('',), 'astar': tuple(HEURISTICS), 'anytime': tuple(HEURISTICS), 'legs': tuple(ENGINES)}
+    if option not in known.get(kind, ()):
+        raise ValueError('unknown strategy {}'.format(strategy))
+
+
+def _run(strategy: str, world_json: Dict, budget: float, connection):
+    """
+    Entry point of the process running a strategy, sends back its outcome.
+    """
+    start = time.perf_counter()
+    try:
+        result, optimal = solve_strategy(strategy, world_json, budget)
+        outcome = {'actions': result.actions, 'cost': result.cost, 'expanded': result.expanded, 'optimal': optimal}
+    except Exception as error:
+        outcome = {'error': '{}: {}'.format(type(error).__name__, error)}
+    outcome['seconds'] = time.perf_counter() - start
+    connection.send(outcome)
+    connection.close()
+
+
+def race(world_json: Dict, strategies: Sequence[str] = STRATEGIES, deadline: float = 1.0) -> Tuple[str, SearchResult, Dict]:
+    """
+    Runs the strategies at once, one process each, and returns the winner, its plan and the report of the race.
+
+    The first proven optimal plan wins at once, otherwise the cheapest plan
+    found within `deadline` seconds (or, if none is ready by then, the first
+    one). The processes still running are terminated. The report has an
+    entry per strategy: its cost, time and optimality, its error, or
+    'cancelled'. In a daemonic process (a multiprocessing.Pool worker),
+    which cannot start processes, the strategies run one after another
+    instead, until the first optimal plan or the deadline.
+    """
+    start = time.perf_counter()
+    if multiprocessing.current_process().daemon:
+        return _sequential(world_json, strategies, start + deadline)
+
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    running = {}
+    for strategy in strategies:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run, args=(strategy, world_json, deadline, sender), daemon=True)
+        process.start()
+        sender.close()
+        running[receiver] = (strategy, process)
+
+    report: Dict[str, Dict] = {}
+    try:
+        while running:
+            remaining = start + deadline - time.perf_counter()
+            finished = [entry for entry in report.values() if 'cost' in entry]
+            if remaining <= 0 and finished:
+                break
+            for receiver in wait(list(running), timeout=max(0.0, remaining) if remaining > 0 else None):
+                strategy, process = running.pop(receiver)
+                try:
+                    report[strategy] = receiver.recv()
+                except EOFError:
+                    report[strategy] = {'error': 'exited with code {}'.format(process.exitcode)}
+                process.join()
+            if any(entry.get('optimal') for entry in report.values()):
+                break
+    finally:
+        for strategy, process in running.values():
+            process.terminate()
+            report[strategy] = {'cancelled': True}
+        for _, process in running.values():
+            process.join()
+
+    return _winner(report)
+
+
+def _sequential(world_json: Dict, strategies: Sequence[str], deadline: float) -> Tuple[str, SearchResult, Dict]:
+    report: Dict[str, Dict] = {}
+    for strategy in strategies:
+        if time.perf_counter() >= deadline and any('cost' in entry for entry in report.values()):
+            report[strategy] = {'cancelled': True}
+            continue
+        started = time.perf_counter()
+        try:
+            result, optimal = solve_strategy(strategy, world_json, max(0.0, deadline - started))
+            report[strategy] = {'actions': result.actions, 'cost': result.cost, 'expanded': result.expanded,
+                                'optimal': optimal}
+        except Exception as error:
+            report[strategy] = {'error': '{}: {}'.format(type(error).__name__, error)}
+        report[strategy]['seconds'] = time.perf_counter() - started
+        if report[strategy].get('optimal'):
+            for later in strategies[strategies.index(strategy) + 1:]:
+                report[later] = {'cancelled': True}
+            break
+    return _winner(report)
+
+
+def _winner(report: Dict[str, Dict]) -> Tuple[str, SearchResult, Dict]:
+    """
+    Picks the optimal plan if any, otherwise the cheapest one (the quickest among equals).
+    """
+    finished = [(not entry['optimal'], entry['cost'], entry['seconds'], strategy)
+                for strategy, entry in report.items() if 'cost' in entry]
+    if not finished:
+        return '', SearchResult(actions=['Climb'], cost=ACTION_COSTS['Climb'], expanded=0), report
+    *_, winner = min(finished)
+    entry = report[winner]
+    return winner, SearchResult(actions=entry['actions'], cost=entry['cost'], expanded=entry['expanded']), report
+
+
+class PortfolioPlayer(wws.OfflinePlayer):
+    """Offline player racing several planning strategies on every world."""
+
+    def __init__(self, *args, strategies: Sequence[str] = STRATEGIES, deadline: float = 1.0, log: Optional[str] = None,
+                 **kwargs):
+        """The `strategies` (see solve_strategy) race for `deadline` seconds (see race), the winner of every world is
+        appended to `self.winners` and, as a JSON line, to the `log` file if given."""
+        super().__init__(*args, **kwargs)
+        for strategy in strategies:
+            check_strategy(strategy)
+        self.strategies = tuple(strategies)
+        self.deadline = deadline
+        self.log = log
+        self.winners: List[Dict] = []
+
+    def solve(self, world_dict: Dict) -> SearchResult:
+        """Race the strategies on a world described in JSON format and record the winner."""
+        start = time.perf_counter()
+        winner, result, report = race(world_dict, self.strategies, self.deadline)
+        record = {
+            'world': world_dict.get('id'),
+            'size': world_dict['size'],
+            'winner': winner,
+            'cost': result.cost,
+            'seconds': time.perf_counter() - start,
+            'strategies': {strategy: {key: value for key, value in entry.items() if key != 'actions'}
+                           for strategy, entry in report.items()}
+        }
+        self.winners.append(record)
+        if self.log is not None:
+            with open(self.log, 'a') as fd:
+                fd.write(json.dumps(record) + '\n')
+        return result
+
+    def start_episode(self, world: wws.WumpusWorld) -> Iterable[wws.Hunter.Actions]:
+        """Print the description of the world before starting."""
+
+        index = WorldIndex.from_world(world)
+        print('World details:')
+        for k, v in index.describe().items():
+            print('  {}: {}'.format(k, v))
+
+        def portfolio_search():
+            """
+            Race the strategies and yield the actions of the winner.
+            """
+            yield from index.to_actions(self.solve(index.world_json).actions)
+
+        return portfolio_search()
+
+
+def main(*cargs):
+    """Race the planning strategies on worlds and report the winners"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('sources', nargs='+', help='worlds to solve, as for batch.py')
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), help='strategies racing (see solve_strategy)')
+    parser.add_argument('--deadline', type=float, default=1.0, help='seconds before the best plan found is taken')
+    parser.add_argument('--log', help='JSONL file the winners are appended to')
+    args = parser.parse_args(cargs)
+
+    try:
+        player = PortfolioPlayer(strategies=args.strategies, deadline=args.deadline, log=args.log)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    for name, text in (world for source in args.sources for world in read_worlds(source)):
+        player.solve(json.loads(text))
+        record = player.winners[-1]
+        print('{:40} {:24} cost {:>6} in {:.3f}s'.format(name, record['winner'] or '-', record['cost'], record['seconds']))
+
+    wins = Counter(record['winner'] for record in player.winners)
+    print('Wins: ' + ', '.join('{} {}'.format(strategy, count) for strategy, count in wins.most_common()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,220 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+import numpy as np
+from grid import Grid, FREE
+from fields import UNREACHABLE
+
+
+# Pose fields kept in memory per map, by target set: the exits of a map rarely change, the golds often come back
+FIELDS_KEPT = 16
+
+# Caches of the last maps, by content: the map stays the same while the objects move between episodes
+CACHES_KEPT = 8
+_caches: 'OrderedDict[str, PoseFieldCache]' = OrderedDict()
+
+
+def map_key(grid: Grid) -> str:
+    """
+    Hashes the size and the content (pits and blocks) of the cells of a grid.
+    """
+    return hashlib.sha1(b'%d:%d:' % (grid.width, grid.height) + bytes(grid.cells)).hexdigest()
+
+
+def pose_field(grid: Grid, targets: Iterable[int]) -> np.ndarray:
+    """
+    Computes the cost (moves and turns) from every pose to the closest target, as a (cells, 4) int32 array.
+
+    It is heuristics.pose_distances for a set of targets, run backwards
+    from the poses on the targets one cost at a time with NumPy: the
+    poses reaching the frontier are the turns of its poses and the moves
+    into them from the cell behind. UNREACHABLE if there is no way.
+    """
+    width, size = grid.width, len(grid)
+    free = np.frombuffer(grid.cells, dtype=np.uint8) == FREE
+    column = np.arange(size) % width
+    costs = np.full(size * 4, UNREACHABLE, dtype=np.int32)
+    cells = np.unique(np.fromiter(targets, dtype=np.intp))
+    frontier = (cells[:, None] * 4 + np.arange(4)).ravel()
+    costs[frontier] = 0
+
+    cost = 0
+    while frontier.size:
+        cost += 1
+        cell, heading = frontier >> 2, frontier & 3
+        turns = np.concatenate((cell * 4 + (heading + 1) % 4, cell * 4 + (heading - 1) % 4))
+        # the cell behind each pose (N, E, S, W) and whether it is on the grid
+        behind = np.choose(heading, (cell - width, cell - 1, cell + width, cell + 1))
+        inside = np.choose(heading, (cell >= width, column[cell] > 0, cell < size - width, column[cell] < width - 1))
+        inside &= free[np.where(inside, behind, 0)]
+        moves = behind[inside] * 4 + heading[inside]
+        reached = np.concatenate((turns, moves))
+        frontier = np.unique(reached[costs[reached] == UNREACHABLE])
+        costs[frontier] = cost
+    return costs.reshape(size, 4)
+
+
+class PoseFieldCache:
+    """
+    Cache of the pose fields of a map (see pose_field), shared by all the episodes on it.
+
+    The costs are the moves and turns around the pits and the blocks (the
+    Wumpuses are passable, they might be killed), so they only depend on
+    the map and the targets: the exits of the map and the golds seen
+    again are looked up instead of flooded, a new target set is flooded
+    once for the map. The last FIELDS_KEPT fields
+    stay in memory, with `directory` every field is also saved there as a
+    .npy file named after the map and the targets, and mapped read only
+    by the later episodes and processes.
+    """
+
+    def __init__(self, grid: Grid, directory: Optional[str] = None):
+        # a copy: the grid of an episode might change, the map of the cache does not
+        self.grid = Grid(grid.width, grid.height, bytearray(grid.cells))
+        self.key = map_key(grid)
+        self.directory = directory
+        self.fields: 'OrderedDict[Tuple[int, ...], np.ndarray]' = OrderedDict()
+
+    def pose_field(self, targets: Iterable[int]) -> np.ndarray:
+        """
+        The cost from every pose to the closest target, as a (cells, 4) array.
+        """
+        targets = tuple(sorted(set(targets)))
+        field = self.fields.get(targets)
+        if field is not None:
+            self.fields.move_to_end(targets)
+            return field
+        field = self._load(targets)
+        if field is None:
+            field = pose_field(self.grid, targets)
+            self._save(targets, field)
+        self.fields[targets] = field
+        while len(self.fields) > FIELDS_KEPT:
+            self.fields.popitem(last=False)
+        return field
+
+    def cost(self, cell: int, heading: int, targets: Iterable[int]) -> float:
+        """
+        The cost of the moves and turns from a pose to the closest target (inf if unreachable).
+        """
+        cost = self.pose_field(targets)[cell, heading]
+        return float(cost) if cost != UNREACHABLE else float('inf')
+
+    # Persistence
+    # -----------
+
+    def _path(self, targets: Tuple[int, ...]) -> str:
+        name = hashlib.sha1(','.join(map(str, targets)).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, self.key, name + '.poses.npy')
+
+    def _load(self, targets: Tuple[int, ...]) -> Optional[np.ndarray]:
+        if self.directory is None or not os.path.exists(self._path(targets)):
+            return None
+        return np.load(self._path(targets), mmap_mode='r')
+
+    def _save(self, targets: Tuple[int, ...], field: np.ndarray):
+        """
+        Writes a field atomically, the processes sharing the directory never read a partial file.
+        """
+        if self.directory is None:
+            return
+        path = self._path(targets)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as temporary_file:
+            np.save(temporary_file, field)
+        os.replace(temporary, path)
+
+
+def cached_pose_fields(grid: Grid, directory: Optional[str] = None) -> PoseFieldCache:
+    """
+    Returns the pose field cache of the map of a grid, creating it only once per map.
+
+    It is kept in `grid.fields` and the last CACHES_KEPT are kept by the
+    content of the map, so the episodes on the same map (whatever the
+    objects) share it. With `directory` its fields are saved there.
+    """
+    if 'pose_fields' not in grid.fields:
+        key = map_key(grid)
+        cache = _caches.get(key)
+        if cache is None or cache.directory != directory:
+            cache = _caches[key] = PoseFieldCache(grid, directory)
+            while len(_caches) > CACHES_KEPT:
+                _caches.popitem(last=False)
+        else:
+            _caches.move_to_end(key)
+        grid.fields['pose_fields'] = cache
+    return grid.fields['pose_fields']
+
+
+def main(*cargs):
+    """Time the episodes planned with the pose fields kept for a map against the distance fields"""
+    from generator import generate_worlds
+    from planner import plan
+
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('worlds', nargs='*', help='JSON worlds whose maps are used (a generated world if none)')
+    parser.add_argument('--directory', help='directory the fields are saved to and loaded from')
+    parser.add_argument('--size', nargs=2, type=int, default=[48, 48], metavar=('WIDTH', 'HEIGHT'), help='size of the generated world')
+    parser.add_argument('--episodes', type=int, default=50, help='episodes planned on each map, moving the hunter and the gold')
+    parser.add_argument('--golds', type=int, default=5, help='cells the gold of the episodes is drawn from')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated world and of the episodes')
+    args = parser.parse_args(cargs)
+
+    worlds = []
+    for path in args.worlds:
+        with open(path) as fd:
+            worlds.append(json.load(fd))
+    if not worlds:
+        worlds = list(generate_worlds(args.size[0], args.size[1], count=1, seed=args.seed))
+
+    rng = np.random.default_rng(args.seed)
+    for world in worlds:
+        grid = Grid.from_json(world)
+        free = np.flatnonzero(np.frombuffer(grid.cells, dtype=np.uint8) == FREE)
+        if free.size < args.golds + 2:
+            continue
+        golds = rng.choice(free, args.golds, replace=False)
+        exit_ = grid.coords(int(rng.choice(free)))
+
+        timings = {'cold': 0.0, 'kept': 0.0}
+        expanded = {'cold': 0, 'kept': 0}
+        for _ in range(args.episodes):
+            hunter, gold = grid.coords(int(rng.choice(free))), grid.coords(int(rng.choice(golds)))
+            episode = dict(world, hunters=[[hunter[0], hunter[1], 'N']], golds=[list(gold)], exits=[list(exit_)])
+            for mode in timings:
+                # a new grid per episode, as the players build
+                episode_grid = Grid.from_json(episode)
+                begin = time.perf_counter()
+                if mode == 'kept':
+                    result = plan(episode, grid=episode_grid,
+                                  pose_fields=cached_pose_fields(episode_grid, args.directory))
+                else:
+                    result = plan(episode, grid=episode_grid, fields=True)
+                timings[mode] += time.perf_counter() - begin
+                expanded[mode] += result.expanded
+
+        # once the fields of the golds are kept, the costs are lookups
+        cache = cached_pose_fields(grid, args.directory)
+        queries = [(int(rng.choice(free)), int(rng.integers(4)), int(rng.choice(golds))) for _ in range(10000)]
+        begin = time.perf_counter()
+        for cell, heading, gold in queries:
+            cache.cost(cell, heading, [gold])
+        query = (time.perf_counter() - begin) / len(queries)
+
+        print('{} {}x{}: {:.1f}us per cost, per episode {:.2f}ms ({} expanded) with the kept fields, '
+              '{:.2f}ms ({} expanded) with distance fields'.format(
+                  world.get('id'), grid.width, grid.height, query * 1e6,
+                  1e3 * timings['kept'] / args.episodes, expanded['kept'] // args.episodes,
+                  1e3 * timings['cold'] / args.episodes, expanded['cold'] // args.episodes))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import math
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from grid import Grid, FREE
+from planner import State, ACTION_COSTS, NONE
+from sight import cached_shooting_index, MISS
+from stats import SearchStats, phase
+
+
+# Turn taken to go from a heading to another (never the opposite one in a corridor)
+TURNS = {1: ('Right',), 3: ('Left',), 0: ()}
+
+
+class Corridors:
+    """
+    The cells of a grid the search can skip.
+
+    `dead` cells lead nowhere: they are peeled from the map like the leaves
+    of a tree until only cells with two ways out or `kept` cells remain
+    (the gold, the exits, the start, the Wumpuses and the cells from which
+    an arrow hits one). Going into a dead end and back costs at least 4
+    (2 moves, 2 turns), turning around in place costs 2, so they are never
+    on an optimal plan. `plain` cells are the remaining ones with exactly
+    two neighbours and nothing to do there: a corridor of plain cells is
+    crossed in one macro edge whose actions (moves and the turns of the
+    bends) are computed the first time it is taken.
+    """
+
+    def __init__(self, grid: Grid, kept: Iterable[int]):
+        self.grid = grid
+        kept = set(kept)
+        size = len(grid)
+        open_ = [grid.cells[cell] == FREE for cell in range(size)]
+        self.dead = bytearray(size)
+        degrees = [sum(open_[neighbour] for neighbour in self._around(cell)) if open_[cell] else 0
+                   for cell in range(size)]
+        leaves = [cell for cell in range(size) if open_[cell] and degrees[cell] <= 1 and cell not in kept]
+        while leaves:
+            cell = leaves.pop()
+            if self.dead[cell]:
+                continue
+            self.dead[cell] = 1
+            for neighbour in self._around(cell):
+                if open_[neighbour] and not self.dead[neighbour]:
+                    degrees[neighbour] -= 1
+                    if degrees[neighbour] <= 1 and neighbour not in kept:
+                        leaves.append(neighbour)
+        self.open = bytearray(open_[cell] and not self.dead[cell] for cell in range(size))
+        self.plain = bytearray(self.open[cell] and degrees[cell] == 2 and cell not in kept for cell in range(size))
+        self.walks: Dict[int, Tuple[int, int, Tuple[str, ...], int]] = {}
+
+    def _around(self, cell: int) -> Iterable[int]:
+        for heading in range(4):
+            neighbour = self.grid.ahead(cell, heading)
+            if neighbour >= 0:
+                yield neighbour
+
+    def walk(self, cell: int, heading: int) -> Tuple[int, int, Tuple[str, ...], int]:
+        """
+        The cell and heading reached moving from a pose through the plain cells ahead, the actions and their cost.
+        """
+        pose = cell * 4 + heading
+        walk = self.walks.get(pose)
+        if walk is None:
+            grid = self.grid
+            actions = ['Move']
+            previous, current = cell, grid.ahead(cell, heading)
+            while self.plain[current] and current != cell:
+                for turn in (0, 1, 3):
+                    following = grid.ahead(current, (heading + turn) % 4)
+                    if following >= 0 and following != previous and self.open[following]:
+                        break
+                heading = (heading + turn) % 4
+                actions.extend(TURNS[turn])
+                actions.append('Move')
+                previous, current = current, following
+            walk = self.walks[pose] = (current, heading, tuple(actions), len(actions))
+        return walk
+
+
+def cached_corridors(grid: Grid, kept: FrozenSet[int]) -> Corridors:
+    """
+    Returns the corridors of the grid for the `kept` cells, computing them only once per grid.
+    """
+    key = ('corridors', kept)
+    if key not in grid.fields:
+        grid.fields[key] = Corridors(grid, kept)
+    return grid.fields[key]
+
+
+def search_pruned(
+        start: State,
+        grid: Grid,
+        gold: int,
+        wumpuses: FrozenSet[int],
+        goal: Callable[[State], bool],
+        estimate: Callable[[State], float],
+        exits: Iterable[int] = (),
+        stats: Optional[SearchStats] = None
+    ) -> Tuple[Optional[List[str]], float, Optional[State], int]:
+    """
+    Same search as planner.search, without the states that cannot be on a better plan.
+
+    A shot missing every Wumpus only loses the arrow, so it is never
+    tried, and a state without the gold is dropped when the same pose and
+    arrow were reached with the gold for no more (carrying the gold
+    forbids nothing). Moves skip the dead ends and cross the corridors in
+    one step (see Corridors): the goal is on the `exits` and the gold,
+    which are kept out of the corridors with the start, the Wumpuses and
+    their shooting poses. The plans stay optimal, with as many expanded
+    states as there are junctions.
+    """
+    with phase(stats, 'sight'):
+        targets = cached_shooting_index(grid, wumpuses)
+        shooting = {pose >> 2 for pose, target in enumerate(targets) if target != MISS}
+        kept = frozenset(shooting | set(wumpuses) | set(exits) | {gold, start.cell})
+        corridors = cached_corridors(grid, kept)
+    with phase(stats, 'search'):
+        actions, cost, final, expanded, generated, frontier_peak = _search_pruned(
+            start, grid, gold, wumpuses, goal, estimate, targets, corridors, stats is not None
+        )
+    if stats is not None:
+        stats.search(generated, expanded, frontier_peak)
+    return actions, cost, final, expanded
+
+
+def _successors(state: State, gold: int, wumpuses: FrozenSet[int], targets, corridors: Corridors):
+    """
+    Yields (actions, cost, next state), the corridors taken in one step.
+    """
+    yield ('Left',), 1, state._replace(heading=(state.heading - 1) % 4)
+    yield ('Right',), 1, state._replace(heading=(state.heading + 1) % 4)
+
+    ahead = corridors.grid.ahead(state.cell, state.heading)
+    if ahead >= 0 and corridors.open[ahead]:
+        cell, heading, actions, cost = corridors.walk(state.cell, state.heading)
+        # the corridors hold no Wumpus, only its end might
+        if cell not in wumpuses or cell == state.killed:
+            yield actions, cost, state._replace(cell=cell, heading=heading)
+
+    if state.has_arrow:
+        target = targets[state.cell * 4 + state.heading]
+        if target != MISS:
+            yield ('Shoot',), ACTION_COSTS['Shoot'], state._replace(has_arrow=False, killed=target)
+
+    if not state.has_gold and state.cell == gold:
+        yield ('Grab',), ACTION_COSTS['Grab'], state._replace(has_gold=True)
+
+
+def _search_pruned(start, grid, gold, wumpuses, goal, estimate, targets, corridors, counting):
+    """
+    The loop of search_pruned, the peak frontier is only tracked when `counting`.
+    """
+    counter = itertools.count()
+    frontier = [(estimate(start), 0, next(counter), start)]
+    best_cost: Dict[State, int] = {start: 0}
+    parents: Dict[State, Tuple[State, Tuple[str, ...]]] = {}
+    expanded = 0
+    frontier_peak = 1
+
+    while frontier:
+        if counting and len(frontier) > frontier_peak:
+            frontier_peak = len(frontier)
+        _, cost, _, state = heapq.heappop(frontier)
+        if cost > best_cost[state]:
+            continue
+        if not state.has_gold and best_cost.get(state._replace(has_gold=True), math.inf) <= cost:
+            # dominated since it was queued
+            continue
+        expanded += 1
+
+        if goal(state):
+            final = state
+            steps = []
+            while state in parents:
+                state, actions = parents[state]
+                steps.append(actions)
+            return [action for actions in reversed(steps) for action in actions], cost, final, expanded, \
+                next(counter), frontier_peak
+
+        for actions, step_cost, successor in _successors(state, gold, wumpuses, targets, corridors):
+            successor_cost = cost + step_cost
+            if successor_cost < best_cost.get(successor, successor_cost + 1):
+                if not successor.has_gold and best_cost.get(successor._replace(has_gold=True), math.inf) <= successor_cost:
+                    continue
+                remaining = estimate(successor)
+                if remaining == math.inf:
+                    continue
+                best_cost[successor] = successor_cost
+                parents[successor] = (state, actions)
+                heapq.heappush(frontier, (successor_cost + remaining, successor_cost, next(counter), successor))
+
+    return None, math.inf, None, expanded, next(counter), frontier_peak
@@ -0,0 +1,369 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set, Tuple, Union
+from batch import HEURISTICS, PLAYERS, dump_record, init_worker, solve
+from jps import ENGINES
+
+
+# Longest line accepted, a line holds a whole world
+LINE_LIMIT = 1 << 30
+
+# Options of a request and their defaults
+OPTIONS = {'player': 'bfs', 'heuristic': 'minmax', 'engine': None}
+
+
+# --- Connections
+
+async def start_server(handler, address: str, **kwargs) -> asyncio.AbstractServer:
+    """
+    Listens on 'unix:PATH' (a Unix socket) or 'HOST:PORT' (TCP).
+    """
+    if address.startswith('unix:'):
+        return await asyncio.start_unix_server(handler, path=address[5:], limit=LINE_LIMIT, **kwargs)
+    host, _, port = address.rpartition(':')
+    return await asyncio.start_server(handler, host=host or '127.0.0.1', port=int(port), limit=LINE_LIMIT, **kwargs)
+
+
+async def open_connection(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Connects to a server started with start_server.
+    """
+    if address.startswith('unix:'):
+        return await asyncio.open_unix_connection(path=address[5:], limit=LINE_LIMIT)
+    host, _, port = address.rpartition(':')
+    return await asyncio.open_connection(host=host or '127.0.0.1', port=int(port), limit=LINE_LIMIT)
+
+
+# --- Server
+
+def check_request(request) -> Optional[str]:
+    """
+    Returns what is wrong with the header of a request, None if it can be solved.
+    """
+    if not isinstance(request, dict):
+        return 'the header is not a JSON object'
+    player, heuristic, engine = (request.get(name, default) for name, default in OPTIONS.items())
+    if player not in PLAYERS:
+        return 'unknown player {!r}'.format(player)
+    if heuristic not in HEURISTICS:
+        return 'unknown heuristic {!r}'.format(heuristic)
+    if engine is not None and engine not in ENGINES:
+        return 'unknown engine {!r}'.format(engine)
+    deadline = request.get('deadline')
+    if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float))
+                                 or not deadline >= 0):
+        return 'the deadline must be a number of seconds, not {!r}'.format(deadline)
+    return None
+
+
+class _Job:
+    """
+    A solve waiting for (or running on) the pool, shared by the identical requests.
+    """
+    __slots__ = ('task', 'future', 'deadline')
+
+    def __init__(self, task: Tuple, future: asyncio.Future, deadline: Optional[float]):
+        self.task = task
+        self.future = future
+        self.deadline = deadline
+
+
+class PlanningServer:
+    """
+    Plans for the worlds sent over a connection, solved on a pool of worker processes.
+
+    The protocol is line based: a request is a JSON header line (`id`,
+    optionally `player`, `heuristic`, `engine` as for batch.py and
+    `deadline` in seconds, `compact` for the plan in its text form)
+    followed by the world as a JSON line, the response a JSON line with
+    the same `id` and the record of batch.solve (`outcome`, `cost`,
+    `actions`... see batch.dump_record), or the outcome 'timeout' when the
+    deadline passed ('error' for the requests check_request rejects). Responses come in the order the solves complete.
+
+    The worlds are never parsed by the server. Identical requests in flight
+    (same world text and options) share a single solve, the `coalesced`
+    field of the response tells which ones waited for another. At most
+    `queue_size` solves wait for a worker: past that the server stops
+    reading the connections, so the clients are slowed down by the flow
+    control of the sockets rather than piling up work. Solves whose
+    requests all expired while waiting are dropped. The workers keep their
+    plan cache (and the caches of the planners) between requests, with
+    `lean` they search with flat buffers (see lean.py), with `prune` they skip
+    the dominated states and the corridors (see pruning.py). The pose
+    fields of the maps (heuristic 'pose_fields') stay in the workers as well,
+    and are shared in `pose_fields_directory` if given.
+    """
+
+    def __init__(self, workers: int = os.cpu_count(), queue_size: int = 64, cache_directory: Optional[str] = None,
+                 lean: bool = False, prune: bool = False, pose_fields_directory: Optional[str] = None):
+        self.workers = workers
+        self.lean = lean
+        self.prune = prune
+        self.queue_size = queue_size
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                        initargs=(cache_directory, True, pose_fields_directory))
+        self.queue: Optional[asyncio.Queue] = None
+        self.jobs: Dict[Tuple, _Job] = {}
+        self.counters = {'requests': 0, 'solved': 0, 'coalesced': 0, 'expired': 0, 'timeouts': 0, 'invalid': 0}
+
+    async def serve(self, address: str):
+        """
+        Serves until cancelled, or interrupted by SIGINT or SIGTERM.
+        """
+        self.queue = asyncio.Queue(self.queue_size)
+        dispatchers = [asyncio.ensure_future(self._dispatch()) for _ in range(self.workers)]
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_event_loop().add_signal_handler(signum, stop.set)
+            except NotImplementedError:
+                # Windows, interrupted by KeyboardInterrupt instead
+                pass
+        server = await start_server(self.handle, address)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            if sys.version_info >= (3, 9):
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            else:
+                # the jobs are only handed to the pool by the dispatchers, none is waiting in it
+                self.pool.shutdown(wait=False)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Reads the requests of a connection, each one is answered by its own task.
+        """
+        lock = asyncio.Lock()
+        answers: Set[asyncio.Future] = set()
+        try:
+            while True:
+                header = await reader.readline()
+                world = await reader.readline()
+                if not world.endswith(b'\n'):
+                    break
+                request = json.loads(header)
+                error = check_request(request)
+                if error is not None:
+                    self.counters['invalid'] += 1
+                    identifier = request.get('id') if isinstance(request, dict) else None
+                    answer = asyncio.ensure_future(self._write(
+                        {'outcome': 'error', 'error': error, 'id': identifier, 'coalesced': False}, False, writer, lock
+                    ))
+                else:
+                    job, coalesced, deadline = await self._submit(request, world.rstrip(b'\n'))
+                    answer = asyncio.ensure_future(self._answer(request.get('id'), job, coalesced, deadline,
+                                                                bool(request.get('compact')), writer, lock))
+                answers.add(answer)
+                answer.add_done_callback(answers.discard)
+            if answers:
+                await asyncio.wait(answers)
+        except (ConnectionError, ValueError):
+            # the client went away or sent garbage, its solves still complete for the others
+            pass
+        except asyncio.CancelledError:
+            # the server is stopping
+            pass
+        finally:
+            writer.close()
+
+    async def _submit(self, request: Dict, world: bytes) -> Tuple[_Job, bool, Optional[float]]:
+        """
+        Returns the job solving the request, whether it was already in flight and the deadline of the request.
+
+        New jobs wait for room in the queue.
+        """
+        loop = asyncio.get_event_loop()
+        self.counters['requests'] += 1
+        options = tuple(request.get(name, default) for name, default in OPTIONS.items())
+        deadline = loop.time() + request['deadline'] if request.get('deadline') is not None else None
+
+        key = (hashlib.sha1(world).digest(),) + options
+        job = self.jobs.get(key)
+        if job is not None:
+            self.counters['coalesced'] += 1
+            job.deadline = None if deadline is None or job.deadline is None else max(job.deadline, deadline)
+            return job, True, deadline
+
+        player, heuristic, engine = options
+        task = (str(request.get('id')), world, player, heuristic, False, engine, None, 1.0, self.lean, self.prune)
+        job = self.jobs[key] = _Job(task, loop.create_future(), deadline)
+        job.future.add_done_callback(lambda _: self.jobs.pop(key, None))
+        await self.queue.put(job)
+        return job, False, deadline
+
+    async def _dispatch(self):
+        """
+        Feeds the pool with the queued jobs, one at a time.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            job = await self.queue.get()
+            if job.deadline is not None and loop.time() >= job.deadline:
+                # nobody is waiting for it anymore
+                self.counters['expired'] += 1
+                job.future.set_exception(asyncio.TimeoutError())
+                # retrieved here, the waiters have all given up already
+                job.future.exception()
+                continue
+            try:
+                record = await loop.run_in_executor(self.pool, solve, job.task)
+            except Exception as error:
+                record = {'outcome': 'error', 'error': '{}: {}'.format(type(error).__name__, error)}
+            self.counters['solved'] += 1
+            job.future.set_result(record)
+
+    async def _answer(self, identifier, job: _Job, coalesced: bool, deadline: Optional[float], compact: bool,
+                      writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        """
+        Waits for the job (until the deadline of the request) and writes the response.
+        """
+        timeout = None if deadline is None else max(0.0, deadline - asyncio.get_event_loop().time())
+        try:
+            # shielded, the other requests of the job might wait longer
+            record = await asyncio.wait_for(asyncio.shield(job.future), timeout)
+            # the name and the id of the world are replaced by the id of the request
+            response = {key: value for key, value in record.items() if key not in ('world', 'id')}
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            response = {'outcome': 'timeout'}
+        response.update(id=identifier, coalesced=coalesced)
+        await self._write(response, compact, writer, lock)
+
+    async def _write(self, response: Dict, compact: bool, writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        """
+        Writes a response on the connection, one at a time.
+        """
+        async with lock:
+            if writer.is_closing():
+                # the client gave up on the connection
+                return
+            try:
+                writer.write(dump_record(response, compact).encode() + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                writer.close()
+
+
+# --- Client
+
+class PlanningClient:
+    """
+    Connection to a PlanningServer, several requests can be in flight at once.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, address: str) -> 'PlanningClient':
+        return cls(*await open_connection(address))
+
+    async def __aenter__(self) -> 'PlanningClient':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        self.writer.close()
+        self.receiver.cancel()
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.pending.pop(response['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('connection to the planning server lost'))
+
+    async def plan(self, world: Union[Dict, str, bytes], deadline: Optional[float] = None, **options) -> Dict:
+        """
+        Sends a world (JSON or its text) and returns the response.
+
+        `options` are the player, heuristic and engine of the request (and
+        `compact` for the plan as text, see batch.dump_record), past
+        the `deadline` (in seconds) the response is a 'timeout' outcome.
+        """
+        if isinstance(world, dict):
+            world = json.dumps(world)
+        if isinstance(world, str):
+            world = world.encode()
+        world = world.strip()
+        if b'\n' in world:
+            # pretty printed, the world must fit on a line
+            world = json.dumps(json.loads(world)).encode()
+        request = dict(options, id=next(self.ids))
+        if deadline is not None:
+            request['deadline'] = deadline
+        future = self.pending[request['id']] = asyncio.get_event_loop().create_future()
+        start = asyncio.get_event_loop().time()
+        self.writer.write(json.dumps(request).encode() + b'\n' + world + b'\n')
+        await self.writer.drain()
+        if deadline is None:
+            return await future
+        try:
+            # the server only counts from when it reads the request, the client from when it sends it
+            return await asyncio.wait_for(future, max(0.0, start + deadline - asyncio.get_event_loop().time()))
+        except asyncio.TimeoutError:
+            self.pending.pop(request['id'], None)
+            return {'id': request['id'], 'outcome': 'timeout', 'coalesced': False}
+
+
+def plan(address: str, world: Union[Dict, str], deadline: Optional[float] = None, **options) -> Dict:
+    """
+    Requests a single plan, for synchronous callers.
+    """
+    async def request() -> Dict:
+        async with await PlanningClient.connect(address) as client:
+            return await client.plan(world, deadline, **options)
+    return asyncio.run(request())
+
+
+def main(*cargs):
+    """Serve plans to the simulators over a Unix socket or TCP"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--address', default='127.0.0.1:8765', help='HOST:PORT or unix:PATH to listen on')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--queue', type=int, default=64, help='solves waiting for a worker before the connections are throttled')
+    parser.add_argument('--cache', help='directory of the plan cache shared by the workers')
+    parser.add_argument('--pose-fields', help='directory of the pose fields of the maps shared by the workers (see posefields.py)')
+    parser.add_argument('--lean', action='store_true', help='search with flat buffers, a few bytes per state (see lean.py)')
+    parser.add_argument('--prune', action='store_true', help='skip the dominated states, the dead ends and the corridors (see pruning.py)')
+    args = parser.parse_args(cargs)
+
+    server = PlanningServer(workers=args.workers, queue_size=args.queue, cache_directory=args.cache, lean=args.lean,
+                           prune=args.prune, pose_fields_directory=args.pose_fields)
+    print('Serving plans on {} ({} workers, players: {}, heuristics: {}, engines: {})'.format(
+        args.address, args.workers, ', '.join(PLAYERS), ', '.join(HEURISTICS), ', '.join(sorted(ENGINES))
+    ), file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.address))
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.counters), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,90 @@
+from array import array
+from typing import FrozenSet, Iterable, Iterator, Set, Tuple
+from grid import Grid, BLOCK, NORTH, EAST, SOUTH, WEST
+
+
+# Target of the poses from which the arrow hits no Wumpus
+MISS = -1
+
+
+def shooting_poses(grid: Grid, wumpus: int, wumpuses: Iterable[int] = ()) -> Iterator[Tuple[int, int]]:
+    """
+    Yields the (cell, heading) poses from which an arrow hits the Wumpus in `wumpus`.
+
+    The arrow flies along the row or the column until it hits a Wumpus, a
+    block or the border (pits do not stop it), so the poses are the cells
+    in line with the Wumpus up to the first block, looking towards it. The
+    line also stops at the other `wumpuses`, they would be hit first.
+    """
+    for heading in range(4):
+        # walk away from the Wumpus, the hunter looks back at it
+        facing = (heading + 2) % 4
+        cell = grid.ahead(wumpus, heading)
+        while cell >= 0 and grid.cells[cell] != BLOCK:
+            yield cell, facing
+            if cell in wumpuses:
+                break
+            cell = grid.ahead(cell, heading)
+
+
+def shooting_index(grid: Grid, wumpuses: Iterable[int]) -> array:
+    """
+    Builds the line of sight index of the Wumpuses.
+
+    Entry `cell * 4 + heading` is the cell of the Wumpus hit when shooting
+    from `cell` looking at `heading`, MISS if the arrow hits none, so
+    checking a shot is a single lookup. Building it walks the rows and
+    columns of the Wumpuses only.
+    """
+    wumpuses = frozenset(wumpuses)
+    targets = array('i', [MISS]) * (4 * len(grid))
+    for wumpus in wumpuses:
+        for cell, heading in shooting_poses(grid, wumpus, wumpuses):
+            targets[cell * 4 + heading] = wumpus
+    return targets
+
+
+def update_shooting_index(grid: Grid, wumpuses: Iterable[int], targets: array, cells: Iterable[int]) -> Set[int]:
+    """
+    Updates the shooting index in place after a change in `cells`, returns the cells whose shots changed target.
+
+    A block or a Wumpus only stops the arrows flying along its row and its
+    column, so only those lines are swept again: walking a line against
+    the heading, the target of each cell is the last Wumpus seen, and a
+    block forgets it.
+    """
+    wumpuses = frozenset(wumpuses)
+    width, size = grid.width, len(grid)
+    # each line goes from the south-west border towards `forward`
+    lines = set()
+    for cell in cells:
+        x, y = grid.coords(cell)
+        lines.add((range(y * width, (y + 1) * width), EAST, WEST))
+        lines.add((range(x, size, width), NORTH, SOUTH))
+
+    changed = set()
+    for line, forward, backward in lines:
+        for heading, sweep in ((forward, reversed(line)), (backward, line)):
+            hit = MISS
+            for cell in sweep:
+                if grid.cells[cell] == BLOCK:
+                    hit = MISS
+                if targets[cell * 4 + heading] != hit:
+                    targets[cell * 4 + heading] = hit
+                    changed.add(cell)
+                if cell in wumpuses:
+                    hit = cell
+    return changed
+
+
+def cached_shooting_index(grid: Grid, wumpuses: FrozenSet[int]) -> array:
+    """
+    Returns the shooting index of the Wumpuses, building it only once per grid.
+
+    Like the distance fields it is cached in `grid.fields`, so it is
+    dropped when a block (or any cell) changes.
+    """
+    key = ('sight', frozenset(wumpuses))
+    if key not in grid.fields:
+        grid.fields[key] = shooting_index(grid, key[1])
+    return grid.fields[key]
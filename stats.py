@@ -0,0 +1,149 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class SearchStats:
+    """
+    Measures of a single solve: per-phase timings, search counters and memory.
+
+    The players create one per episode when asked to (see BfsPlayer and
+    AstarPlayer), the planner only touches it when one is given, so there
+    is no cost when the statistics are disabled. Phases are timed with
+    `phase` ('solve' is the whole solve, the others are parts of it), the
+    search adds its generated and expanded states and its peak frontier,
+    and `branch` tells whether the plan goes through a Wumpus (shooting it)
+    or around it.
+    """
+
+    def __init__(self, player: str = '', world: Optional[str] = None, memory: bool = False):
+        self.player = player
+        self.world = world
+        self.memory = memory
+        self.timings: Dict[str, float] = {}
+        self.generated = 0
+        self.expanded = 0
+        self.frontier_peak = 0
+        self.peak_memory: Optional[int] = None
+        self.branch: Optional[str] = None
+        self.cost: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times a phase, the time of phases run several times is summed.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def tracing(self) -> Iterator[None]:
+        """
+        Records the peak memory allocated inside the block (only with `memory`, tracemalloc is slow).
+        """
+        if not self.memory:
+            yield
+            return
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):
+            # Python 3.9+, otherwise the peak includes what was traced before
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak_memory = max(self.peak_memory or 0, peak)
+            if started:
+                tracemalloc.stop()
+
+    def measure(self, world_json: Dict, solve: Callable[[], 'SearchResult']) -> 'SearchResult':
+        """
+        Runs a solve of the world as the 'solve' phase and records its result.
+        """
+        with self.tracing(), self.phase('solve'):
+            result = solve()
+        self.result(result.actions, result.cost, len(world_json.get('wumpuses', [])))
+        return result
+
+    def search(self, generated: int, expanded: int, frontier_peak: int):
+        """
+        Adds the counters of a search (a plan might run several).
+        """
+        self.generated += generated
+        self.expanded += expanded
+        self.frontier_peak = max(self.frontier_peak, frontier_peak)
+
+    def result(self, actions: List[str], cost: float, wumpuses: int):
+        """
+        Records the cost of the chosen plan and its branch.
+        """
+        self.cost = cost
+        if not wumpuses:
+            self.branch = 'no_wumpus'
+        else:
+            self.branch = 'through_wumpus' if 'Shoot' in actions else 'around_wumpus'
+
+    def to_dict(self) -> Dict:
+        return {
+            'player': self.player,
+            'world': self.world,
+            'timings': dict(self.timings),
+            'generated': self.generated,
+            'expanded': self.expanded,
+            'frontier_peak': self.frontier_peak,
+            'peak_memory': self.peak_memory,
+            'branch': self.branch,
+            'cost': self.cost
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self, prefix: str = 'wumpus_planner') -> str:
+        """
+        Formats the statistics in the Prometheus text exposition format.
+        """
+        labels = 'player="{}"'.format(self.player)
+        if self.world is not None:
+            labels += ',world="{}"'.format(str(self.world).replace('\\', '\\\\').replace('"', '\\"'))
+
+        lines = [
+            '# HELP {}_phase_seconds Time spent in each phase of the solve.'.format(prefix),
+            '# TYPE {}_phase_seconds gauge'.format(prefix)
+        ]
+        for name, seconds in self.timings.items():
+            lines.append('{}_phase_seconds{{{},phase="{}"}} {}'.format(prefix, labels, name, seconds))
+
+        gauges = [
+            ('generated_states', 'States generated by the search.', self.generated),
+            ('expanded_states', 'States expanded by the search.', self.expanded),
+            ('frontier_peak', 'Largest size of the search frontier.', self.frontier_peak),
+            ('peak_memory_bytes', 'Peak memory allocated by the solve.', self.peak_memory),
+            ('plan_cost', 'Cost of the chosen plan.', self.cost)
+        ]
+        for name, description, value in gauges:
+            if value is None:
+                continue
+            lines.append('# HELP {}_{} {}'.format(prefix, name, description))
+            lines.append('# TYPE {}_{} gauge'.format(prefix, name))
+            lines.append('{}_{}{{{}}} {}'.format(prefix, name, labels, value))
+
+        if self.branch is not None:
+            lines.append('# HELP {}_branch Branch of the chosen plan.'.format(prefix))
+            lines.append('# TYPE {}_branch gauge'.format(prefix))
+            lines.append('{}_branch{{{},branch="{}"}} 1'.format(prefix, labels, self.branch))
+        return '\n'.join(lines) + '\n'
+
+
+def phase(stats: Optional[SearchStats], name: str):
+    """
+    Times a phase in `stats`, does nothing if the statistics are disabled (None).
+    """
+    return stats.phase(name) if stats is not None else nullcontext()
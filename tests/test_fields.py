@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from fields import distance_field, field_path, UNREACHABLE
+from grid import Grid
+from planner import plan, plan_anytime
+from validate import simulate, OUTCOMES
+
+# The gold in the corner is walled in by pits, the exit is across the map behind a Wumpus
+WORLD = {
+    'size': [6, 4],
+    'hunters': [[4, 1, 'E']],
+    'exits': [[0, 0]],
+    'golds': [[5, 3]],
+    'pits': [[4, 3], [5, 2], [1, 1], [1, 2]],
+    'wumpuses': [[1, 0]],
+    'blocks': []
+}
+
+
+def test_field_path_goes_downhill_to_the_source():
+    grid = Grid.from_json(WORLD)
+    exit_, start = grid.cell(0, 0), grid.cell(4, 1)
+    distances = distance_field(grid, [exit_])
+    path = field_path(grid, distances, start)
+    assert path[0] == start and path[-1] == exit_
+    assert len(path) == distances[start] + 1
+    assert all(following in grid.neighbours(cell) for cell, following in zip(path, path[1:]))
+
+
+def test_field_path_is_empty_when_the_source_cannot_be_reached():
+    grid = Grid.from_json(WORLD)
+    distances = distance_field(grid, [grid.cell(0, 0)])
+    assert distances[grid.cell(5, 3)] == UNREACHABLE
+    assert field_path(grid, distances, grid.cell(5, 3)) == []
+
+
+def test_unreachable_gold_walks_around_the_wumpus_to_the_exit():
+    for result in (plan(WORLD), plan_anytime(WORLD, deadline=1.0)):
+        assert 'Grab' not in result.actions and result.actions[-1] == 'Climb'
+        validation = simulate(WORLD, [result.actions])
+        assert OUTCOMES[validation.outcome[0]] == 'climbed'
+        assert validation.illegal[0] == -1
+        assert validation.cost[0] == result.cost
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import hpa
+from grid import Grid, BLOCK
+from hpa import abstract_graph
+
+
+def _walled_grid() -> Grid:
+    """
+    A 64x64 grid split by a wall on x = 20, open on y = 5 and y = 60.
+    """
+    grid = Grid(64, 64)
+    for y in range(64):
+        if y not in (5, 60):
+            grid.cells[grid.cell(20, y)] = BLOCK
+    return grid
+
+
+def test_grids_with_the_same_content_do_not_share_edits():
+    hpa._graphs.clear()
+    first, second = _walled_grid(), _walled_grid()
+    source, target, wumpus = first.cell(0, 5), first.cell(40, 5), first.cell(30, 6)
+    first_graph, second_graph = abstract_graph(first), abstract_graph(second)
+    assert first_graph.grid is first and second_graph.grid is second
+    # both graphs made a variant without the Wumpus, then the second grid is edited
+    expected, _ = first_graph.path(source, target, avoid={wumpus})
+    second_graph.path(source, target, avoid={wumpus})
+    second_graph.set_content(second.cell(20, 5), BLOCK)
+
+    assert first.cells[first.cell(20, 5)] != BLOCK
+    assert abstract_graph(first) is first_graph
+    assert first_graph.path(source, target)[0] == expected
+    assert first_graph.path(source, target, avoid={wumpus})[0] == expected
+    path, _ = abstract_graph(second).path(source, target, avoid={wumpus})
+    assert second.cell(20, 5) not in path and second.cell(20, 60) in path
@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import pytest
+from generator import generate_world
+from grid import FREE, PIT, BLOCK
+from incremental import IncrementalPlanner
+from planner import plan, ACTION_COSTS
+from sight import shooting_index
+
+
+def _world(planner: IncrementalPlanner, world: dict) -> dict:
+    """
+    The JSON world of the current state of the planner, after its edits.
+    """
+    grid = planner.grid
+    cells = lambda content: [list(grid.coords(cell)) for cell in range(len(grid)) if grid.cells[cell] == content]
+    return dict(world, pits=cells(PIT), blocks=cells(BLOCK), golds=[list(grid.coords(planner.gold))],
+                wumpuses=[list(grid.coords(cell)) for cell in sorted(planner.wumpuses)])
+
+
+def _edit(rng: random.Random, planner: IncrementalPlanner):
+    """
+    Applies a random edit, never on the hunter, the exits, the gold or the Wumpuses.
+    """
+    grid = planner.grid
+    fixed = {planner.start.cell, planner.gold} | set(planner.exits) | set(planner.wumpuses)
+    cell = rng.choice([cell for cell in range(len(grid)) if cell not in fixed])
+    x, y = grid.coords(cell)
+    edit = rng.choice(('pit', 'block', 'wumpus', 'gold'))
+    if edit == 'pit':
+        (planner.add_pit if grid.cells[cell] == FREE else planner.remove_pit)(x, y)
+    elif edit == 'block':
+        (planner.add_block if grid.cells[cell] == FREE else planner.remove_block)(x, y)
+    elif grid.cells[cell] != FREE:
+        return
+    elif edit == 'wumpus':
+        planner.move_wumpus(x, y, grid.coords(rng.choice(sorted(planner.wumpuses))))
+    else:
+        planner.move_gold(x, y)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_edits_keep_the_plans_optimal(seed):
+    rng = random.Random(seed)
+    size = rng.randint(4, 9)
+    world = generate_world(size, size, seed=seed, pit_density=0.15, block_density=0.1,
+                           wumpuses=rng.randint(1, 2))
+    planner = IncrementalPlanner(world)
+    for _ in range(25):
+        _edit(rng, planner)
+        result = planner.solve()
+        expected = plan(_world(planner, world))
+        assert result.cost == expected.cost
+        assert sum(ACTION_COSTS[action] for action in result.actions) == result.cost
+        assert planner.targets == shooting_index(planner.grid, planner.wumpuses)
+
+
+def test_edits_retarget_only_their_lines():
+    world = generate_world(150, 150, seed=0, pit_density=0.1, block_density=0.1, wumpuses=3)
+    planner = IncrementalPlanner(world)
+    grid = planner.grid
+    fixed = {planner.start.cell, planner.gold} | set(planner.exits) | set(planner.wumpuses)
+    free = [cell for cell in range(len(grid)) if grid.cells[cell] == FREE and cell not in fixed]
+    cells = random.Random(0).sample(free, 200)
+    # each block sweeps one row and one column, not the 4 * 150 * 150 entries of the index
+    began = time.perf_counter()
+    for cell in cells:
+        planner.add_block(*grid.coords(cell))
+    assert time.perf_counter() - began < 0.5
+    assert planner.targets == shooting_index(grid, planner.wumpuses)
@@ -0,0 +1,34 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import pytest
+from grid import Grid, FREE, PIT, BLOCK
+from jps import astar_path, jps_path
+
+
+def _random_grid(rng: random.Random, width: int, height: int) -> Grid:
+    grid = Grid(width, height)
+    for cell in range(len(grid)):
+        grid.cells[cell] = rng.choices((FREE, PIT, BLOCK), weights=(0.7, 0.15, 0.15))[0]
+    return grid
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_jps_paths_are_as_short_as_astar(seed):
+    rng = random.Random(seed)
+    grid = _random_grid(rng, rng.randint(5, 40), rng.randint(5, 40))
+    free = [cell for cell in range(len(grid)) if grid.cells[cell] == FREE]
+    for _ in range(20):
+        source, target = rng.choice(free), rng.choice(free)
+        avoid = set(rng.sample(free, 3)) - {source, target}
+        expected, _ = astar_path(grid, source, target, avoid)
+        path, _ = jps_path(grid, source, target, avoid)
+        if expected is None:
+            assert path is None
+            continue
+        assert len(path) == len(expected)
+        assert path[0] == source and path[-1] == target
+        assert all(b in grid.neighbours(a) and b not in avoid for a, b in zip(path, path[1:]))
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import pytest
+import lean
+from generator import generate_world
+from planner import plan
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_lean_plans_cost_as_much_as_the_search(seed):
+    world = generate_world(12, 12, seed=seed, pit_density=0.15, block_density=0.05, wumpuses=2)
+    assert plan(world, lean=True, fields=True).cost == plan(world).cost
+
+
+@pytest.mark.parametrize('entry_bits', [lean.ACTION_BITS, 20])
+def test_costs_past_the_entry_bits_fall_back_to_the_search(monkeypatch, entry_bits):
+    # 2 Wumpuses give 8 layers of 12 * 12 * 4 poses, 13 bits of ids: 20 bits leave costs below 16
+    world = generate_world(12, 12, seed=0, pit_density=0.15, wumpuses=2)
+    expected = plan(world).cost
+    fallbacks = []
+    search = lean.search
+    monkeypatch.setattr(lean, 'ENTRY_BITS', entry_bits)
+    monkeypatch.setattr(lean, 'search', lambda *args: fallbacks.append(args) or search(*args))
+    assert plan(world, lean=True, fields=True).cost == expected
+    assert len(fallbacks) == 1
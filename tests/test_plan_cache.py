@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import pytest
+from generator import generate_world
+from plan_cache import PlanCache, SYMMETRIES, _transform_world
+from planner import plan
+from validate import simulate
+
+
+def _unsolved(world_json):
+    raise AssertionError('the plan of a symmetric world must come from the cache')
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_symmetric_worlds_reuse_the_plan(seed, tmp_path):
+    world = generate_world(7, 5, seed=seed, pit_density=0.1, block_density=0.1)
+    cache = PlanCache(directory=str(tmp_path))
+    expected = cache.lookup(world, plan)
+    assert simulate(world, [expected.actions]).record(0)['outcome'] == 'won'
+
+    for symmetry in SYMMETRIES:
+        # transposed and mirrored copies, from the memory tier then from disk
+        image = _transform_world(world, symmetry)
+        for tier in (cache, PlanCache(directory=str(tmp_path))):
+            result = tier.lookup(image, _unsolved)
+            record = simulate(image, [result.actions]).record(0)
+            assert result.cost == expected.cost == record['cost']
+            assert record['illegal'] == -1 and record['outcome'] == 'won'
+    assert cache.stats()['misses'] == 1
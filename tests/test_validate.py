@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import pytest
+from planner import plan
+from validate import simulate, GOLD_REWARD, DEATH_PENALTY
+
+# y
+# 2  .  .  .  W
+# 1  #  P  .  .
+# 0  H  .  G  .
+#    0  1  2  3  x
+WORLD = {
+    'size': [4, 3],
+    'hunters': [[0, 0, 'N']],
+    'exits': [[0, 0]],
+    'golds': [[2, 0]],
+    'pits': [[1, 1]],
+    'blocks': [[0, 1]],
+    'wumpuses': [[3, 2]]
+}
+
+WINNING = ['Right', 'Move', 'Move', 'Grab', 'Left', 'Left', 'Move', 'Move', 'Climb']
+
+
+@pytest.mark.parametrize('actions, outcome, illegal', [
+    (['Move'], 'unfinished', 0),
+    (['Right', 'Move', 'Left', 'Move'], 'dead', 3),
+    (['Shoot', 'Shoot'], 'unfinished', 1),
+    (['Grab'], 'unfinished', 0),
+    (['Right', 'Move', 'Climb'], 'unfinished', 2),
+], ids=['block', 'pit', 'no arrow', 'no gold', 'no exit'])
+def test_rejected_actions(actions, outcome, illegal):
+    record = simulate(WORLD, [actions]).record(0)
+    assert record['outcome'] == outcome
+    assert record['illegal'] == illegal
+    expected = -record['cost'] - (DEATH_PENALTY if outcome == 'dead' else 0)
+    assert record['reward'] == expected
+
+
+def test_block_keeps_the_hunter_in_place():
+    record = simulate(WORLD, [['Move']]).record(0)
+    assert record['pose'] == [0, 0, 'N'] and record['cost'] == 1
+
+
+def test_winning_plan_is_accepted():
+    validation = simulate(WORLD, [WINNING, plan(WORLD).actions])
+    for index in range(2):
+        record = validation.record(index)
+        assert record['outcome'] == 'won' and record['illegal'] == -1
+        assert record['cost'] == len(WINNING)
+        assert record['reward'] == GOLD_REWARD - len(WINNING)
+        assert record['has_gold'] and record['pose'] == [0, 0, 'W']
@@ -0,0 +1,239 @@
+import math
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from grid import Grid, FREE
+from fields import cached_distance_field, UNREACHABLE
+from planner import State, SearchResult, ACTION_COSTS, NONE, locate, search
+from plans import Plan
+from stats import SearchStats, phase
+
+
+# Up to this many golds the visiting order is computed exactly (DP over subsets)
+EXACT_LIMIT = 10
+
+
+def poi_distances(grid: Grid, points: Sequence[int]) -> np.ndarray:
+    """
+    Computes the number of moves between all the pairs of points of interest.
+
+    All the points are flooded at once: every cell holds a 64 bit mask of
+    the sources that reached it, so a single wave over the grid gives the
+    distances from up to 64 sources (more sources take one wave per 64).
+    Wumpuses are passable (they might be killed), unreachable pairs are
+    UNREACHABLE in the returned k x k matrix.
+    """
+    height, width = grid.height, grid.width
+    free = (np.frombuffer(grid.cells, dtype=np.uint8) == FREE).reshape(height, width)
+    points = np.asarray(points, dtype=np.intp)
+    count = len(points)
+    distances = np.full((count, count), UNREACHABLE, dtype=np.int64)
+
+    for first in range(0, count, 64):
+        sources = points[first:first + 64]
+        reached = np.zeros((height, width), dtype=np.uint64)
+        for bit, source in enumerate(sources):
+            reached.flat[source] |= np.uint64(1 << bit)
+            distances[first + bit, points == source] = 0
+        frontier = reached.copy()
+
+        step = 0
+        while frontier.any() and (distances[first:first + len(sources)] == UNREACHABLE).any():
+            step += 1
+            spread = np.zeros_like(frontier)
+            spread[1:, :] |= frontier[:-1, :]
+            spread[:-1, :] |= frontier[1:, :]
+            spread[:, 1:] |= frontier[:, :-1]
+            spread[:, :-1] |= frontier[:, 1:]
+            spread &= ~reached
+            spread[~free] = 0
+            reached |= spread
+            frontier = spread
+
+            hits = spread.flat[points]
+            for target in np.nonzero(hits)[0]:
+                mask = int(hits[target])
+                for bit in range(len(sources)):
+                    if mask >> bit & 1:
+                        distances[first + bit, target] = step
+
+    return distances
+
+
+def _cost(distances: np.ndarray, source: int, target: int) -> float:
+    distance = distances[source, target]
+    return math.inf if distance == UNREACHABLE else int(distance)
+
+
+def _exact_order(distances: np.ndarray, start: int, golds: List[int], exits: List[int]) -> Tuple[List[int], float]:
+    """
+    Held-Karp: cheapest order to visit all the golds and end in an exit.
+    """
+    count = len(golds)
+    full = (1 << count) - 1
+    best = [[math.inf] * count for _ in range(full + 1)]
+    previous = [[-1] * count for _ in range(full + 1)]
+    for last in range(count):
+        best[1 << last][last] = _cost(distances, start, golds[last])
+
+    for visited in range(1, full + 1):
+        for last in range(count):
+            cost = best[visited][last]
+            if cost == math.inf or not visited >> last & 1:
+                continue
+            for following in range(count):
+                if visited >> following & 1:
+                    continue
+                extended = visited | 1 << following
+                candidate = cost + _cost(distances, golds[last], golds[following])
+                if candidate < best[extended][following]:
+                    best[extended][following] = candidate
+                    previous[extended][following] = last
+
+    total, last = min(
+        (best[full][last] + min(_cost(distances, golds[last], exit_) for exit_ in exits), last)
+        for last in range(count)
+    )
+    order = []
+    visited = full
+    while last != -1:
+        order.append(last)
+        visited, last = visited ^ 1 << last, previous[visited][last]
+    order.reverse()
+    return [golds[index] for index in order], total
+
+
+def _approximate_order(distances: np.ndarray, start: int, golds: List[int], exits: List[int]) -> Tuple[List[int], float]:
+    """
+    Nearest neighbour tour improved with 2-opt moves, for many golds.
+    """
+    def length(order: List[int]) -> float:
+        stops = [start] + order
+        return (sum(_cost(distances, a, b) for a, b in zip(stops, stops[1:]))
+                + min(_cost(distances, stops[-1], exit_) for exit_ in exits))
+
+    order = []
+    remaining = set(golds)
+    current = start
+    while remaining:
+        current = min(remaining, key=lambda gold: _cost(distances, current, gold))
+        order.append(current)
+        remaining.remove(current)
+
+    total = length(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                candidate_total = length(candidate)
+                if candidate_total < total:
+                    order, total, improved = candidate, candidate_total, True
+    return order, total
+
+
+def best_order(distances: np.ndarray, start: int, golds: List[int], exits: List[int]) -> Tuple[List[int], float]:
+    """
+    Returns the order to visit the golds (indices in the distance matrix) and its number of moves.
+
+    Golds that cannot be reached from the start are left out.
+    """
+    golds = [gold for gold in golds if _cost(distances, start, gold) < math.inf]
+    if not golds:
+        return [], 0
+    if len(golds) <= EXACT_LIMIT:
+        return _exact_order(distances, start, golds, exits)
+    return _approximate_order(distances, start, golds, exits)
+
+
+def _follow(grid: Grid, start: State, order: List[int], exits: List[int], wumpuses,
+            stats: Optional[SearchStats] = None) -> SearchResult:
+    """
+    Plans the legs of a tour with the state space search, grabbing the golds in order.
+    """
+    state = start
+    actions = Plan()
+    cost = 0
+    expanded = 0
+    grabbed = 0
+
+    for gold in order:
+        to_gold = cached_distance_field(grid, [gold])
+
+        def estimate(state: State) -> float:
+            moves = to_gold[state.cell]
+            return moves + (not state.has_gold) if moves != UNREACHABLE else math.inf
+
+        leg, leg_cost, final, leg_expanded = search(
+            state._replace(has_gold=False), grid, gold, wumpuses, lambda state: state.has_gold, estimate, stats
+        )
+        expanded += leg_expanded
+        if leg is not None:
+            actions.extend(leg)
+            cost += leg_cost
+            state = final
+            grabbed += 1
+
+    if not grabbed:
+        return SearchResult(actions=['Climb'], cost=ACTION_COSTS['Climb'], expanded=expanded)
+
+    to_exit = cached_distance_field(grid, exits)
+
+    def estimate(state: State) -> float:
+        moves = to_exit[state.cell]
+        return moves if moves != UNREACHABLE else math.inf
+
+    leg, leg_cost, _, leg_expanded = search(
+        state, grid, NONE, wumpuses, lambda state: state.cell in exits, estimate, stats
+    )
+    expanded += leg_expanded
+    if leg is None:
+        # the golds cannot be carried out, just climb out
+        return SearchResult(actions=['Climb'], cost=ACTION_COSTS['Climb'], expanded=expanded)
+    actions.extend(leg)
+    actions.append('Climb')
+    return SearchResult(actions=actions, cost=cost + leg_cost + ACTION_COSTS['Climb'], expanded=expanded)
+
+
+def plan_tours(world_json: Dict, grid: Optional[Grid] = None, hunters: Optional[List[int]] = None,
+               stats: Optional[SearchStats] = None) -> List[SearchResult]:
+    """
+    Plans, for every hunter (or the ones in `hunters`), a tour grabbing all the golds and climbing out of the closest exit.
+
+    The distances between hunters, golds and exits come from a single
+    poi_distances pass shared by all the hunters, the visiting order from
+    best_order and every leg is then planned with the real action costs
+    (turns, shooting the Wumpuses), so a leg is optimal given the previous
+    ones but the tour as a whole is only as good as the order. The phases
+    and the search counters are recorded in `stats` if given.
+    """
+    with phase(stats, 'grid'):
+        if grid is None:
+            grid = Grid.from_json(world_json)
+        if hunters is None:
+            hunters = list(range(len(world_json['hunters'])))
+        starts = [locate(world_json, grid, hunter)[0] for hunter in hunters]
+        golds = [grid.cell(*gold) for gold in world_json.get('golds', [])]
+        exits = sorted({grid.cell(*exit_) for exit_ in world_json['exits']})
+        wumpuses = frozenset(grid.cell(*wumpus) for wumpus in world_json.get('wumpuses', []))
+
+    with phase(stats, 'distances'):
+        points = [start.cell for start in starts] + golds + exits
+        distances = poi_distances(grid, points)
+    gold_indices = list(range(len(starts), len(starts) + len(golds)))
+    exit_indices = list(range(len(starts) + len(golds), len(points)))
+
+    results = []
+    for index, start in enumerate(starts):
+        with phase(stats, 'order'):
+            order, _ = best_order(distances, index, gold_indices, exit_indices)
+        results.append(_follow(grid, start, [points[gold] for gold in order], exits, wumpuses, stats))
+    return results
+
+
+def plan_tour(world_json: Dict, hunter: int = 0, grid: Optional[Grid] = None,
+              stats: Optional[SearchStats] = None) -> SearchResult:
+    """
+    Plans the tour of a single hunter, see plan_tours.
+    """
+    return plan_tours(world_json, grid, [hunter], stats)[0]
@@ -1,40 +1,41 @@
 import networkx as nx
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple, Union
+from plans import Plan
+from world_index import WorldIndex
 
 
-def json2graph(world_json: Dict) -> nx.graph:
+def json2graph(world_json: Union[Dict, WorldIndex]) -> nx.graph:
     """
-    Creates a NetworkX graph from JSON.
+    Creates a NetworkX graph from JSON (or from its WorldIndex).
     """
-    # extract grid size (n,m) and pits coordinates from JSON
-    n, m = world_json['size']
-    pits = world_json['pits']
+    # extract grid size (n,m), pits and blocks coordinates from the index
+    world = world_json if isinstance(world_json, WorldIndex) else WorldIndex.from_json(world_json)
+    n, m = world.size
 
     # construct full graph
     G = nx.grid_2d_graph(n=n, m=m)
 
-    # remove the nodes corresponding to pits
-    for pit in pits:
-        G.remove_node(tuple(pit))
-
-    # add edges between adjacent nodes that are not blocked by bits
-    for node in G.nodes:
-        adjacent_neigbours = [
-            (node[0] - 1, node[1]), 
-            (node[0] + 1, node[1]),
-            (node[0], node[1] - 1), 
-            (node[0], node[1] + 1)
-        ]
-        for neighbor in adjacent_neigbours:
-            if neighbor in G.nodes and neighbor not in pits:
-                G.add_edge(node, neighbor)
+    # remove the nodes corresponding to pits and blocks, their edges go with them
+    # (see grid.Grid for a lighter representation of the same map)
+    G.remove_nodes_from(tuple(cell) for cell in world.pits | world.blocks)
 
     return G
+
+
+def graph_variant(G: nx.Graph, blocked: Iterable[Tuple[int, int]] = ()) -> nx.Graph:
+    """
+    Returns a read-only view of the graph without the `blocked` cells.
+
+    For the variants of a map (avoiding a Wumpus, what-if pits or blocks):
+    the view (nx.restricted_view) filters the nodes of the shared graph on
+    the fly, so it costs nothing to build where G.copy() copies everything.
+    """
+    return nx.restricted_view(G, [tuple(cell) for cell in blocked if tuple(cell) in G], [])
     
 
 class Agent:
     """
-    Represents path (sequence of coordinates) as sequence of hunter actions.
+    Represents path (sequence of coordinates) as sequence of hunter actions (a plans.Plan).
     """
     def __init__(self, 
                  hunter_location: Tuple[int], 
@@ -51,7 +52,7 @@ class Agent:
         self.direction = direction
         self.has_grabbed = has_grabbed  
         self.has_shot = has_shot
-        self.actions = []
+        self.actions = Plan()
         self.turns = {
             'N': {'E': 'Right', 'W': 'Left', 'S': 'Rotate', 'N': None},
             'E': {'N': 'Left', 'S': 'Right', 'W': 'Rotate', 'E': None},
@@ -59,7 +60,7 @@ class Agent:
             'W': {'S': 'Left', 'N': 'Right', 'E': 'Rotate', 'W': None}
         }
 
-    def navigate(self, path: List[Tuple[int]]) -> List[str]:
+    def navigate(self, path: List[Tuple[int]]) -> Plan:
         """
         Navigates agent through path.
         """
@@ -68,7 +69,7 @@ class Agent:
         self.actions.append('Climb')
         return self.actions
 
-    def _move_to(self, x: int, y: int) -> List[str]:
+    def _move_to(self, x: int, y: int) -> Plan:
         """
         Performs actions based on the next location (x,y).
         """
@@ -119,8 +120,7 @@ class Agent:
         self.actions.append('Right')
 
     def _turn_around(self):
-        self.actions.append('Right')
-        self.actions.append('Right')
+        self.actions.append('Right', 2)
 
     def _grab_if_gold(self, x: int, y: int):
         if (x, y) == self.gold_location and not self.has_grabbed:
@@ -165,7 +165,8 @@ def cost_function(
 
     Create an agent with the given path and simulate its actions to get 
     the sequence of moves. If the path passes through the Wumpus, add 9 
-    to the cost (not 10 because 'Shoot' is calculated as 1).
+    to the cost (not 10 because 'Shoot' is calculated as 1). The plan
+    keeps its length, it is not expanded to count the actions.
     """
     stl = Agent(
         hunter_location=hunter_loc, 
@@ -0,0 +1,335 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from grid import Grid, HEADINGS, PIT, BLOCK
+from planner import plan, ACTION_COSTS
+from plans import Plan
+from sight import cached_shooting_index, MISS
+from world_index import ACTION_NAMES
+from worldfile import MappedWorld, open_world
+
+
+# Codes of the actions in the plan arrays, NOOP pads the shorter plans
+NOOP = 0
+CODES = {name: code for code, name in enumerate(ACTION_NAMES, 1)}
+MOVE, RIGHT, LEFT, SHOOT, GRAB, CLIMB = (CODES[name] for name in ACTION_NAMES)
+COSTS = np.array([0] + [ACTION_COSTS[name] for name in ACTION_NAMES], dtype=np.int64)
+
+# Outcomes of the episodes
+UNFINISHED, WON, CLIMBED, DEAD = range(4)
+OUTCOMES = ('unfinished', 'won', 'climbed', 'dead')
+
+# Rewards of the simulator on top of the cost of the actions
+GOLD_REWARD = 1000
+DEATH_PENALTY = 1000
+
+
+class Validation(NamedTuple):
+    """
+    Result of simulating a batch of plans, one entry per plan in every array.
+
+    `outcome` is an index in OUTCOMES, `cost` the cost of the actions
+    executed (the reward without the gold and the death), `cell` and
+    `heading` the final pose, `killed` the index of the Wumpus killed (-1 if
+    none), `steps` the number of actions executed and `illegal` the first
+    step that killed the hunter, had no effect (bumping into a wall, grabbing no gold, shooting
+    without an arrow, climbing away from an exit) or came after the end of
+    the episode, -1 if there is none.
+    """
+    outcome: np.ndarray
+    cost: np.ndarray
+    reward: np.ndarray
+    cell: np.ndarray
+    heading: np.ndarray
+    has_gold: np.ndarray
+    has_arrow: np.ndarray
+    killed: np.ndarray
+    steps: np.ndarray
+    illegal: np.ndarray
+    width: int
+
+    def __len__(self) -> int:
+        return len(self.outcome)
+
+    def record(self, index: int) -> Dict:
+        """
+        The result of a plan as JSON.
+        """
+        y, x = divmod(int(self.cell[index]), self.width)
+        return {
+            'outcome': OUTCOMES[self.outcome[index]],
+            'cost': int(self.cost[index]),
+            'reward': int(self.reward[index]),
+            'pose': [x, y, HEADINGS[self.heading[index]]],
+            'has_gold': bool(self.has_gold[index]),
+            'has_arrow': bool(self.has_arrow[index]),
+            'killed': int(self.killed[index]),
+            'steps': int(self.steps[index]),
+            'illegal': int(self.illegal[index])
+        }
+
+
+def encode(plans: Sequence[Sequence[str]]) -> np.ndarray:
+    """
+    Packs plans (lists of action names or plans.Plan) in an int8 array of one row per plan, padded with NOOP.
+    """
+    codes = np.zeros((len(plans), max((len(actions) for actions in plans), default=0)), dtype=np.int8)
+    for row, actions in enumerate(plans):
+        if isinstance(actions, Plan):
+            # the runs are repeated without going through the names
+            codes[row, :len(actions)] = np.repeat(np.frombuffer(actions.codes, dtype=np.uint8) + 1, actions.counts)
+            continue
+        try:
+            codes[row, :len(actions)] = [CODES[name] for name in actions]
+        except KeyError as error:
+            raise ValueError('unknown action {} in plan {}'.format(error, row)) from None
+    return codes
+
+
+def _load(world: Union[Dict, MappedWorld]) -> Tuple[Dict, Grid]:
+    """
+    The objects of a world (JSON or binary) and its grid.
+    """
+    if isinstance(world, MappedWorld):
+        return world.to_json(cells=False), world.grid()
+    return world, Grid.from_json(world)
+
+
+class _Tables:
+    """
+    Lookup tables of a world, indexed by cell (or pose `cell * 4 + heading`).
+    """
+
+    def __init__(self, world_json: Dict, grid: Grid):
+        width, size = grid.width, len(grid)
+        self.cells = np.frombuffer(grid.cells, dtype=np.uint8)
+
+        index = np.arange(size)
+        column, row = index % width, index // width
+        ahead = np.stack((
+            np.where(row < grid.height - 1, index + width, -1),
+            np.where(column < width - 1, index + 1, -1),
+            np.where(row > 0, index - width, -1),
+            np.where(column > 0, index - 1, -1)
+        ), axis=1).reshape(-1)
+        # a block stops the hunter like the border
+        self.ahead = np.where((ahead >= 0) & (self.cells[ahead] != BLOCK), ahead, -1)
+
+        def located(key: str) -> np.ndarray:
+            at = np.full(size, -1, dtype=np.int64)
+            for number, (x, y, *_) in enumerate(world_json.get(key, [])):
+                at[grid.cell(x, y)] = number
+            return at
+
+        self.wumpus_at = located('wumpuses')
+        self.gold_at = located('golds')
+        self.golds = len(world_json.get('golds', []))
+        self.exits = located('exits') >= 0
+
+        wumpuses = frozenset(grid.cell(x, y) for x, y, *_ in world_json.get('wumpuses', []))
+        targets = np.frombuffer(cached_shooting_index(grid, wumpuses), dtype=np.int32)
+        self.hit = np.where(targets != MISS, self.wumpus_at[np.maximum(targets, 0)], -1)
+
+
+def simulate(world: Union[Dict, MappedWorld], plans: Union[np.ndarray, Sequence[Sequence[str]]], hunter: int = 0,
+             horizon: Optional[int] = None) -> Validation:
+    """
+    Plays a batch of plans on a world (JSON or binary) at once, from the start of `hunter`.
+
+    The plans are lists of action names or an array of encode. The rules
+    are those of the simulator: every action costs 1 but Shoot 10, the
+    arrow flies until it hits a Wumpus, a block or the border, entering a
+    pit or a living Wumpus kills the hunter (DEATH_PENALTY) and climbing on
+    an exit ends the episode, with GOLD_REWARD if the gold was grabbed.
+    Past `horizon` steps the episode is over. Every step updates the
+    states of all the plans with NumPy, so the time is about the length of
+    the longest plan, whatever their number.
+    """
+    world_json, grid = _load(world)
+    tables = _Tables(world_json, grid)
+    codes = plans if isinstance(plans, np.ndarray) else encode(plans)
+    count, length = codes.shape
+    rows = np.arange(count)
+
+    x, y, *rest = world_json['hunters'][hunter]
+    cell = np.full(count, grid.cell(x, y), dtype=np.int64)
+    heading = np.full(count, HEADINGS.index(rest[0] if rest else 'N'), dtype=np.int64)
+    grabbed = np.zeros((count, max(tables.golds, 1)), dtype=bool)
+    has_arrow = np.ones(count, dtype=bool)
+    killed = np.full(count, -1, dtype=np.int64)
+    outcome = np.full(count, UNFINISHED, dtype=np.int8)
+    running = np.ones(count, dtype=bool)
+    cost = np.zeros(count, dtype=np.int64)
+    steps = np.zeros(count, dtype=np.int64)
+    illegal = np.full(count, -1, dtype=np.int64)
+
+    for step in range(length):
+        if horizon is not None and step == horizon:
+            running[:] = False
+        action = codes[:, step]
+        given = action != NOOP
+        live = running & given
+        wasted = given & ~running
+        cost += COSTS[action] * live
+        steps += live
+
+        heading = np.where(live & (action == LEFT), (heading - 1) % 4, heading)
+        heading = np.where(live & (action == RIGHT), (heading + 1) % 4, heading)
+
+        moving = live & (action == MOVE)
+        ahead = tables.ahead[cell * 4 + heading]
+        wasted |= moving & (ahead < 0)
+        cell = np.where(moving & (ahead >= 0), ahead, cell)
+        wumpus = tables.wumpus_at[cell]
+        dead = moving & ((tables.cells[cell] == PIT) | ((wumpus >= 0) & (wumpus != killed)))
+        outcome[dead] = DEAD
+        wasted |= dead
+
+        shooting = live & (action == SHOOT)
+        wasted |= shooting & ~has_arrow
+        shot = shooting & has_arrow
+        killed = np.where(shot, tables.hit[cell * 4 + heading], killed)
+        has_arrow &= ~shot
+
+        grabbing = live & (action == GRAB)
+        gold = tables.gold_at[cell]
+        found = grabbing & (gold >= 0)
+        found &= ~grabbed[rows, np.maximum(gold, 0)]
+        grabbed[rows[found], gold[found]] = True
+        wasted |= grabbing & ~found
+
+        climbing = live & (action == CLIMB)
+        out = climbing & tables.exits[cell]
+        has_gold = grabbed.any(axis=1)
+        outcome[out] = np.where(has_gold[out], WON, CLIMBED)
+        wasted |= climbing & ~out
+
+        running &= ~(dead | out)
+        illegal = np.where(wasted & (illegal < 0), step, illegal)
+
+    has_gold = grabbed.any(axis=1)
+    reward = -cost + GOLD_REWARD * (outcome == WON) - DEATH_PENALTY * (outcome == DEAD)
+    return Validation(outcome, cost, reward, cell, heading, has_gold, has_arrow, killed, steps, illegal, grid.width)
+
+
+# --- Cross-check with the simulator
+
+def episode_reward(world_json: Dict, actions: Sequence[str]) -> Tuple[int, bool]:
+    """
+    Plays a plan with wumpus.run_episode, returns the reward and whether the hunter succeeded.
+
+    Both are read from what the episode prints.
+    """
+    import wumpus as wws
+    from world_index import WorldIndex
+
+    class ReplayPlayer(wws.OfflinePlayer):
+        def start_episode(self, world):
+            return WorldIndex.from_world(world).to_actions(actions)
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        wws.run_episode(world=wws.WumpusWorld.from_JSON(world_json), player=ReplayPlayer())
+    rewards = re.findall(r'terminated with a reward of (-?\d+)', output.getvalue())
+    if not rewards:
+        raise ValueError('no reward in the output of the episode')
+    return int(rewards[-1]), 'succeeded' in output.getvalue()
+
+
+def crosscheck(world_json: Dict, plans: Sequence[Sequence[str]], horizon: Optional[int] = None) -> List[Dict]:
+    """
+    Compares simulate with wumpus.run_episode, returns the plans on which they disagree.
+    """
+    validation = simulate(world_json, plans, horizon=horizon)
+    mismatches = []
+    for index, actions in enumerate(plans):
+        expected, succeeded = episode_reward(world_json, actions)
+        record = validation.record(index)
+        if record['reward'] != expected or (record['outcome'] == 'won') != succeeded:
+            mismatches.append(dict(record, plan=index, expected=expected, succeeded=succeeded))
+    return mismatches
+
+
+def random_plans(world_json: Dict, count: int, length: int, seed=0) -> List[List[str]]:
+    """
+    Perturbed versions of the optimal plan of a world, they bump, die and shoot.
+    """
+    rng = random.Random(seed)
+    base = plan(world_json).actions
+    plans = [base]
+    for _ in range(count - 1):
+        actions = list(base)
+        for _ in range(rng.randint(1, 4)):
+            actions.insert(rng.randrange(len(actions) + 1), rng.choice(ACTION_NAMES[:5]))
+        plans.append(actions[:length])
+    return plans
+
+
+def main(*cargs):
+    """Validate plans by simulating them in bulk"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('results', nargs='?', help='JSONL results of batch.py to validate (plain or --compact)')
+    parser.add_argument('--worlds', nargs='+', default=[], help='worlds of the results, as for batch.py, or binary world files')
+    parser.add_argument('--horizon', type=int, help='maximum number of steps of an episode')
+    parser.add_argument('--crosscheck', nargs='+', metavar='WORLD', help='compare with wumpus.run_episode on these JSON worlds instead')
+    parser.add_argument('--plans', type=int, default=20, help='plans per world with --crosscheck')
+    args = parser.parse_args(cargs)
+
+    if args.crosscheck:
+        failures = 0
+        for path in args.crosscheck:
+            with open(path) as fd:
+                world_json = json.load(fd)
+            mismatches = crosscheck(world_json, random_plans(world_json, args.plans, 200), args.horizon)
+            failures += len(mismatches)
+            print('{:40} {}'.format(path, 'ok' if not mismatches else json.dumps(mismatches)))
+        return 1 if failures else 0
+
+    if args.results is None:
+        parser.error('the results or --crosscheck are required')
+
+    from batch import read_worlds
+    with contextlib.ExitStack() as stack:
+        worlds = {}
+        for source in args.worlds:
+            if os.path.isfile(source) and not source.endswith(('.json', '.jsonl')):
+                worlds[source] = stack.enter_context(open_world(source))
+            else:
+                worlds.update((name, json.loads(text)) for name, text in read_worlds(source))
+
+        plans = defaultdict(list)
+        with open(args.results) as fd:
+            for line in fd:
+                record = json.loads(line)
+                if 'plan' in record:
+                    # written by batch.py --compact
+                    record['actions'] = Plan.from_text(record['plan'])
+                if 'actions' in record:
+                    plans[record['world']].append(record)
+
+        counts = {name: 0 for name in OUTCOMES + ('mismatched', 'illegal', 'unknown world')}
+        for name, records in plans.items():
+            if name not in worlds:
+                counts['unknown world'] += len(records)
+                continue
+            validation = simulate(worlds[name], [record['actions'] for record in records], horizon=args.horizon)
+            for index, record in enumerate(records):
+                counts[OUTCOMES[validation.outcome[index]]] += 1
+                counts['illegal'] += bool(validation.illegal[index] >= 0)
+                if validation.cost[index] != record['cost']:
+                    counts['mismatched'] += 1
+                    print(json.dumps(dict(validation.record(index), world=name, expected=record['cost'])), file=sys.stderr)
+    print(json.dumps(counts))
+    return 1 if counts['mismatched'] or counts['dead'] or counts['illegal'] or counts['unknown world'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,147 @@
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from grid import Grid, FREE, PIT, BLOCK
+from plans import Plan, NAMES
+
+
+# Names of the actions, in the order of the members of wumpus.Hunter.Actions
+ACTION_NAMES = NAMES
+
+
+class Coords(NamedTuple):
+    """
+    Location of a cell, equal to the plain (x, y) tuples of the JSON worlds.
+    """
+    x: int
+    y: int
+
+
+class WorldIndex:
+    """
+    Everything the players need to know about a world, extracted once.
+
+    The locations are tuples of Coords, pits and blocks are also frozensets
+    for membership tests, `actions` maps the action names of the plans to
+    the members of the hunter's Actions enum. The JSON description is kept
+    as well (the planners and the plan cache take it), the grid and the
+    NetworkX graph are only built when first used. The index is immutable,
+    so it can be shared between players and episodes of the same world.
+    """
+    __slots__ = ('size', 'hunters', 'headings', 'pits', 'blocks', 'wumpuses', 'golds', 'exits', 'actions',
+                 'world_json', '_grid', '_graph')
+
+    def __init__(self, world_json: Dict, actions: Optional[Dict[str, Any]] = None):
+        def coords(key: str) -> Tuple[Coords, ...]:
+            return tuple(Coords(*location[:2]) for location in world_json.get(key, []))
+
+        setattr_ = super().__setattr__
+        setattr_('world_json', world_json)
+        setattr_('size', Coords(*world_json['size']))
+        setattr_('hunters', coords('hunters'))
+        setattr_('headings', tuple(hunter[2] if len(hunter) > 2 else 'N' for hunter in world_json['hunters']))
+        setattr_('pits', frozenset(coords('pits')))
+        setattr_('blocks', frozenset(coords('blocks')))
+        setattr_('wumpuses', coords('wumpuses'))
+        setattr_('golds', coords('golds'))
+        setattr_('exits', coords('exits'))
+        setattr_('actions', dict(actions or {}))
+        setattr_('_grid', None)
+        setattr_('_graph', None)
+
+    @classmethod
+    def from_json(cls, world_json: Dict) -> 'WorldIndex':
+        """
+        Indexes a world described in JSON, the actions are left empty.
+        """
+        return cls(world_json)
+
+    @classmethod
+    def from_world(cls, world) -> 'WorldIndex':
+        """
+        Indexes a wumpus.WumpusWorld: a single to_dict, the actions come from its first hunter.
+        """
+        import wumpus as wws
+
+        hunter = next((obj for obj in world.objects if isinstance(obj, wws.Hunter)), None)
+        members = list(type(hunter).Actions if hunter is not None else wws.Hunter.Actions)
+        return cls(world.to_dict(), dict(zip(ACTION_NAMES, members)))
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError('WorldIndex is immutable')
+
+    def __delattr__(self, name: str):
+        raise AttributeError('WorldIndex is immutable')
+
+    def __repr__(self) -> str:
+        return 'WorldIndex(size={}, hunters={}, golds={}, wumpuses={}, exits={}, pits={}, blocks={})'.format(
+            tuple(self.size), len(self.hunters), len(self.golds), len(self.wumpuses), len(self.exits),
+            len(self.pits), len(self.blocks)
+        )
+
+    @property
+    def grid(self) -> Grid:
+        """
+        The grid.Grid of the world, built on first use.
+
+        It is shared by all the users of the index, so the distance fields
+        and the other caches of its `fields` are reused too. Do not edit it.
+        """
+        if self._grid is None:
+            super().__setattr__('_grid', Grid.from_json(self.world_json))
+        return self._grid
+
+    @property
+    def graph(self):
+        """
+        The NetworkX graph of utils.json2graph, built on first use.
+        """
+        if self._graph is None:
+            from utils import json2graph
+            super().__setattr__('_graph', json2graph(self))
+        return self._graph
+
+    def graph_variant(self, blocked: Iterable[Tuple[int, int]] = ()):
+        """
+        A view of the graph without the `blocked` cells (see utils.graph_variant), the graph is shared.
+        """
+        from utils import graph_variant
+        return graph_variant(self.graph, blocked)
+
+    def content(self, x: int, y: int) -> int:
+        """
+        Returns the content of a cell (grid.FREE, PIT or BLOCK).
+        """
+        location = (x, y)
+        if location in self.blocks:
+            return BLOCK
+        return PIT if location in self.pits else FREE
+
+    def passable(self, x: int, y: int) -> bool:
+        return 0 <= x < self.size.x and 0 <= y < self.size.y and (x, y) not in self.pits and (x, y) not in self.blocks
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        The summary of the world printed by the players, with plain (x, y) tuples.
+        """
+        def plain(locations) -> List[Tuple[int, int]]:
+            return [tuple(location) for location in locations]
+
+        return {
+            'Size': tuple(self.size),
+            'Pits': plain(sorted(self.pits)),
+            'Wumpus': plain(self.wumpuses),
+            'Gold': plain(self.golds),
+            'Exits': plain(self.exits),
+            'Blocks': plain(sorted(self.blocks))
+        }
+
+    def to_actions(self, names: Iterable[str]) -> Iterator[Any]:
+        """
+        Yields the members of the Actions enum of the hunter for the action names of a plan.
+        """
+        if isinstance(names, Plan):
+            # run by run, the names are not expanded
+            yield from names.hunter_actions(self.actions)
+            return
+        actions = self.actions
+        for name in names:
+            yield actions[name]
@@ -0,0 +1,204 @@
+import argparse
+import json
+import mmap
+import struct
+import sys
+import numpy as np
+from typing import Dict, List, Optional, Union
+from grid import Grid, HEADINGS, PIT, BLOCK
+
+
+# Layout of the files, all little endian:
+#   header    magic, version, width, height, number of hunters, wumpuses, golds and exits, length of the id
+#   id        utf-8, padded to 8 bytes
+#   objects   int32 (x, y, heading) per hunter then int32 (x, y) per wumpus, gold and exit, padded to 8 bytes
+#   pits      one bit per cell (bit i of byte j is cell 8 * j + i, cells are y * width + x), padded to 8 bytes
+#   blocks    same as pits
+MAGIC = b'WUMW'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxIIIIIII')
+
+# Keys of the objects, in the order of the file
+OBJECTS = ('wumpuses', 'golds', 'exits')
+
+
+def _padded(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _plane(width: int, height: int, locations) -> bytes:
+    """
+    Packs the locations in a plane of one bit per cell.
+    """
+    bits = np.zeros(width * height, dtype=np.uint8)
+    locations = np.asarray(locations, dtype=np.int64).reshape(-1, 2)
+    bits[locations[:, 1] * width + locations[:, 0]] = 1
+    packed = np.packbits(bits, bitorder='little').tobytes()
+    return packed + bytes(_padded(len(packed)) - len(packed))
+
+
+def to_bytes(world_json: Dict) -> bytes:
+    """
+    Encodes a world described in JSON in the binary format.
+    """
+    width, height = world_json['size']
+    identifier = str(world_json.get('id', '')).encode('utf-8')
+    hunters = world_json['hunters']
+    counts = [len(world_json.get(key, [])) for key in OBJECTS]
+
+    objects = [(x, y, HEADINGS.index(rest[0] if rest else 'N')) for x, y, *rest in hunters]
+    coordinates = [value for hunter in objects for value in hunter]
+    for key in OBJECTS:
+        coordinates.extend(value for location in world_json.get(key, []) for value in location[:2])
+    packed = np.asarray(coordinates, dtype='<i4').tobytes()
+
+    return b''.join((
+        HEADER.pack(MAGIC, VERSION, width, height, len(hunters), *counts, len(identifier)),
+        identifier, bytes(_padded(len(identifier)) - len(identifier)),
+        packed, bytes(_padded(len(packed)) - len(packed)),
+        _plane(width, height, world_json.get('pits', [])),
+        _plane(width, height, world_json.get('blocks', []))
+    ))
+
+
+def write_world(world_json: Dict, path: str):
+    """
+    Writes a world described in JSON to a binary file.
+    """
+    with open(path, 'wb') as fd:
+        fd.write(to_bytes(world_json))
+
+
+class MappedWorld:
+    """
+    A world in the binary format, read in place from a buffer.
+
+    Only the header and the few objects are decoded, the pits and the
+    blocks stay as views on the buffer (`pits_bits` and `blocks_bits`,
+    bit-packed), so opening a file with open_world maps it and returns
+    at once whatever the size of the map: the pages are read when used and
+    the processes mapping the same file share them. The planners take the
+    objects from `to_json(cells=False)` and the map from `grid()`.
+    """
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap], owner: Optional[mmap.mmap] = None):
+        self.buffer = buffer
+        self.owner = owner
+        magic, version, width, height, hunters, *counts, id_length = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('not a binary world')
+        if version != VERSION:
+            raise ValueError('unsupported version {} of the binary world format'.format(version))
+        self.width = width
+        self.height = height
+
+        offset = HEADER.size
+        self.id = bytes(buffer[offset:offset + id_length]).decode('utf-8')
+        offset += _padded(id_length)
+
+        values = hunters * 3 + 2 * sum(counts)
+        coordinates = np.frombuffer(buffer, dtype='<i4', count=values, offset=offset).tolist()
+        offset += _padded(values * 4)
+        self.hunters = [[x, y, HEADINGS[heading]] for x, y, heading in zip(*[iter(coordinates[:hunters * 3])] * 3)]
+        self.objects: Dict[str, List[List[int]]] = {}
+        start = hunters * 3
+        for key, count in zip(OBJECTS, counts):
+            self.objects[key] = [list(location) for location in zip(*[iter(coordinates[start:start + 2 * count])] * 2)]
+            start += 2 * count
+
+        plane = (width * height + 7) // 8
+        self.pits_bits = np.frombuffer(buffer, dtype=np.uint8, count=plane, offset=offset)
+        offset += _padded(plane)
+        self.blocks_bits = np.frombuffer(buffer, dtype=np.uint8, count=plane, offset=offset)
+
+    def __enter__(self) -> 'MappedWorld':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Unmaps the file, the views on it must not be used afterwards.
+        """
+        self.pits_bits = self.blocks_bits = None
+        if self.owner is not None:
+            self.owner.close()
+            self.owner = None
+
+    def _cells(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bits, count=self.width * self.height, bitorder='little')
+
+    def occupancy(self) -> np.ndarray:
+        """
+        The content of every cell (grid.FREE, PIT or BLOCK) as a flat uint8 array.
+        """
+        cells = self._cells(self.pits_bits) * np.uint8(PIT)
+        blocks = self._cells(self.blocks_bits).view(bool)
+        cells[blocks] = BLOCK
+        return cells
+
+    def grid(self) -> Grid:
+        """
+        Builds the grid.Grid of the world, unpacking the planes straight into its cells.
+        """
+        cells = bytearray(self.width * self.height)
+        np.frombuffer(cells, dtype=np.uint8)[:] = self.occupancy()
+        return Grid(self.width, self.height, cells)
+
+    def locations(self, bits: np.ndarray) -> List[List[int]]:
+        """
+        The [x, y] of the cells set in a plane, in the order of the cells.
+        """
+        ys, xs = np.divmod(np.flatnonzero(self._cells(bits)), self.width)
+        return np.stack((xs, ys), axis=1).tolist()
+
+    def to_json(self, cells: bool = True) -> Dict:
+        """
+        The description of the world in the JSON schema, without the pits and the blocks unless `cells`.
+
+        The pits and the blocks come out in the order of the cells, the
+        planners only need the objects when given the grid.
+        """
+        world_json = {'id': self.id, 'size': [self.width, self.height], 'hunters': self.hunters}
+        world_json.update(self.objects)
+        if cells:
+            world_json['pits'] = self.locations(self.pits_bits)
+            world_json['blocks'] = self.locations(self.blocks_bits)
+        return world_json
+
+
+def open_world(path: str) -> MappedWorld:
+    """
+    Memory maps a binary world file (read only).
+    """
+    with open(path, 'rb') as fd:
+        mapped = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    return MappedWorld(mapped, owner=mapped)
+
+
+def from_bytes(data: bytes) -> MappedWorld:
+    """
+    Reads a world in the binary format from memory.
+    """
+    return MappedWorld(data)
+
+
+def main(*cargs):
+    """Convert worlds between the JSON and the binary formats"""
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('source', help='world to convert, JSON if its name ends with .json, binary otherwise')
+    parser.add_argument('target', help='file to write, in the other format')
+    args = parser.parse_args(cargs)
+
+    if args.source.endswith('.json'):
+        with open(args.source) as fd:
+            write_world(json.load(fd), args.target)
+    else:
+        with open_world(args.source) as world, open(args.target, 'w') as fd:
+            json.dump(world.to_json(), fd)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))